@@ -0,0 +1,251 @@
+from concurrent.futures import ProcessPoolExecutor
+from Feasibility import check_capacity
+from Metrics import peak_memory_mb
+from Rendering import render_pdf
+from ShiftsProblem import ShiftsProblem
+from SolveJob import ProgressCallback
+from SolverProfile import SolverProfile
+import argparse
+import calendar
+import json
+import multiprocessing
+import ortools
+import os
+import platform
+import random
+import sys
+import time
+
+'''
+Reproducible benchmark of the scheduler on synthetic instances:
+    python Benchmark.py                          run the small ladder and compare with benchmark_baseline.json
+    python Benchmark.py --full -o full.json      run the whole ladder
+    python Benchmark.py --medics 10 15 --months 1 --save    run a given ladder and make it the new baseline
+The small ladder takes less than a minute, so that it can run in CI; the baseline in the repository was made with it
+(python Benchmark.py --save).
+Each case of the size ladder (number of medics x number of months) is generated from a fixed seed and run in a fresh
+process, so that the peak memory of a case does not include the previous ones. The months of a case are solved one
+after the other with the carry-over of the previous month, as in the "sequential" mode of HorizonScheduler.
+The times depend on the machine: a baseline is only meaningful on the machine (and with the options) it was made on.
+'''
+MEDICS_LADDER = (10, 15, 20, 30, 50, 100, 200)
+MONTHS_LADDER = (1, 3, 6, 12)
+SMALL_MEDICS_LADDER = (10, 15)
+SMALL_MONTHS_LADDER = (1, 2)
+# Metrics compared with the baseline, with the absolute difference below which a change is considered noise
+METRICS = {"build_time": 0.05, "first_solution_time": 0.05, "optimal_time": 0.1, "render_time": 0.05,
+           "peak_memory_mb": 10.0}
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+
+def staffing(num_medics):
+    """
+    Return the number of morning and afternoon shifts of the ferial days and of the saturdays for a ward of
+    num_medics medics: about 40% of the medics not working or resting after the nights are on duty each day,
+    fewer on saturdays.
+    """
+    day_shifts = max(2, round(0.4 * (num_medics - 3)))
+    morning, afternoon = (day_shifts + 1) // 2, day_shifts // 2
+    return {"num_morning_shifts_ferial": morning, "num_afternoon_shifts_ferial": afternoon,
+            "num_morning_shifts_saturday": max(1, round(0.6 * morning)),
+            "num_afternoon_shifts_saturday": max(1, round(0.5 * afternoon))}
+
+
+def generate_instance(num_medics, month, year, vacation_density=0.05, num_festive_days=1, full_sunday_fraction=0.1,
+                      additional_shift_skew=0, seed=0):
+    """
+    Generate the arguments of ShiftsProblem of a realistic month. The same arguments give the same instance.
+
+    Parameters:
+    num_medics (int): Number of medics; the staffing of the days grows with it (see staffing).
+    month, year (int): Month of the instance.
+    vacation_density (float): Fraction of the medic-days in vacation, taken in blocks of 3 to 10 consecutive days.
+        The vacation days that would leave a day uncovered (see Feasibility.check_capacity) are dropped.
+    num_festive_days (int): Festive days besides the sundays, chosen among the other days.
+    full_sunday_fraction (float): Fraction of the medics preferring full sundays.
+    additional_shift_skew (int): Each medic asks between -skew and +skew additional ferial shifts, and between
+        -skew // 3 and +skew // 3 additional festive and night shifts.
+    seed (int): Seed of the random choices.
+
+    Returns:
+    dict: Arguments of ShiftsProblem.
+    """
+    rng = random.Random("%d-%d-%d-%d" % (seed, num_medics, year, month))
+    num_days = calendar.monthrange(year, month)[1]
+    non_sundays = [d for d in range(num_days) if calendar.weekday(year, month, d + 1) != 6]
+    vacation_days = [set() for _ in range(num_medics)]
+    target = round(vacation_density * num_medics * num_days)
+    while sum(len(days) for days in vacation_days) < target:
+        length, start = rng.randint(3, 10), rng.randint(1, num_days)
+        vacation_days[rng.randrange(num_medics)].update(range(start, min(start + length, num_days + 1)))
+    minor_skew = additional_shift_skew // 3
+    parameters = dict(staffing(num_medics), month=month, year=year, num_medics=num_medics,
+                      medics_preferring_full_sundays=sorted(rng.sample(range(num_medics),
+                                                                       round(full_sunday_fraction * num_medics))),
+                      festive_days_no_sundays=sorted(rng.sample(non_sundays, min(num_festive_days,
+                                                                                 len(non_sundays)))),
+                      additional_shifts_ferial=[rng.randint(-additional_shift_skew, additional_shift_skew)
+                                                for _ in range(num_medics)],
+                      additional_shifts_festive=[rng.randint(-minor_skew, minor_skew) for _ in range(num_medics)],
+                      additional_shifts_nights=[rng.randint(-minor_skew, minor_skew) for _ in range(num_medics)])
+    while True:
+        parameters["vacation_days"] = [sorted(days) for days in vacation_days]
+        issues = check_capacity(parameters)
+        if not issues:
+            return parameters
+        day = issues[0]["day"]
+        on_vacation = [n for n in range(num_medics) if day in vacation_days[n]]
+        if not on_vacation:
+            raise ValueError("%d medics cannot cover the shifts of day %d of %d/%d" % (num_medics, day, month, year))
+        vacation_days[rng.choice(on_vacation)].discard(day)
+
+
+def generate_horizon(num_medics, num_months, start_month=1, start_year=2025, seed=0, **options):
+    """Generate the arguments of ShiftsProblem of num_months consecutive months (see generate_instance)."""
+    months = []
+    for k in range(num_months):
+        year, month = start_year + (start_month - 1 + k) // 12, (start_month - 1 + k) % 12 + 1
+        months.append(generate_instance(num_medics, month, year, seed=seed, **options))
+    return months
+
+
+def run_case(num_medics, num_months, profile, seed=0, **options):
+    """
+    Generate and solve one case of the ladder, measuring each phase. Runs in a fresh worker process.
+
+    Returns:
+    dict: The case and its metrics. The times are summed over the months; first_solution_time is None if a month
+        has no solution, optimal_time is None if a month was not solved to optimality.
+    """
+    case = {"case": "%d medics x %d months" % (num_medics, num_months), "num_medics": num_medics,
+            "num_months": num_months, "seed": seed}
+    totals = {"build_time": 0.0, "first_solution_time": 0.0, "solve_time": 0.0, "render_time": 0.0,
+              "objective": 0.0}
+    statuses = []
+    phases = {}  # time of each phase (see Metrics), summed over the months
+    carry_over = None
+    for parameters in generate_horizon(num_medics, num_months, seed=seed, **options):
+        start = time.perf_counter()
+        problem = ShiftsProblem(**dict(parameters, carry_over=carry_over))
+        totals["build_time"] += time.perf_counter() - start
+        callback = ProgressCallback()
+        result = problem.Solve(profile, callback=callback)
+        statuses.append(result.status_name)
+        for phase, wall_time in problem.metrics.PhaseTimes().items():
+            phases[phase] = phases.get(phase, 0.0) + wall_time
+        totals["solve_time"] += result.wall_time
+        progress = callback.Progress()
+        if not result.feasible or not progress:
+            totals["first_solution_time"] = None
+            break
+        if totals["first_solution_time"] is not None:
+            totals["first_solution_time"] += progress[0]["wall_time"]
+        totals["objective"] += result.objective
+        start = time.perf_counter()
+        render_pdf(problem)
+        totals["render_time"] += time.perf_counter() - start
+        carry_over = problem.Schedule().CarryOver()
+    solved = len(statuses) == num_months and all(status != "INFEASIBLE" for status in statuses)
+    case.update(totals)
+    case["optimal_time"] = totals["solve_time"] if solved and set(statuses) == {"OPTIMAL"} else None
+    if not solved:
+        case["objective"] = None
+    case["statuses"] = statuses
+    case["phases"] = phases
+    case["peak_memory_mb"] = peak_memory_mb()
+    return case
+
+
+def run_benchmark(medics_ladder=SMALL_MEDICS_LADDER, months_ladder=SMALL_MONTHS_LADDER, time_limit=60.0, num_workers=8,
+                  seed=0, **options):
+    """
+    Run every case of the ladder, each one in a new process.
+
+    Parameters:
+    medics_ladder, months_ladder (tuple): Numbers of medics and of months of the cases.
+    time_limit (float): Time limit of the search of each month, in seconds.
+    num_workers (int): Search workers of each month, fixed so that the results do not depend on the cores.
+    seed (int): Seed of the instances and of the search.
+    options: Further arguments of generate_instance.
+
+    Returns:
+    dict: The environment, the options and the list of the cases with their metrics.
+    """
+    profile = SolverProfile(time_limit=time_limit, num_workers=num_workers, random_seed=seed)
+    context = multiprocessing.get_context("spawn")  # a fresh interpreter per case, not a copy of this one
+    cases = []
+    for num_months in months_ladder:
+        for num_medics in medics_ladder:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                case = executor.submit(run_case, num_medics, num_months, profile, seed, **options).result()
+            print("%-22s build %.2fs, first solution %s, optimal %s, render %.2fs, memory %s" % (
+                case["case"], case["build_time"], format_value(case["first_solution_time"], "s"),
+                format_value(case["optimal_time"], "s"), case["render_time"],
+                format_value(case["peak_memory_mb"], " MB")), file=sys.stderr)
+            cases.append(case)
+    return {"environment": {"python": platform.python_version(), "ortools": ortools.__version__,
+                            "platform": platform.platform(), "cpu_count": os.cpu_count()},
+            "options": dict(options, time_limit=time_limit, num_workers=num_workers, seed=seed),
+            "cases": cases}
+
+
+def format_value(value, unit):
+    return "-" if value is None else "%.2f%s" % (value, unit)
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Compare the results with a baseline, case by case. A metric regresses if it grows by more than the tolerance
+    (relative) and by more than its noise threshold in METRICS (absolute), or if a case solved to optimality in the
+    baseline is no longer.
+
+    Returns:
+    list: One dictionary per regression, with the case, the metric and the values in the baseline and now.
+    """
+    baseline_cases = {case["case"]: case for case in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        reference = baseline_cases.get(case["case"])
+        if reference is None:
+            continue
+        for metric, noise in METRICS.items():
+            before, now = reference.get(metric), case.get(metric)
+            if before is None:
+                continue
+            if now is None or (now > before * (1 + tolerance) and now - before > noise):
+                regressions.append({"case": case["case"], "metric": metric, "baseline": before, "value": now})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the scheduler on a ladder of synthetic instances.")
+    parser.add_argument("--medics", type=int, nargs="+", help="numbers of medics (default: the small ladder)")
+    parser.add_argument("--months", type=int, nargs="+", help="numbers of months (default: the small ladder)")
+    parser.add_argument("--full", action="store_true", help="run the whole ladder instead of the small one")
+    parser.add_argument("--time-limit", type=float, default=60.0, help="time limit of each month in seconds")
+    parser.add_argument("--workers", type=int, default=8, help="search workers of each month")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the instances and of the search")
+    parser.add_argument("--vacation-density", type=float, default=0.05)
+    parser.add_argument("--festive-days", type=int, default=1, help="festive days per month besides the sundays")
+    parser.add_argument("--full-sunday-fraction", type=float, default=0.1)
+    parser.add_argument("--skew", type=int, default=0, help="maximum additional shifts asked by a medic")
+    parser.add_argument("-o", "--output", help="JSON file for the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON file of the baseline")
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative growth counted as a regression")
+    args = parser.parse_args()
+    medics_ladder = args.medics or (MEDICS_LADDER if args.full else SMALL_MEDICS_LADDER)
+    months_ladder = args.months or (MONTHS_LADDER if args.full else SMALL_MONTHS_LADDER)
+    results = run_benchmark(medics_ladder, months_ladder, args.time_limit, args.workers, args.seed,
+                            vacation_density=args.vacation_density, num_festive_days=args.festive_days,
+                            full_sunday_fraction=args.full_sunday_fraction, additional_shift_skew=args.skew)
+    for path in ([args.output] if args.output else []) + ([args.baseline] if args.save else []):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.save or not os.path.exists(args.baseline):
+        sys.exit(0)
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print("REGRESSION %(case)s %(metric)s: %(baseline)s -> %(value)s" % regression)
+    sys.exit(1 if regressions else 0)
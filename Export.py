@@ -0,0 +1,229 @@
+from datetime import date, datetime, timedelta, timezone
+from ScheduleStore import ScheduleStore
+import argparse
+import csv
+import json
+import numpy as np
+import os
+import re
+import sys
+
+'''
+Export of solved schedules (a ShiftsProblem or a Schedule, i.e. anything with a layout and an assignment array) as
+flat records, without matplotlib: a CSV file, a JSON feed and one iCalendar file per medic. The exports take an
+iterable of schedules, or of (ward, schedule) pairs, and write each schedule as soon as it is produced: exporting a
+year of several wards, with the months loaded one by one (e.g. from a ScheduleStore, see stored_months), keeps a
+single month in memory.
+Each record is a shift worked by a medic: ward, medic (0-indexed), name, date, shift ID (as in ShiftLayout: the
+morning shifts, the afternoon shifts, then the night shift and the two rest "shifts"), kind of the shift and its
+1-indexed number within the kind.
+    python Export.py schedules.db csv 2025-01 2025-12 -o roster.csv
+    python Export.py schedules.db json 2025-01 2025-12 -o roster.json
+    python Export.py schedules.db ical 2025-01 2025-12 -o calendars
+'''
+FIELDS = ("ward", "medic", "name", "date", "shift", "kind", "index")
+LABELS = {"morning": "Mattina", "afternoon": "Pomeriggio", "night": "Notte", "rest": "Riposo"}
+# Start and end hour of the work shifts in the calendars (the night shift ends the following day)
+SHIFT_HOURS = {"morning": (8, 14), "afternoon": (14, 20), "night": (20, 8)}
+
+
+def shift_kind(layout, s):
+    """Return the kind ("morning", "afternoon", "night" or "rest") and the 1-indexed number within the kind of the
+    shift ID s of a ShiftLayout."""
+    if s < layout.num_morning_shifts_ferial:
+        return "morning", s + 1
+    if s < layout.night_shift:
+        return "afternoon", s - layout.num_morning_shifts_ferial + 1
+    if s == layout.night_shift:
+        return "night", 1
+    return "rest", s - layout.night_shift
+
+
+def medic_name(ward, n, names=None):
+    """Name of the (0-indexed) medic n of a ward: the one in names, keyed by (ward, n), or "Medico" and the 1-indexed
+    medic as in the PDF, followed by the ward if any."""
+    if names is not None and (ward, n) in names:
+        return names[(ward, n)]
+    return "Medico %d" % (n + 1) if ward is None else "Medico %d (%s)" % (n + 1, ward)
+
+
+def shift_records(schedules, names=None, include_rest=False):
+    """
+    Yield the shifts worked in the schedules, as dictionaries with the FIELDS, by schedule, day and shift ID.
+
+    Parameters:
+    schedules (iterable): Schedules, or (ward, schedule) pairs. The ward is None for plain schedules.
+    names (dict): Names of the medics by (ward, medic) pair (see medic_name). A medic shared by several wards (see
+        HospitalScheduler) should have the same name in all of them.
+    include_rest (bool): Yield also the rest "shifts" after the nights.
+    """
+    for item in schedules:
+        ward, schedule = item if isinstance(item, tuple) else (None, item)
+        layout = schedule.layout
+        mask = layout.shift_mask if include_rest else layout.work_mask
+        kinds = [shift_kind(layout, s) for s in range(layout.num_shift_ids)]
+        medic_names = [medic_name(ward, n, names) for n in range(schedule.assignment.shape[0])]
+        days = [date(layout.year, layout.month, d + 1).isoformat() for d in range(layout.num_days)]
+        # (day, shift, medic) triples, in the order of the days
+        worked = schedule.assignment.transpose(1, 2, 0) & mask[:, :, None]
+        for d, s, n in np.argwhere(worked).tolist():
+            yield {"ward": ward, "medic": n, "name": medic_names[n], "date": days[d], "shift": s,
+                   "kind": kinds[s][0], "index": kinds[s][1]}
+
+
+def write_csv(schedules, f, names=None, include_rest=False):
+    """Write the records of shift_records to the text file f as CSV, with a header. Returns the number of rows."""
+    writer = csv.DictWriter(f, FIELDS)
+    writer.writeheader()
+    count = 0
+    for record in shift_records(schedules, names, include_rest):
+        writer.writerow(record)
+        count += 1
+    return count
+
+
+def write_json(schedules, f, names=None, include_rest=False):
+    """Write the records of shift_records to the text file f as a JSON array, one record per line. Returns the number
+    of records."""
+    count = 0
+    f.write("[")
+    for record in shift_records(schedules, names, include_rest):
+        f.write((",\n" if count else "\n") + json.dumps(record))
+        count += 1
+    f.write("\n]\n")
+    return count
+
+
+def _ical_text(value):
+    return re.sub(r"([\\;,])", r"\\\1", str(value)).replace("\n", "\\n")
+
+
+def _ical_lines(*lines):
+    """Join iCalendar content lines with CRLF, folding them at 75 octets as RFC 5545 requires."""
+    folded = []
+    for line in lines:
+        data = line.encode()
+        while len(data) > 75:
+            cut = 75
+            while cut > 0 and (data[cut] & 0xC0) == 0x80:  # do not split a UTF-8 character
+                cut -= 1
+            folded.append(data[:cut])
+            data = b" " + data[cut:]
+        folded.append(data)
+    return b"".join(line + b"\r\n" for line in folded).decode()
+
+
+def _ical_event(record, hours, stamp):
+    kind = record["kind"]
+    start_hour, end_hour = hours[kind]
+    start = datetime.fromisoformat(record["date"]) + timedelta(hours=start_hour)
+    end = datetime.fromisoformat(record["date"]) + timedelta(hours=end_hour, days=1 if end_hour <= start_hour else 0)
+    summary = LABELS[kind] if kind == "night" else "%s %d" % (LABELS[kind], record["index"])
+    if record["ward"] is not None:
+        summary += " - %s" % record["ward"]
+    uid = "%s-%s-%d-%d@shifts-scheduler" % (record["date"], re.sub(r"[^\w.-]", "_", str(record["ward"] or "")),
+                                            record["shift"], record["medic"])
+    return _ical_lines("BEGIN:VEVENT", "UID:" + uid, "DTSTAMP:" + stamp,
+                       "DTSTART:" + start.strftime("%Y%m%dT%H%M%S"), "DTEND:" + end.strftime("%Y%m%dT%H%M%S"),
+                       "SUMMARY:" + _ical_text(summary), "END:VEVENT")
+
+
+def _calendar_filename(name, used):
+    """
+    File name of the calendar of a medic: the name with the characters other than letters, digits, dots and dashes
+    replaced by "_". Names giving the same file name (e.g. "A/B" and "A B", or names differing in case only, for the
+    case-insensitive file systems) get a numeric suffix, in the order they are met; used is updated.
+    """
+    stem = re.sub(r"[^\w.-]+", "_", name).strip("_") or "medico"
+    filename, k = stem + ".ics", 1
+    while filename.lower() in used:
+        k += 1
+        filename = "%s_%d.ics" % (stem, k)
+    used.add(filename.lower())
+    return filename
+
+
+def write_icalendars(schedules, directory, names=None, hours=None):
+    """
+    Write one iCalendar file per medic, named after the medic (see medic_name and _calendar_filename), with an event
+    per work shift. The times are local ("floating") times. The events of each schedule are appended to the files
+    before the next schedule is read.
+
+    Parameters:
+    schedules (iterable): Schedules, or (ward, schedule) pairs, as in shift_records.
+    directory (str): Directory of the files (created if missing). Existing files of the same medics are replaced.
+    names (dict): Names of the medics by (ward, medic) pair: the shifts of a shared medic in several wards go to the
+        same file if the name is the same.
+    hours (dict): Start and end hour of each kind of work shift (default: SHIFT_HOURS).
+
+    Returns:
+    dict: Path of the file of each medic, by name.
+    """
+    hours = dict(SHIFT_HOURS, **(hours or {}))
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    os.makedirs(directory, exist_ok=True)
+    paths, used = {}, set()
+    events, current = {}, None
+
+    def flush():
+        for name, lines in events.items():
+            new = name not in paths
+            if new:
+                paths[name] = os.path.join(directory, _calendar_filename(name, used))
+            with open(paths[name], "w" if new else "a", newline="") as f:
+                if new:
+                    f.write(_ical_lines("BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//shifts-scheduler//export//IT",
+                                        "CALSCALE:GREGORIAN", "X-WR-CALNAME:" + _ical_text(name)))
+                f.writelines(lines)
+        events.clear()
+
+    for record in shift_records(schedules, names):
+        # A new month (or ward) starts: write the events of the previous one
+        if (record["ward"], record["date"][:7]) != current:
+            flush()
+            current = (record["ward"], record["date"][:7])
+        events.setdefault(record["name"], []).append(_ical_event(record, hours, stamp))
+    flush()
+    for path in paths.values():
+        with open(path, "a", newline="") as f:
+            f.write(_ical_lines("END:VCALENDAR"))
+    return paths
+
+
+def stored_months(store, first, last, ward=None):
+    """
+    Yield the last version of each month from first to last (both (year, month) pairs) saved in a ScheduleStore, as
+    (ward, schedule) pairs, loading each month only when it is needed. The months with no schedule are skipped.
+    """
+    for index in range(first[0] * 12 + first[1] - 1, last[0] * 12 + last[1]):
+        schedule = store.LoadVersion(index // 12, index % 12 + 1)
+        if schedule is not None:
+            yield ward, schedule
+
+
+if __name__ == '__main__':
+    def year_month(text):
+        year, month = text.split("-")
+        return int(year), int(month)
+    parser = argparse.ArgumentParser(description="Export the schedules saved in a ScheduleStore.")
+    parser.add_argument("database", help="SQLite file of the store")
+    parser.add_argument("format", choices=("csv", "json", "ical"))
+    parser.add_argument("first", type=year_month, help="first month, as YYYY-MM")
+    parser.add_argument("last", type=year_month, nargs="?", help="last month, as YYYY-MM (default: the first one)")
+    parser.add_argument("-o", "--output", help="output file (directory for ical, default: calendars); "
+                                               "standard output for csv and json if omitted")
+    parser.add_argument("--ward", help="name of the ward of the schedules")
+    parser.add_argument("--rest", action="store_true", help="include the rest shifts (csv and json)")
+    args = parser.parse_args()
+    months = stored_months(ScheduleStore(args.database), args.first, args.last or args.first, args.ward)
+    if args.format == "ical":
+        paths = write_icalendars(months, args.output or "calendars")
+        print("%d calendars written" % len(paths))
+    else:
+        write = write_csv if args.format == "csv" else write_json
+        if args.output is None:
+            write(months, sys.stdout, include_rest=args.rest)
+        else:
+            with open(args.output, "w", newline="") as f:
+                count = write(months, f, include_rest=args.rest)
+            print("%d shifts written" % count)
@@ -0,0 +1,153 @@
+from ortools.sat.python import cp_model
+from ShiftsProblem import ShiftLayout, complete_parameters
+from SolverProfile import SolverProfile
+import numpy as np
+import time
+
+'''
+Diagnosis of schedules that cannot be made.
+check_capacity is a fast check of the inputs, run before building the model: it finds the days in which the medics
+available (not in vacation and not resting after a night shift) are too few to cover the shifts.
+explain_infeasibility is run after a search proved the model infeasible: the inputs are split in groups (the
+vacations of each medic, the staffing of each day, the nights fixed by the carry-over), each one enforced by an
+assumption literal, and the solver finds a minimal set of groups that cannot be satisfied together.
+'''
+
+
+def check_capacity(parameters):
+    """
+    Compare, for each day, the shifts to cover with the shifts the available medics can work. A medic works at most
+    one shift per day (the two day shifts of the festive days if preferring full sundays), and is not available in the
+    vacation days and in the two days after a night shift, including the last day of the month after the night of the
+    second-to-last day (as in ShiftsProblem). The night shifts of the previous two days are given,
+    whenever possible, to medics in vacation on the day, so that only the unavoidable rest is counted.
+    The check is a necessary condition: a day reported cannot be covered, a day not reported may still be impossible
+    because of the other days (see explain_infeasibility).
+
+    Parameters:
+    parameters (dict): Arguments of ShiftsProblem (the omitted ones are completed with complete_parameters).
+
+    Returns:
+    list: One dictionary per day that cannot be covered, with the day (1-indexed), the number of shifts required,
+        the number of shifts the available medics can work, the number of medics in vacation and of medics resting.
+    """
+    parameters = complete_parameters(parameters)
+    layout = ShiftLayout.FromParameters(parameters)
+    num_medics, num_days = parameters["num_medics"], layout.num_days
+    on_vacation = np.zeros((num_medics, num_days), dtype=bool)
+    for n, days in enumerate(parameters["vacation_days"]):
+        on_vacation[n, [day - 1 for day in days if 1 <= day <= num_days]] = True
+    required = layout.work_mask.sum(axis=1)
+    capacity = np.ones((num_medics, num_days), dtype=int)
+    day_shifts = layout.work_mask[:, :layout.night_shift].sum(axis=1)
+    for n in parameters["medics_preferring_full_sundays"]:
+        capacity[n, layout.is_festive] = day_shifts[layout.is_festive]
+    capacity[on_vacation] = 0
+    # Medics resting in the first days after the nights of the previous month (see ShiftsProblem.BoundaryShifts)
+    resting = np.zeros((num_medics, num_days), dtype=bool)
+    carry_over = parameters.get("carry_over")
+    if carry_over is not None:
+        second_to_last_night, last_night = carry_over["previous_nights"]
+        for n, days in ((second_to_last_night, [0]), (last_night, [0, 1])):
+            if n is not None:
+                resting[n, days[:num_days]] = True
+    issues = []
+    for d in range(num_days):
+        available = capacity[:, d] * ~resting[:, d]
+        # Medics who can work the nights of the previous days without making anybody rest on day d
+        free_nights = [set(np.flatnonzero(on_vacation[:, d] & ~on_vacation[:, e] & ~resting[:, e]).tolist())
+                       for e in range(max(0, d - 2), d)]
+        unavoidable_rest = len(free_nights) - sum(1 for medics in free_nights if medics)
+        if len(free_nights) == 2 and unavoidable_rest == 0 and len(free_nights[0] | free_nights[1]) < 2:
+            unavoidable_rest = 1  # the same medic cannot work two consecutive nights
+        if required[d] > available.sum() - unavoidable_rest:
+            issues.append({"day": d + 1, "required": int(required[d]),
+                           "available": int(available.sum() - unavoidable_rest),
+                           "on_vacation": int(on_vacation[:, d].sum()),
+                           "resting": int(resting[:, d].sum() + unavoidable_rest)})
+    return issues
+
+
+def explain_infeasibility(problem, time_limit=30.0):
+    """
+    Find a minimal set of input groups that make the problem infeasible: removing any group of the set (e.g. the
+    vacations of a medic) makes the remaining groups of the set satisfiable together. The fairness targets are
+    relaxed, since they cannot make a problem infeasible (see ShiftsProblem.RelaxDeviations). The problem itself is
+    not changed.
+
+    Parameters:
+    problem (ShiftsProblem): Problem proved infeasible.
+    time_limit (float): Wall-time limit, in seconds, of all the searches.
+
+    Returns:
+    list: The conflicting groups, as dictionaries with a "kind" ("vacation" with the "medic", "staffing" with the
+        "day", 1-indexed, or "carry_over"). Empty if the problem is feasible, None if the conflict could not be found
+        within the time limit.
+    """
+    deadline = time.perf_counter() + time_limit
+    explained = problem.Clone()
+    explained.RelaxDeviations()
+    model = explained.model
+    variables = model.Proto().variables
+    model.ClearObjective()
+    model.ClearHints()
+    layout = explained.layout
+    groups = {}
+    # Vacations: the fixes of the work shifts are replaced by implications of the literal of the medic
+    for n, days in enumerate(explained.vacation_days):
+        if days:
+            enforced = model.NewBoolVar('vacation_m%i' % n)
+            for day in days:
+                for s in np.flatnonzero(layout.work_mask[day - 1]).tolist():
+                    var = explained.ShiftVar(n, day - 1, s)
+                    variables[var.Index()].domain[1] = 1
+                    model.AddImplication(enforced, var.Not())
+            groups[enforced.Index()] = {"kind": "vacation", "medic": n}
+    # Staffing: each shift can be left uncovered, unless the literal of its day is enforced
+    constraints = model.Proto().constraints
+    staffed = {}
+    for (d, s), index in explained.staffing_constraints.items():
+        if d not in staffed:
+            staffed[d] = model.NewBoolVar('staffing_d%i' % d)
+            groups[staffed[d].Index()] = {"kind": "staffing", "day": d + 1}
+        uncovered = model.NewBoolVar('uncovered_d%is%i' % (d, s))
+        constraints[index].exactly_one.literals.append(uncovered.Index())
+        model.AddImplication(staffed[d], uncovered.Not())
+    # Carry-over: the fixed rest and night shifts are replaced by implications of a single literal
+    boundary = explained.BoundaryShifts()
+    if boundary:
+        enforced = model.NewBoolVar('carry_over')
+        for n, d, s in boundary:
+            var = explained.ShiftVar(n, d, s)
+            variables[var.Index()].domain[0] = 0
+            model.AddImplication(enforced, var)
+        groups[enforced.Index()] = {"kind": "carry_over"}
+
+    def conflict(assumptions):
+        """Return a subset of the assumptions that is infeasible, [] if they are satisfiable, None on timeout."""
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return None
+        model.ClearAssumptions()
+        model.AddAssumptions([model.GetBoolVarFromProtoIndex(index) for index in assumptions])
+        # The assumptions are reported by the sequential search only, without the interleaved strategies
+        solver = SolverProfile(time_limit=remaining, num_workers=1).Apply(cp_model.CpSolver())
+        solver.parameters.interleave_search = False
+        status = solver.Solve(model)
+        if status == cp_model.INFEASIBLE:
+            return list(solver.SufficientAssumptionsForInfeasibility()) or list(assumptions)
+        return [] if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None
+
+    core = conflict(list(groups))
+    if not core:
+        return core
+    # Deletion-based minimization: drop each group in turn, keeping it only if the rest becomes satisfiable
+    for literal in list(core):
+        if literal not in core:
+            continue
+        smaller = conflict([other for other in core if other != literal])
+        if smaller is None:
+            break
+        if smaller:
+            core = smaller
+    return [groups[literal] for literal in sorted(core)]
@@ -0,0 +1,329 @@
+from collections import OrderedDict
+from Feasibility import check_capacity
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from Metrics import Metrics
+from Refinement import Refinement
+from Rendering import render_pdf
+from Scenarios import PER_MEDIC_PARAMETERS
+from ScheduleStore import ScheduleStore
+from ShiftsProblem import ShiftsProblem, complete_parameters, input_hash
+from SolverProfile import SolverProfile
+from SolveJob import SolveJob
+import argparse
+import inspect
+import json
+import logging
+import queue
+import sys
+import threading
+import uuid
+
+'''
+Entry points that do not need the Streamlit UI:
+    python Headless.py solve request.json -o schedule.json --pdf schedule.pdf [--refine] [--store schedules.db]
+    python Headless.py serve --port 8000 --workers 2 --queue-size 16
+With --store, a request already solved with the same solver options (or proved optimal) is answered from the
+ScheduleStore without searching, and the new schedules are saved in it (the last one of the month is the starting
+point of the search).
+With --log, the phases and the searches of each request are also written on the standard error as JSON lines (see
+Metrics), tagged with the id of the job in the service.
+A request is a JSON object with the arguments of ShiftsProblem (the omitted ones are completed with
+complete_parameters) and an optional "profile" object with the arguments of SolverProfile. The --preset and
+--time-limit options of solve replace the same options of the request's profile, keeping the others.
+
+The service exposes:
+    POST   /jobs             submit a request, answers {"id": ..., "status": "queued"} (400 if the request is not
+                             valid, 503 if the queue is full, 422 with the days that cannot be covered, see
+                             Feasibility.check_capacity)
+    GET    /jobs/<id>        status of the job, progress of the search and, once finished, time of each phase
+    GET    /jobs/<id>/result schedule as JSON (see Schedule.ToDict)
+    GET    /jobs/<id>/pdf    schedule as PDF
+    DELETE /jobs/<id>        cancel the job (a running search stops, keeping the best schedule found so far)
+/result and /pdf answer 409 while the job is queued or running, 410 if it was cancelled before its search started.
+The last finished jobs are kept for polling (see JobQueue).
+'''
+
+
+def _arguments(function, excluded=()):
+    """Return the names of all the arguments of a function and of the ones without a default value."""
+    parameters = [p for name, p in inspect.signature(function).parameters.items() if name not in excluded]
+    return {p.name for p in parameters}, {p.name for p in parameters if p.default is inspect.Parameter.empty}
+
+
+# Arguments of ShiftsProblem and of SolverProfile that a request can give (the model and the metrics are not inputs)
+REQUEST_ARGUMENTS, REQUIRED_ARGUMENTS = _arguments(ShiftsProblem.__init__, ("self", "model", "metrics"))
+PROFILE_ARGUMENTS, _ = _arguments(SolverProfile.__init__, ("self",))
+
+
+def parse_request(request, profile_options=None):
+    """
+    Split a request into the arguments of ShiftsProblem and a SolverProfile. Raises ValueError if the request has
+    unknown arguments, lacks some required ones or has per-medic arguments that do not match the number of medics, so
+    that it is rejected before being queued.
+
+    Parameters:
+    request (dict): The request (see above).
+    profile_options (dict): Arguments of SolverProfile replacing the ones of the profile of the request (e.g. from the
+        command line); the options not given are taken from the request.
+    """
+    request = dict(request)
+    options = dict(request.pop("profile", None) or {}, **(profile_options or {}))
+    unknown = sorted(set(request) - REQUEST_ARGUMENTS)
+    unknown += sorted("profile." + key for key in set(options) - PROFILE_ARGUMENTS)
+    if unknown:
+        raise ValueError("unknown arguments: %s" % ", ".join(unknown))
+    # complete_parameters needs the number of medics
+    parameters = complete_parameters(request) if "num_medics" in request else request
+    missing = sorted(REQUIRED_ARGUMENTS - set(parameters))
+    if missing:
+        raise ValueError("missing arguments: %s" % ", ".join(missing))
+    num_medics = int(parameters["num_medics"])
+    for key in PER_MEDIC_PARAMETERS:
+        if len(parameters[key]) != num_medics:
+            raise ValueError("%s has %d values for %d medics" % (key, len(parameters[key]), num_medics))
+    if any(not 0 <= n < num_medics for n in parameters["medics_preferring_full_sundays"]):
+        raise ValueError("medics_preferring_full_sundays has medics beyond the %d medics" % num_medics)
+    return parameters, SolverProfile(**options)
+
+
+class ServiceJob:
+    """A request submitted to the service, from the queue to the finished schedule."""
+    def __init__(self, parameters, profile):
+        self.id = uuid.uuid4().hex
+        self.parameters = parameters
+        self.profile = profile
+        self.status = "queued"  # queued, running, done, failed, cancelled
+        self.error = None
+        self.solve_job = None
+        self.lock = threading.Lock()
+
+    def Run(self):
+        with self.lock:
+            if self.status == "cancelled":
+                return
+            self.status = "running"
+        try:
+            solve_job = SolveJob(ShiftsProblem(**self.parameters, metrics=Metrics(self.id)), self.profile)
+            with self.lock:
+                if self.status == "cancelled":  # while the model was built: the job has no schedule
+                    return
+                self.solve_job = solve_job
+            solve_job.Run()
+            if solve_job.error is not None:
+                raise solve_job.error
+        except Exception as e:
+            with self.lock:
+                self.status, self.error = "failed", str(e)
+            return
+        with self.lock:
+            if self.status == "running":
+                self.status = "done"
+
+    def Cancel(self):
+        with self.lock:
+            if self.status in ("queued", "running"):
+                self.status = "cancelled"
+            if self.solve_job is not None:
+                self.solve_job.Stop()
+
+    def Describe(self):
+        with self.lock:
+            description = {"id": self.id, "status": self.status}
+            if self.error is not None:
+                description["error"] = self.error
+            solve_job = self.solve_job
+        if solve_job is not None:
+            progress = solve_job.Progress()
+            description["solutions_found"] = len(progress)
+            if progress:
+                description["objective"] = progress[-1]["objective"]
+                description["best_bound"] = progress[-1]["best_bound"]
+                description["wall_time"] = progress[-1]["wall_time"]
+            if not solve_job.IsRunning():
+                description["metrics"] = solve_job.problem.metrics.Summary()
+        return description
+
+    def IsFinished(self):
+        return self.solve_job is not None and not self.solve_job.IsRunning() and self.solve_job.result is not None
+
+    def IsCancelledBeforeSearch(self):
+        with self.lock:
+            return self.status == "cancelled" and self.solve_job is None
+
+
+class JobQueue:
+    """
+    Bounded queue of ServiceJob served by a fixed pool of worker threads. The CP-SAT search releases the GIL, so the
+    searches of different jobs run in parallel. The last max_finished_jobs finished jobs are kept for polling: the
+    older ones are dropped whenever a job finishes or is submitted.
+    """
+    def __init__(self, num_workers=2, queue_size=16, max_finished_jobs=256):
+        self.max_finished_jobs = max_finished_jobs
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._Work, daemon=True) for _ in range(num_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def _Work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.Run()
+            finally:
+                self._Prune()
+                self._queue.task_done()
+
+    def _Prune(self):
+        """Drop the oldest finished jobs beyond max_finished_jobs."""
+        with self._lock:
+            finished = [key for key, other in self._jobs.items() if other.status in ("done", "failed", "cancelled")]
+            for key in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+                del self._jobs[key]
+
+    def Submit(self, job):
+        """Queue a job. Raises queue.Full if the queue is full."""
+        self._queue.put_nowait(job)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._Prune()
+        return job
+
+    def Get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    jobs = None  # JobQueue, set by serve
+
+    def _Send(self, code, body, content_type="application/json"):
+        if content_type == "application/json":
+            body = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _Job(self):
+        """Return (job, action) from the path /jobs/<id>[/<action>], or send 404 and return (None, None)."""
+        parts = self.path.strip("/").split("/")
+        job = self.jobs.Get(parts[1]) if len(parts) in (2, 3) and parts[0] == "jobs" else None
+        if job is None:
+            self._Send(404, {"error": "job not found"})
+            return None, None
+        return job, parts[2] if len(parts) == 3 else None
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self._Send(404, {"error": "not found"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            parameters, profile = parse_request(request)
+            issues = check_capacity(parameters)
+        except (ValueError, TypeError, KeyError, IndexError) as e:
+            return self._Send(400, {"error": "invalid request: %s" % e})
+        if issues:
+            return self._Send(422, {"error": "some days cannot be covered", "issues": issues})
+        try:
+            job = self.jobs.Submit(ServiceJob(parameters, profile))
+        except queue.Full:
+            return self._Send(503, {"error": "too many queued jobs, retry later"})
+        self._Send(202, job.Describe())
+
+    def do_GET(self):
+        job, action = self._Job()
+        if job is None:
+            return
+        if action is None:
+            return self._Send(200, job.Describe())
+        if action not in ("result", "pdf"):
+            return self._Send(404, {"error": "not found"})
+        if job.IsCancelledBeforeSearch():
+            return self._Send(410, dict(job.Describe(), error="the job was cancelled before its search started"))
+        if not job.IsFinished():
+            return self._Send(409, job.Describe())
+        if action == "result":
+            return self._Send(200, job.solve_job.problem.Schedule().ToDict())
+        if not job.solve_job.result.feasible:
+            return self._Send(409, job.Describe())
+        self._Send(200, render_pdf(job.solve_job.problem), "application/pdf")
+
+    def do_DELETE(self):
+        job, action = self._Job()
+        if job is None:
+            return
+        job.Cancel()
+        self._Send(200, job.Describe())
+
+
+def solve(args):
+    options = {key: value for key, value in (("time_limit", args.time_limit), ("preset", args.preset))
+               if value is not None}
+    with open(args.request) as f:
+        parameters, profile = parse_request(json.load(f), options)
+    issues = check_capacity(parameters)
+    if issues:
+        print(json.dumps({"error": "some days cannot be covered", "issues": issues}, indent=1), file=sys.stderr)
+        return 1
+    store = ScheduleStore(args.store) if args.store is not None else None
+    schedule = store.Load(input_hash(parameters), profile) if store is not None else None
+    if schedule is None:
+        problem = ShiftsProblem(**parameters)
+        hint = store.Hint(problem) if store is not None else None
+        if hint is not None:
+            problem.SetHint(hint)
+        if args.refine:
+            time_limit = profile.time_limit if profile.time_limit is not None else 60.0
+            Refinement(problem, time_limit, max_workers=profile.num_workers, seed=profile.random_seed or 0).Run()
+        else:
+            problem.Solve(profile)
+        if store is not None and problem.result.feasible:
+            store.Save(problem, profile=profile)
+        schedule = problem.Schedule()
+    result = schedule.result
+    data = json.dumps(schedule.ToDict(), indent=1)
+    if args.output is None:
+        print(data)
+    else:
+        with open(args.output, "w") as f:
+            f.write(data)
+    if args.pdf is not None and result.feasible:
+        with open(args.pdf, "wb") as f:
+            f.write(render_pdf(schedule))
+    return 0 if result.feasible else 1
+
+
+def serve(args):
+    ServiceHandler.jobs = JobQueue(args.workers, args.queue_size)
+    server = ThreadingHTTPServer((args.host, args.port), ServiceHandler)
+    print("Serving on http://%s:%d" % (args.host, args.port))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shift scheduling without the Streamlit UI.")
+    parser.add_argument("--log", action="store_true", help="write the JSON log lines on the standard error")
+    commands = parser.add_subparsers(dest="command", required=True)
+    solve_parser = commands.add_parser("solve", help="solve one request")
+    solve_parser.add_argument("request", help="JSON file with the request")
+    solve_parser.add_argument("-o", "--output", help="JSON file for the schedule (default: standard output)")
+    solve_parser.add_argument("--pdf", help="PDF file for the schedule table")
+    solve_parser.add_argument("--time-limit", type=float, help="time limit of the search in seconds")
+    solve_parser.add_argument("--preset", help="solver preset")
+    solve_parser.add_argument("--refine", action="store_true",
+                              help="refine a first schedule with large neighborhood search (for large rosters)")
+    solve_parser.add_argument("--store", help="SQLite file of the ScheduleStore to reuse and save the schedules")
+    serve_parser = commands.add_parser("serve", help="run the HTTP solve service")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--workers", type=int, default=2, help="jobs solved at the same time")
+    serve_parser.add_argument("--queue-size", type=int, default=16, help="maximum number of queued jobs")
+    args = parser.parse_args()
+    if args.log:
+        logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    if args.command == "solve":
+        sys.exit(solve(args))
+    serve(args)
@@ -0,0 +1,170 @@
+from concurrent.futures import ProcessPoolExecutor
+from ortools.sat.python import cp_model
+from ShiftsProblem import ShiftsProblem, Schedule, empty_carry_over
+from SolverProfile import SolverProfile, SolveResult
+import calendar
+
+'''
+Ways of scheduling several consecutive months:
+"sequential": the months are solved one after the other. Each month receives the carry-over of the previous one: the
+    medics who worked the last two nights rest in the first days, and the shifts owed by each medic are added to the
+    desired number of shifts, so that the schedule stays balanced over the whole horizon.
+"parallel": the night shifts of the last two days of each month are fixed in advance, rotating among the medics not
+    in vacation. The months are then independent and are solved concurrently in a process pool. The shifts owed are
+    not carried over: each month is balanced on its own.
+"single": all the months are solved in a single model, linked by the rest constraints across the month boundaries.
+    Suitable for short horizons (e.g. a quarter).
+'''
+MODES = ("sequential", "parallel", "single")
+
+
+def solve_month(parameters, profile=None):
+    """Build and solve a ShiftsProblem from its arguments. Defined at module level to run in worker processes."""
+    problem = ShiftsProblem(**parameters)
+    problem.Solve(profile)
+    return problem.Schedule()
+
+
+class HorizonScheduler:
+    """
+    Schedule several consecutive months with the same medics.
+
+    Parameters:
+    month_parameters (list): Arguments of ShiftsProblem (as dictionaries) for each month, in chronological order.
+    profile (SolverProfile): Options of the search of each month (of the whole horizon in "single" mode). In
+        "parallel" mode, set num_workers so that max_workers * num_workers does not exceed the available cores.
+    mode (str): One of MODES.
+    max_workers (int): Number of worker processes in "parallel" mode (default: one per core).
+    carry_over (dict): Boundary state from the month before the horizon (see empty_carry_over), or None.
+    """
+    def __init__(self, month_parameters, profile=None, mode="sequential", max_workers=None, carry_over=None):
+        if mode not in MODES:
+            raise ValueError("Unknown horizon mode '%s', available modes: %s" % (mode, ", ".join(MODES)))
+        if len({p["num_medics"] for p in month_parameters}) > 1:
+            raise ValueError("All the months of the horizon must have the same number of medics")
+        for previous, following in zip(month_parameters, month_parameters[1:]):
+            if (following["year"] * 12 + following["month"]) - (previous["year"] * 12 + previous["month"]) != 1:
+                raise ValueError("The months of the horizon must be consecutive (%d/%d is followed by %d/%d)" %
+                                 (previous["month"], previous["year"], following["month"], following["year"]))
+        self.month_parameters = [dict(p) for p in month_parameters]
+        self.profile = profile if profile is not None else SolverProfile()
+        self.mode = mode
+        self.max_workers = max_workers
+        self.carry_over = carry_over
+
+    @classmethod
+    def FromBase(cls, base_parameters, start_month, start_year, num_months, overrides=None, **kwargs):
+        """
+        Build the horizon from the arguments shared by all the months (staffing counts, preferences, additional
+        shifts), starting from start_month/start_year. overrides maps (year, month) to the arguments specific to
+        that month (festive_days_no_sundays, vacation_days, ...). By default a month has no festive days besides
+        the sundays and no vacations.
+        """
+        overrides = overrides or {}
+        month_parameters = []
+        for k in range(num_months):
+            year, month = start_year + (start_month - 1 + k) // 12, (start_month - 1 + k) % 12 + 1
+            parameters = dict(base_parameters, month=month, year=year)
+            parameters.setdefault("festive_days_no_sundays", [])
+            parameters.setdefault("vacation_days", [[] for _ in range(base_parameters["num_medics"])])
+            parameters.update(overrides.get((year, month), {}))
+            month_parameters.append(parameters)
+        return cls(month_parameters, **kwargs)
+
+    def Solve(self):
+        """
+        Returns:
+        list: One Schedule per month. In "sequential" mode the list stops at the first month without a solution,
+            since the following months depend on its carry-over.
+        """
+        if self.mode == "sequential":
+            return self._SolveSequential()
+        if self.mode == "parallel":
+            return self._SolveParallel()
+        return self._SolveSingleModel()
+
+    def _SolveSequential(self):
+        schedules = []
+        carry_over = self.carry_over
+        for parameters in self.month_parameters:
+            schedule = solve_month(dict(parameters, carry_over=carry_over), self.profile)
+            schedules.append(schedule)
+            if not schedule.result.feasible:
+                break
+            carry_over = schedule.CarryOver()
+        return schedules
+
+    def _SolveParallel(self):
+        num_medics = self.month_parameters[0]["num_medics"]
+        previous_nights = self.carry_over["previous_nights"] if self.carry_over is not None else [None, None]
+        month_parameters = []
+        for k, parameters in enumerate(self.month_parameters):
+            carry_over = empty_carry_over(num_medics)
+            carry_over["previous_nights"] = previous_nights
+            if k < len(self.month_parameters) - 1:
+                carry_over["final_nights"] = self._BoundaryNights(parameters, k)
+                previous_nights = carry_over["final_nights"]
+            month_parameters.append(dict(parameters, carry_over=carry_over))
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(solve_month, month_parameters, [self.profile] * len(month_parameters)))
+
+    @staticmethod
+    def _BoundaryNights(parameters, k):
+        """
+        Choose the two (distinct) medics working the night shift of the second-to-last and last day of the k-th
+        month, rotating with k among the medics not in vacation on those days.
+        """
+        num_medics = parameters["num_medics"]
+        num_days = calendar.monthrange(parameters["year"], parameters["month"])[1]
+        nights = []
+        for i, day in enumerate((num_days - 1, num_days)):  # 1-indexed days, as vacation_days
+            for j in range(num_medics):
+                n = (2 * k + i + j) % num_medics
+                if n not in nights and day not in parameters["vacation_days"][n]:
+                    nights.append(n)
+                    break
+            else:
+                nights.append(None)
+        return nights
+
+    def _SolveSingleModel(self):
+        model = cp_model.CpModel()
+        problems = []
+        for k, parameters in enumerate(self.month_parameters):
+            carry_over = self.carry_over if k == 0 else None
+            problem = ShiftsProblem(**dict(parameters, carry_over=carry_over), model=model)
+            if problems:
+                self._LinkMonths(model, problems[-1], problem)
+            problems.append(problem)
+        model.Minimize(cp_model.LinearExpr.Sum([problem.sum_aux_vars for problem in problems]))
+        solver = self.profile.Apply(cp_model.CpSolver())
+        status = solver.Solve(model)
+        if status == cp_model.INFEASIBLE:
+            # As in ShiftsProblem.Solve, the limits on the deviations may have excluded all the schedules
+            for problem in problems:
+                problem.RelaxDeviations()
+            solver = self.profile.Apply(cp_model.CpSolver())
+            status = solver.Solve(model)
+        result = SolveResult(solver, status)
+        schedules = []
+        for problem in problems:
+            assignment = problem.ExtractAssignment(solver) if result.feasible else None
+            schedules.append(Schedule(problem.parameters, result, assignment, problem.desired_shifts,
+                                      problem.metrics))
+        return schedules
+
+    @staticmethod
+    def _LinkMonths(model, previous, following):
+        """
+        Two rest days after the night shifts of the last two days of the previous month: the rest of the following
+        month's first days. The rest on the last day of the previous month, after its second-to-last night, is
+        already part of the month (see ShiftsProblem).
+        """
+        last_day = previous.layout.num_days - 1
+        night, first_rest, second_rest = (following.layout.night_shift, following.layout.first_rest_shift,
+                                          following.layout.second_rest_shift)
+        for n in previous.all_medics:
+            last_night = previous.ShiftVar(n, last_day, night)
+            model.Add(last_night == following.ShiftVar(n, 0, first_rest))
+            model.Add(last_night == following.ShiftVar(n, 1, second_rest))
+            model.Add(previous.ShiftVar(n, last_day - 1, night) == following.ShiftVar(n, 0, second_rest))
@@ -0,0 +1,384 @@
+from concurrent.futures import ProcessPoolExecutor
+from HorizonScheduler import solve_month
+from ortools.sat.python import cp_model
+from ShiftsProblem import boundary_shifts, complete_parameters
+from SolverProfile import SolverProfile
+import argparse
+import calendar
+import copy
+import json
+import numpy as np
+import time
+
+'''
+Scheduling of the wards of a hospital in the same month, with some medics ("shared medics") working in several
+wards. Each ward is a ShiftsProblem with its own medics and staffing, and a shared medic is one of the medics of each
+of its wards. The wards are solved as independent problems in parallel processes, so that the time grows with the
+largest ward rather than with the sum of the wards.
+The days of each shared medic are first split among its wards, in blocks of consecutive days in proportion to its
+shares: in the other days the medic is in vacation for the ward. The wards are then reconciled with one of the
+COORDINATIONS:
+"split": the split is kept. The conflicts across the wards (a shared medic working in a ward on the same day as in
+    another ward, or in the two days after a night shift in another ward) are repaired by adding those days to the
+    vacations of the medic in the second ward, solving again only the wards changed, until no conflict is left.
+"reassign": after the repair of "split", the shifts of the wards with shared medics are assigned again by a small
+    model: a shift worked by a shared medic can go to any medic of its ward, and a shift worked by another medic can
+    stay with it or go to a shared medic of the ward, with at most one shift per day and the rest after the night
+    shifts across all the wards, minimizing the deviation of each medic from its desired shifts (of a shared medic,
+    the sum over its wards). The split blocks bind only the first solve: a shared medic can take the shifts of
+    another one in any of its wards. The nights fixed by the carry-over and the double shifts of the medics
+    preferring full sundays are kept, and the schedule of "split" is the hint (and the result, if the model is not
+    solved within its time limit).
+Shared medics cannot prefer full sundays. The carry-over of a ward is given for the ward alone, but the rest after the
+nights of the previous month binds a shared medic in all its wards.
+If a ward has no schedule (its search found none, e.g. after the repair added vacations to a shared medic), its
+conflicts cannot be checked: the repair stops, the ward is listed in infeasible_wards and "reassign" is skipped.
+'''
+COORDINATIONS = ("split", "reassign")
+
+
+class HospitalScheduler:
+    """
+    Schedule the wards of a hospital with shared medics (see above).
+
+    Parameters:
+    wards (dict): Arguments of ShiftsProblem of each ward, by name (the omitted ones are completed with
+        complete_parameters). All the wards must be in the same month.
+    shared_medics (list): One dictionary per shared medic: "wards" maps the name of each of its wards to the
+        (0-indexed) medic it is in that ward, the optional "shares" maps the names of the wards to the relative
+        number of days worked in each one (default: the same), the optional "name" identifies it in the results.
+    profile (SolverProfile): Options of the search of each ward. Set num_workers so that max_workers * num_workers
+        does not exceed the available cores.
+    coordination (str): One of COORDINATIONS.
+    max_workers (int): Number of worker processes (default: one per core).
+    block_days (int): Length of the blocks of consecutive days in which the days of the shared medics are split.
+    max_rounds (int): Maximum number of rounds repairing the conflicts.
+    coordination_time_limit (float): Time limit, in seconds, of the search of the "reassign" coordination.
+    """
+    def __init__(self, wards, shared_medics, profile=None, coordination="reassign", max_workers=None, block_days=7,
+                 max_rounds=5, coordination_time_limit=30.0):
+        if coordination not in COORDINATIONS:
+            raise ValueError("Unknown coordination '%s', available coordinations: %s" %
+                             (coordination, ", ".join(COORDINATIONS)))
+        self.wards = {name: complete_parameters(parameters) for name, parameters in wards.items()}
+        if len({(p["year"], p["month"]) for p in self.wards.values()}) > 1:
+            raise ValueError("All the wards must be scheduled in the same month")
+        used = set()
+        for medic in shared_medics:
+            for ward, n in medic["wards"].items():
+                if ward not in self.wards:
+                    raise ValueError("Unknown ward '%s' of a shared medic" % ward)
+                if not 0 <= n < self.wards[ward]["num_medics"] or (ward, n) in used:
+                    raise ValueError("Medic %d of ward '%s' is not a valid shared medic" % (n, ward))
+                if n in self.wards[ward]["medics_preferring_full_sundays"]:
+                    raise ValueError("Shared medics cannot prefer full sundays (medic %d of ward '%s')" % (n, ward))
+                used.add((ward, n))
+        self.shared_medics = [dict(medic, name=medic.get("name", "shared %d" % i))
+                              for i, medic in enumerate(shared_medics)]
+        self.profile = profile if profile is not None else SolverProfile()
+        self.coordination = coordination
+        self.max_workers = max_workers
+        self.block_days = block_days
+        self.max_rounds = max_rounds
+        self.coordination_time_limit = coordination_time_limit
+        self.ward_parameters = None  # arguments of each ward after the split, see Split
+        self.conflicts = []  # conflicts left after Solve
+        self.infeasible_wards = []  # wards without a schedule after Solve
+        self.num_rounds = 0  # repair rounds of the last Solve
+        self.reassigned = False  # whether the "reassign" coordination succeeded in the last Solve
+        self.wall_time = None
+
+    def Split(self):
+        """
+        Split the days of each shared medic among its wards, in blocks of block_days days. Each block goes to the
+        ward furthest behind its share; the first ward is rotated among the shared medics, so that they do not all
+        work in the same ward in the same days. The vacations of a shared medic in any ward apply to all its wards.
+
+        Returns:
+        dict: Arguments of ShiftsProblem of each ward, with the days assigned to the other wards in vacation.
+        """
+        any_ward = next(iter(self.wards.values()))
+        num_days = calendar.monthrange(any_ward["year"], any_ward["month"])[1]
+        parameters = {name: dict(p, vacation_days=[list(days) for days in p["vacation_days"]])
+                      for name, p in self.wards.items()}
+        for i, medic in enumerate(self.shared_medics):
+            wards = list(medic["wards"])
+            weights = [medic.get("shares", {}).get(ward, 1) for ward in wards]
+            vacation = set()
+            for ward in wards:
+                vacation.update(self.wards[ward]["vacation_days"][medic["wards"][ward]])
+            counts, owner = [0] * len(wards), []
+            for k, first in enumerate(range(0, num_days, self.block_days)):
+                j = max(range(len(wards)), key=lambda j: (weights[j] * (k + 1) / sum(weights) - counts[j],
+                                                          -((j - i) % len(wards))))
+                counts[j] += 1
+                owner.extend([j] * min(self.block_days, num_days - first))
+            for j, ward in enumerate(wards):
+                other_days = {d + 1 for d in range(num_days) if owner[d] != j}
+                parameters[ward]["vacation_days"][medic["wards"][ward]] = sorted(vacation | other_days)
+        return parameters
+
+    def Solve(self):
+        """
+        Returns:
+        dict: The Schedule of each ward, by name. The schedules of the wards with shared medics reflect the
+            coordination. After "reassign" their result is no longer the one of the search of the ward: its objective
+            is the sum of the deviations of the new schedule, its status FEASIBLE and it has no bound.
+        """
+        start = time.perf_counter()
+        self.ward_parameters = self.Split()
+        schedules = self._SolveWards(list(self.wards))
+        self.num_rounds = 0
+        conflicts = self.Conflicts(schedules)
+        while conflicts and not self._InfeasibleWards(schedules) and self.num_rounds < self.max_rounds:
+            self.num_rounds += 1
+            changed = set()
+            for conflict in conflicts:
+                ward = conflict["ward"]
+                vacation_days = self.ward_parameters[ward]["vacation_days"][
+                    self.shared_medics[conflict["medic"]]["wards"][ward]]
+                if conflict["day"] not in vacation_days:
+                    vacation_days.append(conflict["day"])
+                    vacation_days.sort()
+                    changed.add(ward)
+            schedules.update(self._SolveWards(sorted(changed)))
+            conflicts = self.Conflicts(schedules)
+        self.infeasible_wards = self._InfeasibleWards(schedules)
+        self.reassigned = self.coordination == "reassign" and not conflicts and not self.infeasible_wards and \
+            self._Reassign(schedules)
+        self.conflicts = conflicts
+        self.wall_time = time.perf_counter() - start
+        return schedules
+
+    def _SolveWards(self, names):
+        """Solve the given wards in parallel processes, returning their Schedule by name."""
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            schedules = executor.map(solve_month, [self.ward_parameters[name] for name in names],
+                                     [self.profile] * len(names))
+            return dict(zip(names, schedules))
+
+    @staticmethod
+    def _InfeasibleWards(schedules):
+        return sorted(name for name, schedule in schedules.items() if schedule.assignment is None)
+
+    def _Rests(self, ward, assignment, layout):
+        """
+        Return the days of the first and second rest after a night shift of each medic of a ward (boolean arrays of
+        shape (num_medics, num_days)): after the nights of the assignment, and after the nights of the previous month
+        in the carry-over of the ward. Unlike the rest "shifts" of the assignment, the rests of the first two days
+        that the carry-over does not force are false (the model leaves them free, see ShiftsProblem.BoundaryShifts).
+        """
+        nights = assignment[:, :, layout.night_shift]
+        first_rest, second_rest = np.zeros_like(nights), np.zeros_like(nights)
+        first_rest[:, 1:] = nights[:, :-1]
+        second_rest[:, 2:] = nights[:, :-2]
+        for n, d, s in boundary_shifts(self.wards[ward].get("carry_over"), layout):
+            if s == layout.first_rest_shift:
+                first_rest[n, d] = True
+            elif s == layout.second_rest_shift:
+                second_rest[n, d] = True
+        return first_rest, second_rest
+
+    def _SharedDays(self, schedules, medic):
+        """
+        Return, for each ward of a shared medic with a schedule, its work days and the days of its first and second
+        rest after a night shift (boolean arrays, see _Rests).
+        """
+        days = {}
+        for ward, n in medic["wards"].items():
+            schedule = schedules[ward]
+            if schedule.assignment is not None:
+                layout = schedule.layout
+                first_rest, second_rest = self._Rests(ward, schedule.assignment, layout)
+                days[ward] = ((schedule.assignment[n] & layout.work_mask).any(axis=1), first_rest[n], second_rest[n])
+        return days
+
+    def Conflicts(self, schedules):
+        """
+        Find the days in which a shared medic works in two wards ("double"), or works in a ward in the two days after
+        a night shift in another ward ("rest"). The wards without a schedule are not checked (see infeasible_wards).
+
+        Returns:
+        list: One dictionary per conflict, with the kind, the shared medic (index in shared_medics), the ward and
+            the day (1-indexed) to free, and the ward and day of the other shift (0 or less for the nights of the
+            previous month).
+        """
+        conflicts = []
+        for i, medic in enumerate(self.shared_medics):
+            days = self._SharedDays(schedules, medic)
+            for ward, (work, _, _) in days.items():
+                for other, (other_work, first_rest, second_rest) in days.items():
+                    if other == ward:
+                        continue
+                    if ward > other:
+                        for d in np.flatnonzero(work & other_work).tolist():
+                            conflicts.append({"kind": "double", "medic": i, "ward": ward, "day": d + 1,
+                                              "other_ward": other, "other_day": d + 1})
+                    # The rest shifts of the other ward follow its nights, as in ShiftsProblem
+                    for after, rest in ((1, first_rest), (2, second_rest)):
+                        for e in np.flatnonzero(work & rest).tolist():
+                            conflicts.append({"kind": "rest", "medic": i, "ward": ward, "day": e + 1,
+                                              "other_ward": other, "other_day": e + 1 - after})
+        return conflicts
+
+    def _Reassign(self, schedules):
+        """
+        Assign again the shifts of the wards with shared medics (see "reassign" above), changing the schedules in
+        place. Returns True if an assignment was found.
+        """
+        members = {}  # ward -> {medic in the ward: shared medic}
+        for i, medic in enumerate(self.shared_medics):
+            for ward, n in medic["wards"].items():
+                members.setdefault(ward, {})[n] = i
+        if not members or any(schedules[ward].assignment is None for ward in members):
+            return False
+
+        def person(ward, n):
+            """A shared medic is identified by its index in shared_medics, another medic by its ward and index."""
+            return members[ward].get(n, (ward, n))
+
+        # Days off of each person: the vacations (of a shared medic, in any of its wards) and the rest after the
+        # nights of the previous month (see ShiftsProblem.BoundaryShifts)
+        days_off = {}
+        for ward in members:
+            layout = schedules[ward].layout
+            for n in range(self.wards[ward]["num_medics"]):
+                days_off.setdefault(person(ward, n), set()).update(
+                    day - 1 for day in self.wards[ward]["vacation_days"][n])
+            for n, d, s in boundary_shifts(self.wards[ward].get("carry_over"), layout):
+                if not layout.work_mask[d, s]:
+                    days_off[person(ward, n)].add(d)
+        model = cp_model.CpModel()
+        x = {}  # (person, ward, day, shift) -> variable
+        for ward, medics in members.items():
+            schedule = schedules[ward]
+            layout = schedule.layout
+            roster = schedule.Roster()
+            full_sundays = set(self.wards[ward]["medics_preferring_full_sundays"])
+            carry_over = self.wards[ward].get("carry_over") or {}
+            final_nights = carry_over.get("final_nights") or [None, None]
+            fixed = {(layout.num_days - 2 + k, layout.night_shift) for k, n in enumerate(final_nights) if n is not None}
+            others = [n for n in range(self.wards[ward]["num_medics"]) if n not in medics]
+            for d, s in zip(*np.nonzero(layout.work_mask)):
+                d, s, m = int(d), int(s), int(roster[d, s])
+                festive = bool(layout.is_festive[d])
+                if (d, s) in fixed or (festive and m in full_sundays):
+                    candidates = [m]
+                elif m in medics:
+                    candidates = list(medics) + [n for n in others if not (festive and n in full_sundays)]
+                else:
+                    candidates = [m] + list(medics)
+                slot = []
+                for n in candidates:
+                    p = person(ward, n)
+                    if n == m or d not in days_off[p]:
+                        x[(p, ward, d, s)] = model.NewBoolVar('x_%s_%sd%is%i' % (p, ward, d, s))
+                        model.AddHint(x[(p, ward, d, s)], int(n == m))
+                        slot.append(x[(p, ward, d, s)])
+                model.AddExactlyOne(slot)
+        num_days = next(iter(schedules.values())).layout.num_days
+        work, nights, totals = {}, {}, {}
+        for (p, ward, d, s), var in x.items():
+            layout = schedules[ward].layout
+            work.setdefault(p, [[] for _ in range(num_days)])[d].append(var)
+            nights.setdefault(p, [[] for _ in range(num_days)])
+            totals.setdefault(p, ([], [], []))  # shifts, festive shifts, night shifts, as in ShiftsProblem
+            totals[p][0].append(var)
+            if layout.is_festive[d]:
+                totals[p][1].append(var)
+            if s == layout.night_shift:
+                nights[p][d].append(var)
+                totals[p][2].append(var)
+        deviations = []
+        for p in work:
+            # The double shifts of the festive days are fixed (see above)
+            double_days = set()
+            if not isinstance(p, int) and p[1] in self.wards[p[0]]["medics_preferring_full_sundays"]:
+                double_days = set(np.flatnonzero(schedules[p[0]].layout.is_festive).tolist())
+            for d in range(num_days):
+                if d not in double_days:
+                    model.AddAtMostOne(work[p][d])
+                for night in nights[p][d]:
+                    for var in sum((work[p][e] for e in (d + 1, d + 2) if e < num_days), []):
+                        model.AddImplication(night, var.Not())
+            if isinstance(p, int):
+                desired = sum(np.asarray(schedules[ward].desired_shifts)[:, n]
+                              for ward, n in self.shared_medics[p]["wards"].items())
+            else:
+                desired = np.asarray(schedules[p[0]].desired_shifts)[:, p[1]]
+            for t in range(3):
+                deviation = model.NewIntVar(0, num_days * 3, 'deviation_%s_t%i' % (p, t))
+                worked = cp_model.LinearExpr.Sum(totals[p][t])
+                model.Add(deviation >= worked - int(desired[t]))
+                model.Add(deviation >= int(desired[t]) - worked)
+                deviations.append(deviation)
+        model.Minimize(cp_model.LinearExpr.Sum(deviations))
+        solver = SolverProfile(time_limit=self.coordination_time_limit, num_workers=self.profile.num_workers,
+                               random_seed=self.profile.random_seed).Apply(cp_model.CpSolver())
+        if solver.Solve(model) not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return False
+        for ward, medics in members.items():
+            schedule = schedules[ward]
+            layout = schedule.layout
+            assignment = schedule.assignment.copy()
+            index = {person(ward, n): n for n in range(self.wards[ward]["num_medics"])}
+            for (p, w, d, s), var in x.items():
+                if w == ward:
+                    assignment[index[p], d, s] = bool(solver.Value(var))
+            # The rests follow the new nights, as in ShiftsProblem: the night of the second-to-last day rests on the
+            # last day, and the rests after the nights of the previous month are kept
+            assignment[:, :, layout.first_rest_shift], assignment[:, :, layout.second_rest_shift] = \
+                self._Rests(ward, assignment, layout)
+            schedule.assignment = assignment
+            # The search of the ward no longer describes the schedule: its bound holds for the split only
+            result = copy.copy(schedule.result)
+            result.status, result.status_name = cp_model.FEASIBLE, solver.StatusName(cp_model.FEASIBLE)
+            result.objective = float(abs(schedule.Deviations()).sum())
+            result.best_bound = result.gap = None
+            result.wall_time += solver.WallTime()
+            schedule.result = result
+        return True
+
+    def SharedStatistics(self, schedules):
+        """
+        Return, for each shared medic, the shifts, festive shifts and night shifts worked in each ward and in total,
+        with the total desired (the sum of the desired numbers of shifts in its wards).
+        """
+        statistics = []
+        for medic in self.shared_medics:
+            entry = {"name": medic["name"], "wards": {}, "total": {}, "desired": {}}
+            for ward, n in medic["wards"].items():
+                schedule = schedules[ward]
+                if schedule.assignment is None:
+                    continue
+                worked = schedule.Statistics()
+                entry["wards"][ward] = {key: int(worked[key][n]) for key in ("shifts", "festive_shifts", "nights")}
+                for t, key in enumerate(("shifts", "festive_shifts", "nights")):
+                    entry["total"][key] = entry["total"].get(key, 0) + entry["wards"][ward][key]
+                    entry["desired"][key] = entry["desired"].get(key, 0) + int(schedule.desired_shifts[t][n])
+            statistics.append(entry)
+        return statistics
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Schedule the wards of a hospital with shared medics.")
+    parser.add_argument("hospital", help='JSON file with "wards", "shared_medics" and an optional "profile"')
+    parser.add_argument("-o", "--output", default="hospital.json", help="JSON file for the schedules")
+    parser.add_argument("--coordination", default="reassign", choices=COORDINATIONS)
+    parser.add_argument("--workers", type=int, default=None, help="wards solved at the same time")
+    args = parser.parse_args()
+    with open(args.hospital) as f:
+        hospital = json.load(f)
+    scheduler = HospitalScheduler(hospital["wards"], hospital.get("shared_medics", []),
+                                  SolverProfile(**hospital.get("profile", {})), args.coordination, args.workers)
+    schedules = scheduler.Solve()
+    with open(args.output, "w") as f:
+        json.dump({"wards": {name: schedule.ToDict() for name, schedule in schedules.items()},
+                   "shared_medics": scheduler.SharedStatistics(schedules), "conflicts": scheduler.conflicts,
+                   "infeasible_wards": scheduler.infeasible_wards,
+                   "reassigned": scheduler.reassigned, "num_rounds": scheduler.num_rounds,
+                   "wall_time": scheduler.wall_time}, f, indent=1)
+    print("%d wards scheduled in %.1fs, %d conflicts left" % (len(schedules), scheduler.wall_time,
+                                                              len(scheduler.conflicts)))
+    if scheduler.infeasible_wards:
+        print("No schedule found for the wards: %s" % ", ".join(scheduler.infeasible_wards))
@@ -0,0 +1,162 @@
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+try:
+    import resource
+except ImportError:  # the peak memory is measured on Unix only
+    resource = None
+
+'''
+Instrumentation of a request: the wall time and memory of each phase (building, searching, rendering) and the
+statistics of each CP-SAT search. Each record is kept in a Metrics object and also emitted as a JSON line on the
+"shifts_scheduler" logger, at INFO level: the lines are not shown unless logging is configured, e.g. with
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+The memory is the one of the whole process, so with concurrent requests (see Headless) it includes the others.
+The presolve of a search is timed from the CP-SAT log, which is only produced when the logger is enabled: otherwise
+the presolve is part of the "search" phase.
+'''
+# Phases recorded, in the order they happen. The rendering can be recorded several times.
+PHASES = ("setup", "variables", "constraints", "objective", "update", "presolve", "search", "refinement",
+          "extraction", "rendering")
+logger = logging.getLogger("shifts_scheduler")
+
+
+def memory_mb():
+    """Resident memory of the current process in MB (None where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_memory_mb():
+    """Peak resident memory of the current process in MB (None where the resource module is not available)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10  # bytes on macOS, kB on Linux
+
+
+def log_event(event, **fields):
+    """Emit a JSON log line (numpy values are converted to lists or numbers)."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(dict(event=event, **fields),
+                               default=lambda value: value.tolist() if hasattr(value, "tolist") else str(value)))
+
+
+class PhaseTimer:
+    """Record consecutive phases: End(name) closes the phase started at the previous End (or at the creation)."""
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._start = time.perf_counter()
+        self._peak = peak_memory_mb()
+
+    def End(self, name):
+        now = time.perf_counter()
+        self.metrics.AddPhase(name, now - self._start, self._peak)
+        self._start, self._peak = now, peak_memory_mb()
+
+
+class Metrics:
+    """
+    Phases and searches of a request (e.g. the ShiftsProblem of a job of the service).
+
+    Parameters:
+    request_id (str): Identifier added to the log lines, to tell apart the concurrent requests.
+    """
+    def __init__(self, request_id=None):
+        self.request_id = request_id
+        self.phases = []  # {"phase", "wall_time", "memory_mb", "peak_growth_mb"}
+        self.searches = []  # statistics of each search, see AddSearch
+
+    def Timer(self):
+        return PhaseTimer(self)
+
+    @contextlib.contextmanager
+    def Phase(self, name):
+        """Record the code in the with block as a phase."""
+        start, peak = time.perf_counter(), peak_memory_mb()
+        try:
+            yield
+        finally:
+            self.AddPhase(name, time.perf_counter() - start, peak)
+
+    def AddPhase(self, name, wall_time, peak_before=None, memory=None, peak=None):
+        """
+        Record a phase. peak_before is the peak memory at its start, so that the growth of the peak memory can be
+        attributed to the phase. memory and peak are the memory and peak memory at its end (default: now).
+        """
+        memory = memory if memory is not None else memory_mb()
+        peak = peak if peak is not None else peak_memory_mb()
+        record = {"phase": name, "wall_time": wall_time, "memory_mb": memory,
+                  "peak_growth_mb": peak - peak_before if peak is not None and peak_before is not None else None}
+        self.phases.append(record)
+        self.Log("phase", **record)
+
+    def WatchSearch(self, solver):
+        """
+        Capture the log of a cp_model.CpSolver, instead of printing it, to time its presolve. Call before Solve and
+        pass the returned watch to AddSearch. Writing the log slows down the search, so it is only enabled when the
+        JSON log lines are (e.g. with the --log option of Headless).
+        """
+        watch = {"start": time.perf_counter(), "peak": peak_memory_mb(), "presolve_start": None, "presolve_end": None}
+        if not logger.isEnabledFor(logging.INFO):
+            return watch
+
+        def on_log(line):
+            if watch["presolve_start"] is None and line.startswith("Starting presolve"):
+                watch["presolve_start"] = time.perf_counter()
+            elif watch["presolve_end"] is None and line.startswith("Presolved"):
+                watch["presolve_end"] = time.perf_counter()
+                watch["presolve_memory"], watch["presolve_peak"] = memory_mb(), peak_memory_mb()
+        solver.parameters.log_search_progress = True
+        solver.parameters.log_to_stdout = False
+        solver.log_callback = on_log
+        return watch
+
+    def AddSearch(self, solver, result, watch):
+        """
+        Record a finished search as the phases "presolve" and "search" (from the end of the presolve, or from the
+        start if the presolve was not seen in the log), with the statistics of the CP-SAT response.
+
+        Parameters:
+        solver (cp_model.CpSolver): Solver of the search.
+        result (SolveResult): Outcome of the search.
+        watch (dict): As returned by WatchSearch.
+        """
+        end = time.perf_counter()
+        start, peak = watch["start"], watch["peak"]
+        if watch["presolve_start"] is not None and watch["presolve_end"] is not None:
+            self.AddPhase("presolve", watch["presolve_end"] - watch["presolve_start"], peak,
+                          watch["presolve_memory"], watch["presolve_peak"])
+            start, peak = watch["presolve_end"], watch["presolve_peak"]
+        self.AddPhase("search", end - start, peak)
+        statistics = {"status": result.status_name, "objective": result.objective, "best_bound": result.best_bound,
+                      "gap": result.gap, "wall_time": result.wall_time, "user_time": solver.UserTime(),
+                      "conflicts": solver.NumConflicts(), "branches": solver.NumBranches(),
+                      "num_workers": solver.parameters.num_workers}
+        self.searches.append(statistics)
+        self.Log("search", **statistics)
+
+    def PhaseTimes(self):
+        """Return the total wall time of each phase recorded, in the order of PHASES."""
+        totals = {}
+        for record in self.phases:
+            totals[record["phase"]] = totals.get(record["phase"], 0.0) + record["wall_time"]
+        return {name: totals[name] for name in sorted(totals, key=lambda name: PHASES.index(name)
+                                                       if name in PHASES else len(PHASES))}
+
+    def Summary(self):
+        """Describe the request with JSON-serializable values: time per phase, slowest phase and searches."""
+        times = self.PhaseTimes()
+        return {"phases": times, "slowest_phase": max(times, key=times.get) if times else None,
+                "peak_memory_mb": peak_memory_mb(), "searches": list(self.searches)}
+
+    def Log(self, event, **fields):
+        if self.request_id is not None:
+            fields["request_id"] = self.request_id
+        log_event(event, **fields)
@@ -0,0 +1,195 @@
+from concurrent.futures import ThreadPoolExecutor
+from ortools.sat.python import cp_model
+from ShiftsProblem import Schedule
+from SolverProfile import SolverProfile, SolveResult
+import numpy as np
+import os
+import random
+import threading
+import time
+
+'''
+Large neighborhood search (LNS) refinement, for the rosters too large to be optimized by a single search within the
+time budget (many medics, or the single model of several months). Starting from a feasible schedule (found with the
+"fast-feasible" preset if the problem has none), each round solves a few sub-problems in parallel threads. In a
+sub-problem the shifts of a neighborhood are free and all the other shifts are fixed to the current schedule:
+"days": a window of consecutive days, for all the medics;
+"medics": all the days of a subset of medics, half of them chosen among the ones furthest from their targets.
+A sub-problem is a copy of the model with the fixed shifts given as hints and fix_variables_to_their_hinted_value
+set, so that the presolve removes them and the sub-problem is small. The best schedule of the round replaces the
+current one if it lowers the sum of the deviations from the desired number of shifts (the sum of the auxiliary
+variables at the optimum). The size of each kind of neighborhood adapts: it grows when a sub-problem is solved to
+optimality, since the neighborhood held no better schedule, and shrinks when the time limit stops the sub-problem.
+'''
+NEIGHBORHOODS = ("days", "medics")
+
+
+def total_deviation(problem, assignment):
+    """Sum of the absolute deviations from the desired numbers of shifts of an assignment of the problem."""
+    return int(abs(Schedule(problem.parameters, None, assignment, problem.desired_shifts).Deviations()).sum())
+
+
+class Refinement:
+    """
+    Refine the schedule of a ShiftsProblem with large neighborhood search (see above). Run leaves the best schedule
+    in problem.assignment and its outcome in problem.result, as Solve does.
+
+    Parameters:
+    problem (ShiftsProblem): Problem to refine. If it has no schedule, a first one is searched with initial_profile.
+    time_limit (float): Wall-time limit of the whole refinement in seconds, including the first search.
+    max_workers (int): Sub-problems solved at the same time, each one by a single search worker (default: one per
+        core).
+    subproblem_time_limit (float): Time limit of each sub-problem in seconds.
+    window_days (int): Initial number of days of the "days" neighborhoods.
+    num_free_medics (int): Initial number of medics of the "medics" neighborhoods (default: a fifth of the medics,
+        at least 4).
+    seed (int): Seed of the choice of the neighborhoods and of the searches.
+    initial_profile (SolverProfile): Options of the search of the first schedule (default: the "fast-feasible"
+        preset within time_limit).
+    on_improvement (callable): Called with a dictionary (solution, objective, best_bound, wall_time) on every
+        improving schedule, as in ProgressCallback.
+    """
+    def __init__(self, problem, time_limit=60.0, max_workers=None, subproblem_time_limit=2.0, window_days=7,
+                 num_free_medics=None, seed=0, initial_profile=None, on_improvement=None):
+        self.problem = problem
+        self.time_limit = time_limit
+        self.max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        self.subproblem_time_limit = subproblem_time_limit
+        self.seed = seed
+        self.initial_profile = initial_profile
+        self.on_improvement = on_improvement
+        if num_free_medics is None:
+            num_free_medics = max(4, problem.num_medics // 5)
+        self.sizes = {"days": min(window_days, problem.layout.num_days),
+                      "medics": min(num_free_medics, problem.num_medics)}
+        self.limits = {"days": (2, problem.layout.num_days), "medics": (2, problem.num_medics)}
+        self.num_rounds = 0
+        self._rng = random.Random(seed)
+        self._progress = []
+        self._solvers = set()  # solvers of the running sub-problems, see Stop
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def Run(self):
+        """
+        Returns:
+        SolveResult: Outcome of the refinement: the objective is the sum of the deviations of the schedule, the
+            status is OPTIMAL only if it reaches the bound of the first search, the wall time is the one of the whole
+            refinement. The outcome of the first search if it found no schedule.
+        """
+        problem = self.problem
+        start = time.perf_counter()
+        if problem.assignment is None:
+            profile = self.initial_profile
+            if profile is None:
+                profile = SolverProfile(preset="fast-feasible", time_limit=self.time_limit,
+                                        num_workers=self.max_workers, random_seed=self.seed)
+            problem.Solve(profile)
+        result = problem.result
+        if result is None or not result.feasible:
+            return result
+        best_bound = result.best_bound
+        assignment, deviation = problem.assignment, total_deviation(problem, problem.assignment)
+        self._Improved(deviation, best_bound, start)
+        with problem.metrics.Phase("refinement"), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self._stopped and deviation > best_bound:
+                remaining = self.time_limit - (time.perf_counter() - start)
+                if remaining <= 0:
+                    break
+                kinds = [NEIGHBORHOODS[(self.num_rounds + k) % len(NEIGHBORHOODS)] for k in range(self.max_workers)]
+                self.num_rounds += 1
+                tasks = [(kind, self._Neighborhood(kind, assignment)) for kind in kinds]
+                time_limit = min(self.subproblem_time_limit, remaining)
+                seeds = [self._rng.randrange(2 ** 31) for _ in tasks]
+                outcomes = list(executor.map(lambda task, seed: self._SolveNeighborhood(assignment, task[1],
+                                                                                        time_limit, seed),
+                                             tasks, seeds))
+                candidates = []
+                for (kind, _), (status, solver) in zip(tasks, outcomes):
+                    self._Resize(kind, status)
+                    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                        candidate = problem.ExtractAssignment(solver)
+                        candidates.append((total_deviation(problem, candidate), candidate, solver, status))
+                if candidates:
+                    best = min(candidates, key=lambda c: c[0])
+                    if best[0] < deviation:
+                        deviation, assignment, solver, status = best
+                        result = SolveResult(solver, cp_model.OPTIMAL if deviation <= best_bound else
+                                             cp_model.FEASIBLE)
+                        self._Improved(deviation, best_bound, start)
+                        problem.metrics.Log("refinement", deviation=deviation, sizes=dict(self.sizes))
+        # The objective and bound of the last sub-problem are replaced by the ones of the whole problem
+        result.objective, result.best_bound = deviation, best_bound
+        result.gap = abs(deviation - best_bound) / max(1.0, abs(deviation))
+        result.wall_time = time.perf_counter() - start
+        problem.assignment, problem.result = assignment, result
+        return result
+
+    def _Neighborhood(self, kind, assignment):
+        """Return a boolean array of shape (num_medics, num_slots), true for the shift variables left free."""
+        problem = self.problem
+        layout = problem.layout
+        size = self.sizes[kind]
+        free = np.zeros((problem.num_medics, problem.num_slots), dtype=bool)
+        if kind == "days":
+            slot_days = np.nonzero(layout.shift_mask)[0]
+            first = self._rng.randrange(layout.num_days - size + 1)
+            free[:, (slot_days >= first) & (slot_days < first + size)] = True
+        else:
+            deviations = abs(Schedule(problem.parameters, None, assignment, problem.desired_shifts).Deviations())
+            weights = deviations.sum(axis=0)
+            furthest = np.argsort(-weights, kind="stable")[:size // 2].tolist()
+            others = [n for n in range(problem.num_medics) if n not in furthest]
+            free[furthest + self._rng.sample(others, size - len(furthest))] = True
+        return free
+
+    def _SolveNeighborhood(self, assignment, free, time_limit, seed):
+        """Solve the sub-problem of a neighborhood in a copy of the model. Returns the status and the solver."""
+        problem = self.problem
+        model = problem.model.Clone()
+        model.ClearHints()
+        fixed = np.flatnonzero(~free.ravel())
+        values = assignment[:, problem.layout.shift_mask].ravel()
+        first = problem.shift_vars[0].Index()
+        for index, value in zip(fixed.tolist(), values[fixed].tolist()):
+            model.AddHint(model.GetBoolVarFromProtoIndex(first + index), value)
+        solver = SolverProfile(time_limit=time_limit, num_workers=1, random_seed=seed).Apply(cp_model.CpSolver())
+        solver.parameters.fix_variables_to_their_hinted_value = True
+        # Unlike the whole model, the small sub-problems are proved optimal in a fraction of a second with the LP
+        # relaxation, which the profile disables
+        solver.parameters.linearization_level = 1
+        with self._lock:
+            if self._stopped:
+                return cp_model.UNKNOWN, solver
+            self._solvers.add(solver)
+        try:
+            return solver.Solve(model), solver
+        finally:
+            with self._lock:
+                self._solvers.discard(solver)
+
+    def _Resize(self, kind, status):
+        low, high = self.limits[kind]
+        if status == cp_model.OPTIMAL:
+            self.sizes[kind] = min(high, max(self.sizes[kind] + 1, int(self.sizes[kind] * 1.25)))
+        elif status != cp_model.INFEASIBLE:
+            self.sizes[kind] = max(low, min(self.sizes[kind] - 1, int(self.sizes[kind] * 0.8)))
+
+    def _Improved(self, deviation, best_bound, start):
+        entry = {"solution": len(self._progress) + 1, "objective": deviation, "best_bound": best_bound,
+                 "wall_time": time.perf_counter() - start}
+        with self._lock:
+            self._progress.append(entry)
+        if self.on_improvement is not None:
+            self.on_improvement(entry)
+
+    def Stop(self):
+        """Stop the refinement: Run returns with the best schedule found so far."""
+        with self._lock:
+            self._stopped = True
+            for solver in self._solvers:
+                solver.StopSearch()
+
+    def Progress(self):
+        with self._lock:
+            return list(self._progress)
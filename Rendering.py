@@ -0,0 +1,103 @@
+from datetime import date
+from matplotlib.figure import Figure
+import calendar
+import contextlib
+import html
+import io
+import numpy as np
+
+'''
+Rendering of a solved schedule (a ShiftsProblem or a Schedule, i.e. anything with a layout and an assignment array)
+to in-memory PDF, PNG and HTML. The figures are matplotlib.figure.Figure objects not registered with pyplot, so the
+rendering keeps no global state, can run concurrently in several threads and never writes to disk.
+'''
+TABLE_FONT_SIZE = 10  # fixed font size: the automatic fitting measures every cell on each draw
+
+
+def rendering_phase(schedule):
+    """Record the rendering in the metrics of the schedule, if it has them (see Metrics)."""
+    metrics = getattr(schedule, "metrics", None)
+    return metrics.Phase("rendering") if metrics is not None else contextlib.nullcontext()
+
+
+def week_tables(schedule):
+    """
+    Yield, for each week of the month, the column labels (day names), the row labels (shifts) and the cell texts
+    (the 1-indexed medic working each shift, "-" if none).
+    """
+    layout = schedule.layout
+    roster = layout.Roster(schedule.assignment)
+    rows = ['Mattina ' + str(1 + i) for i in range(layout.num_morning_shifts_ferial)]
+    rows.extend(['Pomeriggio ' + str(1 + i) for i in range(layout.num_afternoon_shifts_ferial)])
+    rows.append('Notte')
+    for days_in_week in layout.calendar.monthdayscalendar(layout.year, layout.month):
+        columns = []
+        values = np.zeros((len(rows), 7), dtype=int)  # 7 = days of the week
+        for index_day, day in enumerate(days_in_week):
+            if day == 0:
+                columns.append('-')
+            else:
+                # name of the day (first 3 letters) followed by the day number
+                columns.append(calendar.day_name[date(layout.year, layout.month, day).weekday()][:3] + " " + str(day))
+                values[:, index_day] = roster[day - 1, :len(rows)] + 1
+        cell_text = [[str(v) if v > 0 else "-" for v in row] for row in values.tolist()]
+        yield columns, rows, cell_text
+
+
+def statistics_table(schedule):
+    """Return the column labels, row labels and cell texts of the per-medic statistics."""
+    statistics = schedule.layout.Statistics(schedule.assignment)
+    columns = ['# turni', '# notti', '# turni fest.']
+    values = np.stack([statistics["shifts"], statistics["nights"], statistics["festive_shifts"]], axis=1)
+    rows = ["Medico " + str(m + 1) for m in range(len(values))]
+    return columns, rows, [[str(v) for v in row] for row in values.tolist()]
+
+
+def build_figure(schedule):
+    """Draw one table per week plus the table of the statistics on a new Figure."""
+    layout = schedule.layout
+    weeks = list(week_tables(schedule))
+    num_shifts_ferial = layout.num_morning_shifts_ferial + layout.num_afternoon_shifts_ferial + 1
+    fig = Figure(figsize=(8, 0.3 * num_shifts_ferial * (len(weeks) + 1)))
+    ax = fig.subplots(len(weeks) + 1, 1)  # last one is for statistics
+    fig.suptitle("Turni " + calendar.month_name[layout.month] + ' ' + str(layout.year))
+    for axis, (columns, rows, cell_text) in zip(ax, weeks + [statistics_table(schedule)]):
+        axis.set_axis_off()
+        table = axis.table(cellText=cell_text, rowLabels=rows, colLabels=columns, cellLoc='center', loc='upper left')
+        table.auto_set_font_size(False)
+        table.set_fontsize(TABLE_FONT_SIZE)
+    return fig
+
+
+def render(schedule, format):
+    """Render the schedule table to bytes in a matplotlib format ("pdf", "png", "svg", ...)."""
+    buffer = io.BytesIO()
+    with rendering_phase(schedule):
+        build_figure(schedule).savefig(buffer, format=format)
+    return buffer.getvalue()
+
+
+def render_pdf(schedule):
+    return render(schedule, "pdf")
+
+
+def render_png(schedule):
+    return render(schedule, "png")
+
+
+def render_html(schedule):
+    """Render the schedule as HTML tables, without matplotlib (fast preview)."""
+    with rendering_phase(schedule):
+        return _html_tables(schedule)
+
+
+def _html_tables(schedule):
+    layout = schedule.layout
+    parts = ["<h3>%s</h3>" % html.escape("Turni " + calendar.month_name[layout.month] + ' ' + str(layout.year))]
+    for columns, rows, cell_text in list(week_tables(schedule)) + [statistics_table(schedule)]:
+        parts.append("<table><tr><th></th>%s</tr>" % "".join("<th>%s</th>" % html.escape(c) for c in columns))
+        for row, cells in zip(rows, cell_text):
+            parts.append("<tr><th>%s</th>%s</tr>" % (html.escape(row),
+                                                     "".join("<td>%s</td>" % html.escape(c) for c in cells)))
+        parts.append("</table>")
+    return "\n".join(parts)
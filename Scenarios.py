@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+from ShiftsProblem import ShiftsProblem, complete_parameters
+from SolverProfile import SolverProfile
+import argparse
+import itertools
+import json
+import os
+import pandas as pd
+import time
+try:
+    import yaml
+except ImportError:  # YAML scenario files are optional
+    yaml = None
+
+'''
+A scenario file (JSON or YAML) describes a batch of ShiftsProblem instances:
+{
+    "base": {...},              arguments of ShiftsProblem shared by all the scenarios
+    "time_limit": 60,           time limit of each scenario in seconds (can be overridden by a scenario)
+    "grid": {"num_morning_shifts_saturday": [3, 4], ...},   every combination of these values is solved
+    "scenarios": [{"name": "ferie medico 5", "vacation_days": {"4": [12, 13, 14]}}, ...]
+}
+Each scenario overrides some arguments of the base. vacation_days and additional_shifts_* can also be given as a
+mapping from (0-indexed) medic to value, which changes only those medics. Without "scenarios", the base itself is
+the only scenario. The arguments not given are completed with complete_parameters.
+When a scenario (or a grid point) changes num_medics, the per-medic lists of the base are cut or extended to the new
+number of medics (the added medics have no vacations and no additional shifts); the lists given by the scenario or
+the grid itself must have one value per medic.
+Reading YAML files requires PyYAML, writing .parquet results requires pyarrow: both are optional.
+'''
+PER_MEDIC_PARAMETERS = ("vacation_days", "additional_shifts_ferial", "additional_shifts_festive",
+                        "additional_shifts_nights")
+
+
+def load_scenarios(path):
+    """Read a scenario file (.json, .yaml or .yml) and expand it into a list of (name, parameters, time_limit)."""
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise ImportError("Reading YAML scenario files requires PyYAML (pip install pyyaml)")
+            specification = yaml.safe_load(f)
+        else:
+            specification = json.load(f)
+    return expand_scenarios(specification)
+
+
+def _resize(key, values, num_medics):
+    """Cut or extend the per-medic list values of the argument key to num_medics medics."""
+    return list(values[:num_medics]) + [[] if key == "vacation_days" else 0 for _ in range(num_medics - len(values))]
+
+
+def expand_scenarios(specification):
+    """Expand a scenario specification (see above) into a list of (name, parameters, time_limit). Raises ValueError
+    if the per-medic arguments of a scenario do not match its number of medics."""
+    base = specification.get("base", {})
+    grid = specification.get("grid", {})
+    default_time_limit = specification.get("time_limit")
+    expanded = []
+    for i, scenario in enumerate(specification.get("scenarios", [{"name": "base"}])):
+        scenario = dict(scenario)
+        name = scenario.pop("name", "scenario %d" % (i + 1))
+        time_limit = scenario.pop("time_limit", default_time_limit)
+        for values in itertools.product(*grid.values()):
+            grid_point = dict(zip(grid.keys(), values))
+            if grid_point:
+                name_in_grid = "%s [%s]" % (name, ", ".join("%s=%s" % item for item in grid_point.items()))
+            else:
+                name_in_grid = name
+            overrides = dict(grid_point, **{key: value for key, value in scenario.items()
+                                            if not (key in PER_MEDIC_PARAMETERS and isinstance(value, dict))})
+            parameters = dict(base, **overrides)
+            num_medics = int(parameters["num_medics"])
+            for key in PER_MEDIC_PARAMETERS:
+                if key not in parameters:
+                    continue
+                if key not in overrides:
+                    parameters[key] = _resize(key, parameters[key], num_medics)
+                elif len(parameters[key]) != num_medics:
+                    raise ValueError("Scenario '%s': %s has %d values for %d medics" %
+                                     (name_in_grid, key, len(parameters[key]), num_medics))
+            parameters = complete_parameters(parameters)
+            for key, value in scenario.items():
+                if key in PER_MEDIC_PARAMETERS and isinstance(value, dict):
+                    parameters[key] = list(parameters[key])
+                    for medic, medic_value in value.items():
+                        if not 0 <= int(medic) < num_medics:
+                            raise ValueError("Scenario '%s': %s of medic %s, but there are %d medics" %
+                                             (name_in_grid, key, medic, num_medics))
+                        parameters[key][int(medic)] = medic_value
+            if any(not 0 <= n < num_medics for n in parameters["medics_preferring_full_sundays"]):
+                raise ValueError("Scenario '%s': medics_preferring_full_sundays has medics beyond the %d medics" %
+                                 (name_in_grid, num_medics))
+            expanded.append((name_in_grid, complete_parameters(parameters), time_limit))
+    return expanded
+
+
+def run_scenario(name, parameters, profile):
+    """Build and solve one scenario, returning a row of the results table. Runs in a worker process."""
+    row = {"scenario": name, "month": parameters["month"], "year": parameters["year"],
+           "num_medics": parameters["num_medics"]}
+    start = time.perf_counter()
+    try:
+        problem = ShiftsProblem(**parameters)
+        result = problem.Solve(profile)
+    except Exception as e:
+        row.update({"status": "ERROR", "error": str(e), "elapsed_time": time.perf_counter() - start})
+        return row
+    row.update({"status": result.status_name, "objective": result.objective, "best_bound": result.best_bound,
+                "gap": result.gap, "wall_time": result.wall_time, "elapsed_time": time.perf_counter() - start})
+    if result.feasible:
+        deviations = abs(problem.Schedule().Deviations())
+        for t, kind in enumerate(("shifts", "festive_shifts", "nights")):
+            row["max_deviation_" + kind] = int(deviations[t].max())
+            row["total_deviation_" + kind] = int(deviations[t].sum())
+    return row
+
+
+def run_scenarios(scenarios, max_workers=None, num_workers_per_scenario=None, preset=None):
+    """
+    Solve the scenarios (as returned by load_scenarios) in parallel worker processes.
+
+    Parameters:
+    max_workers (int): Number of scenarios solved at the same time (default: one per core, at most one per scenario).
+    num_workers_per_scenario (int): Search workers of each scenario (default: the cores left to each of the
+        scenarios solved at the same time). More scenarios at the same time give the most throughput on a large
+        batch; more workers per scenario give better schedules when the time limit stops the searches.
+    preset (str): Preset of the SolverProfile of each scenario.
+
+    Returns:
+    pd.DataFrame: One row per scenario, in the order of the scenarios.
+    """
+    cores = os.cpu_count() or 1
+    if max_workers is None:
+        max_workers = max(1, min(cores, len(scenarios)))
+    if num_workers_per_scenario is None:
+        num_workers_per_scenario = max(1, cores // max_workers)
+    profiles = [SolverProfile(time_limit=time_limit, num_workers=num_workers_per_scenario, preset=preset)
+                for _, _, time_limit in scenarios]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        rows = executor.map(run_scenario, [name for name, _, _ in scenarios],
+                            [parameters for _, parameters, _ in scenarios], profiles)
+        return pd.DataFrame(list(rows))
+
+
+def write_results(results, path):
+    """Write the results table to a .parquet file, or to a CSV file for any other extension."""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow  # used by pandas
+        except ImportError:
+            raise ImportError("Writing .parquet results requires pyarrow (pip install pyarrow), or use a .csv output")
+        results.to_parquet(path, index=False)
+    else:
+        results.to_csv(path, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Solve a batch of shift scheduling scenarios in parallel.")
+    parser.add_argument("scenario_file", help="JSON or YAML file describing the scenarios")
+    parser.add_argument("-o", "--output", default="scenarios.csv", help="results table (.csv or .parquet)")
+    parser.add_argument("--workers", type=int, default=None, help="scenarios solved at the same time")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="search workers of each scenario (default: the cores divided by --workers)")
+    parser.add_argument("--preset", default=None, help="solver preset of each scenario")
+    args = parser.parse_args()
+    results = run_scenarios(load_scenarios(args.scenario_file), args.workers, args.threads, args.preset)
+    write_results(results, args.output)
+    print(results.to_string(index=False))
@@ -0,0 +1,51 @@
+from collections import OrderedDict
+import threading
+
+
+def cache_key(input_hash, profile):
+    """
+    Key of the schedule of the inputs with the given input hash, searched with a SolverProfile: a schedule found
+    with a short time limit or with "fast-feasible" is not returned for a search with a stronger profile.
+    """
+    return input_hash + ":" + profile.Key()
+
+
+class ScheduleCache:
+    """
+    Bounded least-recently-used cache of solved schedules, keyed by the input hash of ShiftsProblem and the profile
+    of the search (see cache_key).
+
+    The cache is shared by all the Streamlit sessions, so every access is protected by a lock. When more than
+    max_entries schedules are stored, the least recently used one is evicted.
+    """
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def Get(self, key):
+        """Return the entry stored for key (marking it as recently used), or None."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def Put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
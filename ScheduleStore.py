@@ -0,0 +1,238 @@
+from datetime import datetime
+from google.protobuf import text_format
+from ortools.sat.python import cp_model
+from Rendering import render_pdf
+from ShiftsProblem import Schedule, ShiftLayout, input_hash
+from SolverProfile import SolveResult
+import argparse
+import contextlib
+import json
+import numpy as np
+import sqlite3
+import sys
+import zlib
+
+'''
+Persistent store of the generated schedules, in a SQLite database. Each schedule is saved with the arguments of
+ShiftsProblem, the outcome of the search, the desired numbers of shifts, the assignment array (packed to one bit per
+shift) and, optionally, the CP-SAT model (text format, compressed). The schedules of a month are numbered by version,
+in the order they are saved, and can be found by the input hash of their arguments: reloading a schedule, comparing
+two versions or rendering the PDF again need no search. The key of the SolverProfile of the search is saved too, so
+that a schedule found with a weaker profile (e.g. "fast-feasible") is not returned in place of a new search.
+    python ScheduleStore.py schedules.db versions 2025 3
+    python ScheduleStore.py schedules.db pdf 2025 3 [--version 2] -o schedule.pdf
+    python ScheduleStore.py schedules.db diff 2025 3 1 2
+'''
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    input_hash TEXT NOT NULL,
+    label TEXT,
+    created_at TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    result TEXT NOT NULL,
+    desired_shifts TEXT NOT NULL,
+    assignment BLOB NOT NULL,
+    model BLOB,
+    profile TEXT,
+    UNIQUE (year, month, version)
+);
+CREATE INDEX IF NOT EXISTS schedules_input_hash ON schedules (input_hash);
+"""
+SUMMARY_COLUMNS = ("version", "input_hash", "label", "created_at", "result", "profile")
+
+
+class ScheduleStore:
+    """
+    Schedules saved in the SQLite database at path (created if missing). A connection is opened for each operation,
+    so the store can be shared by several threads (e.g. the Streamlit sessions).
+    """
+    def __init__(self, path="schedules.db"):
+        self.path = path
+        with self._Connect() as connection:
+            connection.executescript(SCHEMA)
+            # The stores created before the profile was saved
+            if "profile" not in [row[1] for row in connection.execute("PRAGMA table_info(schedules)")]:
+                connection.execute("ALTER TABLE schedules ADD COLUMN profile TEXT")
+
+    @contextlib.contextmanager
+    def _Connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:  # commit, or roll back on errors
+                yield connection
+        finally:
+            connection.close()
+
+    def Save(self, problem, label=None, include_model=True, profile=None):
+        """
+        Save the schedule of a solved ShiftsProblem as a new version of its month.
+
+        Parameters:
+        problem (ShiftsProblem): Problem with a schedule (see ShiftsProblem.Solve).
+        label (str): Free description of the version (e.g. "published").
+        include_model (bool): Save also the CP-SAT model, see LoadModel.
+        profile (SolverProfile): Options of the search that found the schedule, see Load.
+
+        Returns:
+        int: The version of the schedule.
+        """
+        if problem.assignment is None:
+            raise ValueError("The problem has no schedule to save")
+        schedule = problem.Schedule()
+        model = zlib.compress(str(problem.model.Proto()).encode()) if include_model else None
+        with self._Connect() as connection:
+            # The version is computed by the INSERT itself, so that concurrent saves of the same month (e.g. from
+            # two Streamlit sessions) are serialized by the write lock of SQLite instead of taking the same version
+            cursor = connection.execute(
+                "INSERT INTO schedules (year, month, version, input_hash, label, created_at, parameters, result, "
+                "desired_shifts, assignment, model, profile) SELECT ?, ?, COALESCE(MAX(version), 0) + 1, ?, ?, ?, ?, "
+                "?, ?, ?, ?, ? FROM schedules WHERE year = ? AND month = ?",
+                (problem.year, problem.month, problem.input_hash, label, datetime.now().isoformat(),
+                 json.dumps(schedule.parameters), json.dumps(schedule.result.ToDict()),
+                 json.dumps(np.asarray(schedule.desired_shifts).tolist()),
+                 np.packbits(schedule.assignment).tobytes(), model, profile.Key() if profile is not None else None,
+                 problem.year, problem.month))
+            version = connection.execute("SELECT version FROM schedules WHERE id = ?",
+                                         (cursor.lastrowid,)).fetchone()[0]
+        return version
+
+    def __contains__(self, key):
+        """Tell whether a schedule with the given input hash was saved."""
+        with self._Connect() as connection:
+            row = connection.execute("SELECT 1 FROM schedules WHERE input_hash = ? LIMIT 1", (key,)).fetchone()
+        return row is not None
+
+    @staticmethod
+    def _Schedule(row):
+        parameters, result, desired_shifts, assignment = row
+        parameters = json.loads(parameters)
+        shape = (parameters["num_medics"],) + ShiftLayout.FromParameters(parameters).shift_mask.shape
+        assignment = np.unpackbits(np.frombuffer(assignment, dtype=np.uint8), count=int(np.prod(shape)))
+        return Schedule(parameters, SolveResult.FromDict(json.loads(result)), assignment.reshape(shape).astype(bool),
+                        np.array(json.loads(desired_shifts), dtype=int))
+
+    def Load(self, key, profile=None):
+        """
+        Return the last Schedule saved with the given input hash (or arguments of ShiftsProblem), or None.
+
+        Parameters:
+        key (str or dict): Input hash, or arguments of ShiftsProblem.
+        profile (SolverProfile): If given, only a schedule that answers a search with this profile is returned: one
+            saved with the same profile (see SolverProfile.Key), or one proved optimal (status OPTIMAL and no gap).
+        """
+        if isinstance(key, dict):
+            key = input_hash(key)
+        with self._Connect() as connection:
+            rows = connection.execute("SELECT parameters, result, desired_shifts, assignment, profile FROM schedules "
+                                      "WHERE input_hash = ? ORDER BY id DESC", (key,))
+            for row in rows:
+                if profile is None or row[4] == profile.Key():
+                    return self._Schedule(row[:4])
+                result = json.loads(row[1])
+                if result["status"] == "OPTIMAL" and result["gap"] == 0:
+                    return self._Schedule(row[:4])
+        return None
+
+    def LoadVersion(self, year, month, version=None):
+        """Return the Schedule of a version of the month (default: the last one), or None."""
+        with self._Connect() as connection:
+            row = connection.execute("SELECT parameters, result, desired_shifts, assignment FROM schedules "
+                                     "WHERE year = ? AND month = ? AND version = COALESCE(?, (SELECT MAX(version) "
+                                     "FROM schedules WHERE year = ? AND month = ?))",
+                                     (year, month, version, year, month)).fetchone()
+        return self._Schedule(row) if row is not None else None
+
+    def LoadModel(self, key):
+        """
+        Return the CP-SAT model (cp_model.CpModel) saved with the last schedule with the given input hash, or None.
+        The model can be solved or inspected as is; a ShiftsProblem is needed to change it or to read its schedule.
+        """
+        with self._Connect() as connection:
+            row = connection.execute("SELECT model FROM schedules WHERE input_hash = ? AND model IS NOT NULL "
+                                     "ORDER BY id DESC LIMIT 1", (key,)).fetchone()
+        if row is None:
+            return None
+        model = cp_model.CpModel()
+        proto, text = model.Proto(), zlib.decompress(row[0]).decode()
+        if hasattr(proto, "parse_text_format"):
+            proto.parse_text_format(text)  # OR-Tools >= 9.15, where the model is no longer a protobuf message
+        else:
+            text_format.Parse(text, proto)
+        return model
+
+    def Versions(self, year, month):
+        """Return the versions of the month as dictionaries (version, input_hash, label, created_at, result and
+        profile, None for the schedules saved without it)."""
+        with self._Connect() as connection:
+            rows = connection.execute("SELECT %s FROM schedules WHERE year = ? AND month = ? ORDER BY version" %
+                                      ", ".join(SUMMARY_COLUMNS), (year, month)).fetchall()
+        versions = [dict(zip(SUMMARY_COLUMNS, row)) for row in rows]
+        for version in versions:
+            version["result"] = json.loads(version["result"])
+            version["profile"] = json.loads(version["profile"]) if version["profile"] is not None else None
+        return versions
+
+    def Compare(self, year, month, version_a, version_b):
+        """
+        List the shifts assigned differently in two versions of the month, as dictionaries with the day (1-indexed),
+        the shift ID and the medics (0-indexed, -1 if none) of the two versions.
+        """
+        schedule_a, schedule_b = self.LoadVersion(year, month, version_a), self.LoadVersion(year, month, version_b)
+        if schedule_a is None or schedule_b is None:
+            raise ValueError("Version %s or %s of %d/%d not found" % (version_a, version_b, month, year))
+        roster_a, roster_b = schedule_a.Roster(), schedule_b.Roster()
+        if roster_a.shape != roster_b.shape:
+            raise ValueError("The versions have different numbers of shifts and cannot be compared")
+        days, shifts = np.nonzero(roster_a != roster_b)
+        return [{"day": int(d) + 1, "shift": int(s), "before": int(roster_a[d, s]), "after": int(roster_b[d, s])}
+                for d, s in zip(days.tolist(), shifts.tolist())]
+
+    def Hint(self, problem):
+        """
+        Return the assignment of the last schedule saved for the month of the problem with the same shifts and
+        medics (e.g. before some vacations changed), to start the search from it with ShiftsProblem.SetHint. None if
+        there is no such schedule.
+        """
+        with self._Connect() as connection:
+            rows = connection.execute("SELECT parameters, result, desired_shifts, assignment FROM schedules "
+                                      "WHERE year = ? AND month = ? ORDER BY id DESC",
+                                      (problem.year, problem.month)).fetchall()
+        shape = (problem.num_medics,) + problem.layout.shift_mask.shape
+        for row in rows:
+            parameters = json.loads(row[0])
+            if parameters["num_medics"] == problem.num_medics and \
+                    ShiftLayout.FromParameters(parameters).shift_mask.shape == shape[1:]:
+                return self._Schedule(row).assignment
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect the schedules saved in a ScheduleStore.")
+    parser.add_argument("database", help="SQLite file of the store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    versions_parser = commands.add_parser("versions", help="list the versions of a month")
+    pdf_parser = commands.add_parser("pdf", help="render a version of a month to PDF")
+    diff_parser = commands.add_parser("diff", help="list the shifts that differ between two versions of a month")
+    for command_parser in (versions_parser, pdf_parser, diff_parser):
+        command_parser.add_argument("year", type=int)
+        command_parser.add_argument("month", type=int)
+    pdf_parser.add_argument("--version", type=int, help="version (default: the last one)")
+    pdf_parser.add_argument("-o", "--output", required=True, help="PDF file")
+    diff_parser.add_argument("version_a", type=int)
+    diff_parser.add_argument("version_b", type=int)
+    args = parser.parse_args()
+    store = ScheduleStore(args.database)
+    if args.command == "versions":
+        print(json.dumps(store.Versions(args.year, args.month), indent=1))
+    elif args.command == "pdf":
+        schedule = store.LoadVersion(args.year, args.month, args.version)
+        if schedule is None:
+            sys.exit("No schedule saved for %d/%d" % (args.month, args.year))
+        with open(args.output, "wb") as f:
+            f.write(render_pdf(schedule))
+    else:
+        print(json.dumps(store.Compare(args.year, args.month, args.version_a, args.version_b), indent=1))
@@ -1,13 +1,18 @@
 from ortools.sat.python import cp_model
+from Metrics import Metrics
+from Rendering import build_figure
+from SolverProfile import SolverProfile, SolveResult
 from datetime import date
-import matplotlib.pyplot as plt
 import numpy as np
 import calendar
+import copy
+import hashlib
+import json
 import random
 calendar.setfirstweekday(calendar.MONDAY)
 
 
-def uniform_vector(N, sum_val):
+def uniform_vector(N, sum_val, rng=random):
     """
     Generate a vector of length N that sums to sum_val,
     with elements as uniform as possible.
@@ -15,6 +20,7 @@ def uniform_vector(N, sum_val):
     Parameters:
     N (int): Length of the vector.
     sum_val (int): Desired sum of the vector elements.
+    rng (random.Random): Random generator choosing which elements get the remainder (default: the random module).
 
     Returns:
     list: A vector of length N that sums to sum_val.
@@ -26,260 +32,776 @@ def uniform_vector(N, sum_val):
     # Step 3: Initialize the vector with the typical element
     vector = [typical_element for _ in range(N)]  # Create a list of length N filled with typical_element
     # Step 4: Randomly select indexes to increase by 1
-    indexes_to_increase = random.sample(range(N), remainder)  # Get 'remainder' unique indexes to increment
+    indexes_to_increase = rng.sample(range(N), remainder)  # Get 'remainder' unique indexes to increment
     # Step 5: Increment the selected indexes in the vector
     for i in indexes_to_increase:
         vector[i] = vector[i] + 1  # Increase the selected elements by 1
     return vector  # Return the resulting vector
 
+
+MAX_DEVIATION = 5  # deviation from the desired number of shifts allowed beyond the unavoidable one, see _SetTargets
+# Arguments of ShiftsProblem that can be changed in place with ShiftsProblem.Update
+UPDATABLE_PARAMETERS = ("vacation_days", "additional_shifts_ferial", "additional_shifts_festive",
+                        "additional_shifts_nights")
+
+
+def canonical_parameters(parameters):
+    """
+    Normalize the arguments of ShiftsProblem (passed as a dictionary of keyword arguments), so that equivalent inputs
+    compare equal: integers are converted to int and the lists of days and medics are sorted.
+    """
+    p = dict(parameters)
+    for key in ("month", "year", "num_medics",
+                "num_morning_shifts_ferial", "num_afternoon_shifts_ferial",
+                "num_morning_shifts_saturday", "num_afternoon_shifts_saturday"):
+        p[key] = int(p[key])
+    for key in ("medics_preferring_full_sundays", "festive_days_no_sundays"):
+        p[key] = sorted({int(v) for v in p[key]})
+    p["vacation_days"] = [sorted({int(v) for v in days}) for days in p["vacation_days"]]
+    for key in ("additional_shifts_ferial", "additional_shifts_festive", "additional_shifts_nights"):
+        p[key] = [int(v) for v in p[key]]
+    if p.get("carry_over") is None:
+        p.pop("carry_over", None)
+    else:
+        carry_over = p["carry_over"]
+        p["carry_over"] = {key: [None if m is None or m < 0 else int(m) for m in carry_over.get(key) or [None, None]]
+                           for key in ("previous_nights", "final_nights")}
+        p["carry_over"]["balance"] = [[int(v) for v in row] for row in
+                                      carry_over.get("balance", np.zeros((3, p["num_medics"]), dtype=int))]
+    return p
+
+
+def complete_parameters(parameters):
+    """
+    Fill the arguments of ShiftsProblem that can be omitted in an input file: no festive days besides the sundays,
+    no preferences for full sundays, no vacations and no additional shifts.
+    """
+    p = dict(parameters)
+    num_medics = int(p["num_medics"])
+    p.setdefault("medics_preferring_full_sundays", [])
+    p.setdefault("festive_days_no_sundays", [])
+    p.setdefault("vacation_days", [[] for _ in range(num_medics)])
+    for key in ("additional_shifts_ferial", "additional_shifts_festive", "additional_shifts_nights"):
+        p.setdefault(key, [0] * num_medics)
+    return p
+
+
+def input_hash(parameters):
+    """Return a hex digest identifying the arguments of ShiftsProblem (see canonical_parameters)."""
+    text = json.dumps(canonical_parameters(parameters), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def empty_carry_over(num_medics):
+    """
+    Boundary state passed from a month to the following one (argument carry_over of ShiftsProblem):
+    previous_nights: medics (0-indexed, or None) who worked the night shift of the second-to-last and last day of the
+        previous month, who must rest in the first days of the month.
+    final_nights: medics (or None) fixed to the night shift of the second-to-last and last day of the month.
+    balance: array of shape (3, num_medics) with the shifts, festive shifts and night shifts each medic still owes
+        from the previous months (desired minus worked), added to the desired number of shifts of the month.
+    """
+    return {"previous_nights": [None, None], "final_nights": [None, None],
+            "balance": np.zeros((3, num_medics), dtype=int).tolist()}
+
+
+def boundary_shifts(carry_over, layout):
+    """
+    Return the (medic, day, shift) triples (0-indexed) fixed by a carry-over (see empty_carry_over) in a month with
+    the given ShiftLayout: the medics who worked the night shift in the last two days of the previous month rest in
+    the first days of the month, and the final nights are assigned to the given medics. Empty without carry-over.
+    """
+    if carry_over is None:
+        return []
+    last_day = layout.num_days - 1
+    second_to_last_night, last_night = carry_over["previous_nights"]
+    final_nights = carry_over["final_nights"]
+    if second_to_last_night == last_night:
+        # A medic cannot work the last two nights of a month, but a carry-over written by hand (or saved from an
+        # older schedule) can say so: the rest after the last night covers both
+        second_to_last_night = None
+    forced = [(last_night, 0, layout.first_rest_shift), (last_night, 1, layout.second_rest_shift),
+              (second_to_last_night, 0, layout.second_rest_shift),
+              (final_nights[0], last_day - 1, layout.night_shift),
+              (final_nights[1], last_day, layout.night_shift)]
+    return [(n, d, s) for n, d, s in forced if n is not None]
+
+
+class ShiftLayout:
+    """
+    Calendar and shift-ID setup of a month, independent of the CP-SAT model.
+
+    The day types are stored as boolean masks over the (0-indexed) days of the month and the shifts included in each
+    day as a (num_days, num_shift_ids) boolean mask, so that the shifts can be selected with array indexing instead
+    of scanning lists of days.
+    """
+    def __init__(self, month, year, num_medics, festive_days_no_sundays,
+                 num_morning_shifts_ferial, num_afternoon_shifts_ferial,
+                 num_morning_shifts_saturday, num_afternoon_shifts_saturday):
+        self.month = month
+        self.year = year
+        self.num_medics = num_medics
+        self.calendar = calendar.TextCalendar(calendar.SUNDAY)
+        self.num_morning_shifts_ferial = num_morning_shifts_ferial
+        self.num_afternoon_shifts_ferial = num_afternoon_shifts_ferial
+        self.num_days = calendar.monthrange(year, month)[1]
+
+        # Day-type masks. A festive saturday is treated as a festive day.
+        weekdays = np.array([date(year, month, d + 1).weekday() for d in range(self.num_days)])
+        sundays = np.flatnonzero(weekdays == 6).tolist()
+        self.festive_days = list(festive_days_no_sundays) + [d for d in sundays if d not in festive_days_no_sundays]
+        self.saturdays = np.flatnonzero(weekdays == 5).tolist()
+        self.is_festive = np.zeros(self.num_days, dtype=bool)
+        self.is_festive[self.festive_days] = True
+        self.is_saturday = (weekdays == 5) & ~self.is_festive
+
+        '''
+        Assign an integer ID to each shift. The same ID denotes the same shift in every day:
+        the morning shifts come first, then the afternoon shifts.
+        The third-to-last shift is by convention the night shift.
+        The second-to-last shift is by convention the after-night resting "shift".
+        The last shift is by convention the second after-night resting "shift".
+        shift_mask[d, s] tells whether the shift s is included in the day d.
+        '''
+        num_day_shifts = num_morning_shifts_ferial + num_afternoon_shifts_ferial
+        self.num_shift_ids = num_day_shifts + 3
+        self.night_shift = num_day_shifts
+        self.first_rest_shift = num_day_shifts + 1
+        self.second_rest_shift = num_day_shifts + 2
+        saturday_shifts = np.zeros(self.num_shift_ids, dtype=bool)
+        saturday_shifts[:num_morning_shifts_saturday] = True
+        saturday_shifts[num_morning_shifts_ferial:num_morning_shifts_ferial + num_afternoon_shifts_saturday] = True
+        saturday_shifts[num_day_shifts:] = True
+        festive_shifts = np.zeros(self.num_shift_ids, dtype=bool)  # No choice allowed: only one medic on sundays
+        festive_shifts[[0, num_morning_shifts_ferial]] = True
+        festive_shifts[num_day_shifts:] = True
+        self.shift_mask = np.ones((self.num_days, self.num_shift_ids), dtype=bool)
+        self.shift_mask[self.is_saturday] = saturday_shifts
+        self.shift_mask[self.is_festive] = festive_shifts
+        # Shifts that must be assigned to a medic (i.e. excluding the resting "shifts")
+        self.work_mask = self.shift_mask.copy()
+        self.work_mask[:, self.first_rest_shift:] = False
+        # Dictionary mapping from a day to the list of the IDs of the shifts included in that day
+        self.all_shifts = {d: np.flatnonzero(self.shift_mask[d]).tolist() for d in range(self.num_days)}
+
+    @classmethod
+    def FromParameters(cls, parameters):
+        """Build the layout from the arguments of ShiftsProblem, passed as a dictionary."""
+        return cls(parameters["month"], parameters["year"], parameters["num_medics"],
+                   parameters["festive_days_no_sundays"],
+                   parameters["num_morning_shifts_ferial"], parameters["num_afternoon_shifts_ferial"],
+                   parameters["num_morning_shifts_saturday"], parameters["num_afternoon_shifts_saturday"])
+
+    def Statistics(self, assignment):
+        """
+        Count the shifts worked by each medic in an assignment array.
+
+        Parameters:
+        assignment (np.ndarray): Boolean array of shape (num_medics, num_days, num_shift_ids), true where the medic
+            works the shift.
+
+        Returns:
+        dict: "shifts", "nights" and "festive_shifts", each an array with one count per medic.
+        """
+        worked = assignment & self.work_mask
+        return {"shifts": worked.sum(axis=(1, 2)),
+                "nights": worked[:, :, self.night_shift].sum(axis=1),
+                "festive_shifts": worked[:, self.is_festive].sum(axis=(1, 2))}
+
+    def Roster(self, assignment):
+        """Return a (num_days, num_shift_ids) array with the (0-indexed) medic working each shift, -1 if none."""
+        worked = assignment & self.work_mask
+        return np.where(worked.any(axis=0), worked.argmax(axis=0), -1)
+
+
+class Schedule:
+    """
+    A solved schedule detached from the CP-SAT model: the arguments of ShiftsProblem, the outcome of the search, the
+    desired number of shifts, the assignment array and the metrics of the problem. Unlike ShiftsProblem, it can be
+    pickled (e.g. to return it from a worker process).
+    """
+    def __init__(self, parameters, result, assignment, desired_shifts, metrics=None):
+        self.parameters = parameters
+        self.result = result
+        self.assignment = assignment
+        self.desired_shifts = desired_shifts
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.layout = ShiftLayout.FromParameters(parameters)
+
+    def Statistics(self):
+        return self.layout.Statistics(self.assignment)
+
+    def Roster(self):
+        return self.layout.Roster(self.assignment)
+
+    def CarryOver(self):
+        """Boundary state to pass to the following month (see empty_carry_over)."""
+        carry_over = empty_carry_over(self.parameters["num_medics"])
+        nights = self.Roster()[-2:, self.layout.night_shift]
+        carry_over["previous_nights"] = [int(m) if m >= 0 else None for m in nights]
+        # desired_shifts already includes the balance carried from the previous months
+        carry_over["balance"] = self.Deviations().tolist()
+        return carry_over
+
+    def ToDict(self):
+        """
+        Describe the schedule with JSON-serializable values: the arguments of ShiftsProblem, the outcome of the search
+        and, if a schedule was found, the (0-indexed) medics working the morning, afternoon and night shifts of each
+        day and the per-medic statistics.
+        """
+        data = dict({"parameters": self.parameters}, **self.result.ToDict())
+        if self.assignment is None:
+            return data
+        layout = self.layout
+        roster = self.Roster()
+        num_morning = layout.num_morning_shifts_ferial
+        days = []
+        for d in range(layout.num_days):
+            medics = roster[d, :layout.night_shift]
+            included = layout.work_mask[d, :layout.night_shift]
+            days.append({"date": date(layout.year, layout.month, d + 1).isoformat(),
+                         "morning": medics[:num_morning][included[:num_morning]].tolist(),
+                         "afternoon": medics[num_morning:][included[num_morning:]].tolist(),
+                         "night": int(roster[d, layout.night_shift])})
+        data["days"] = days
+        data["statistics"] = {key: value.tolist() for key, value in self.Statistics().items()}
+        return data
+
+    def Deviations(self):
+        """
+        Return an array of shape (3, num_medics) with the desired minus the worked number of shifts (row 0), festive
+        shifts (row 1) and night shifts (row 2) of each medic.
+        """
+        statistics = self.Statistics()
+        worked = np.stack([statistics["shifts"], statistics["festive_shifts"], statistics["nights"]])
+        return self.desired_shifts - worked
+
+
 class ShiftsProblem:
     def __init__(self, month, year, num_medics, medics_preferring_full_sundays, festive_days_no_sundays, vacation_days,
                  num_morning_shifts_ferial, num_afternoon_shifts_ferial,
                  num_morning_shifts_saturday, num_afternoon_shifts_saturday,
-                 additional_shifts_ferial, additional_shifts_festive, additional_shifts_nights):
+                 additional_shifts_ferial, additional_shifts_festive, additional_shifts_nights,
+                 carry_over=None, model=None, metrics=None):
+        """
+        carry_over (dict): Boundary state from the previous month, see empty_carry_over (None for no boundary state).
+        model (cp_model.CpModel): Model to which the variables and constraints are added (default: a new model). A
+            model shared by several problems is solved by the caller, see HorizonScheduler.
+        metrics (Metrics): Records the phases of the build, of the searches and of the rendering (default: a new
+            Metrics).
+        """
+        self.metrics = metrics if metrics is not None else Metrics()
+        timer = self.metrics.Timer()
+        self.parameters = canonical_parameters(dict(
+            month=month, year=year, num_medics=num_medics,
+            medics_preferring_full_sundays=medics_preferring_full_sundays,
+            festive_days_no_sundays=festive_days_no_sundays, vacation_days=vacation_days,
+            num_morning_shifts_ferial=num_morning_shifts_ferial, num_afternoon_shifts_ferial=num_afternoon_shifts_ferial,
+            num_morning_shifts_saturday=num_morning_shifts_saturday,
+            num_afternoon_shifts_saturday=num_afternoon_shifts_saturday,
+            additional_shifts_ferial=additional_shifts_ferial, additional_shifts_festive=additional_shifts_festive,
+            additional_shifts_nights=additional_shifts_nights, carry_over=carry_over))
+        self.carry_over = self.parameters.get("carry_over")
+        self.input_hash = input_hash(self.parameters)
+        self.layout = ShiftLayout(month, year, num_medics, festive_days_no_sundays,
+                                  num_morning_shifts_ferial, num_afternoon_shifts_ferial,
+                                  num_morning_shifts_saturday, num_afternoon_shifts_saturday)
         self.month = month
         self.year = year
         self.num_medics = num_medics
         self.medics_preferring_full_sundays = medics_preferring_full_sundays
-        self.calendar = calendar.TextCalendar(calendar.SUNDAY)
-        self.festive_days = festive_days_no_sundays
+        self.calendar = self.layout.calendar
+        self.festive_days = self.layout.festive_days
+        self.saturdays = self.layout.saturdays
         self.additional_shifts_ferial = np.array(additional_shifts_ferial)
         self.additional_shifts_festive = np.array(additional_shifts_festive)
         self.additional_shifts_nights = np.array(additional_shifts_nights)
-
-        self.saturdays = []
-        for day in self.calendar.itermonthdays(year, month):
-            if day != 0:
-                if date(year, month, day).weekday() == 6:
-                    self.festive_days.append(day - 1)  # conversion to 0-index
-                if date(year, month, day).weekday() == 5:
-                    self.saturdays.append(day - 1)  # conversion to 0-index
-        num_days = max(max((self.calendar.monthdayscalendar(year, month))))
+        num_days = self.layout.num_days
         self.num_morning_shifts_ferial = num_morning_shifts_ferial #need to store in class for plotting
         self.num_afternoon_shifts_ferial = num_afternoon_shifts_ferial #need to store in class for plotting
         self.all_medics = range(num_medics)
         self.all_days = range(num_days)
-        self.shifts = {}
-        ''' 
-        Assign an integer ID to each shift and collect them in a dictionary all_shifts
-        the dictionary maps from a day to a list containing the numeric IDs of the shifts included in that day
-        The third-to-last shift is by convention the night shift.        
-        The second-to-last shift is by convention the after-night resting "shift".       
-        The third-to-last shift is by convention the second after-night resting "shift".    
+        self.all_shifts = self.layout.all_shifts
+
         '''
-        self.all_shifts = {}
-        for d in self.all_days:
-            if d not in self.saturdays and d not in self.festive_days:
-                self.all_shifts.update({d: list(range(num_morning_shifts_ferial + num_afternoon_shifts_ferial + 3))})
-            if d in self.saturdays:
-                IDs_of_shift = list(range(num_morning_shifts_saturday))
-                IDs_of_shift.extend(range(num_morning_shifts_ferial,
-                                          num_morning_shifts_ferial + num_afternoon_shifts_saturday))
-                IDs_of_shift.extend(range(num_morning_shifts_ferial + num_afternoon_shifts_ferial,
-                                          num_morning_shifts_ferial + num_afternoon_shifts_ferial + 3))
-                self.all_shifts.update({d: IDs_of_shift})
-            if d in self.festive_days: # No choice allowed: only one medic on sundays
-                IDs_of_shift = [0]
-                IDs_of_shift.extend(range(num_morning_shifts_ferial,
-                                          num_morning_shifts_ferial + 1))
-                IDs_of_shift.extend(range(num_morning_shifts_ferial + num_afternoon_shifts_ferial,
-                                          num_morning_shifts_ferial + num_afternoon_shifts_ferial + 3))
-                self.all_shifts.update({d: IDs_of_shift})
-        self.model = cp_model.CpModel()
-        for n in self.all_medics:
-            for d in self.all_days:
-                for s in self.all_shifts[d]:
-                    self.shifts[(n, d, s)] = self.model.NewBoolVar('shift_n%id%is%i' % (n, d, s))
+        The boolean variable of medic n working shift s in day d is stored in the flat list shift_vars, at the offset
+        n * num_slots + slot_index[d, s]. A "slot" is a (day, shift) pair included in the calendar: the slots of a
+        medic are numbered day by day, in increasing order of shift ID. slot_index is -1 for the shifts not included
+        in a day.
+        '''
+        layout = self.layout
+        self.num_slots = int(layout.shift_mask.sum())
+        self.slot_index = np.full(layout.shift_mask.shape, -1)
+        self.slot_index[layout.shift_mask] = np.arange(self.num_slots)
+        slot_days, slot_shifts = np.nonzero(layout.shift_mask)
+        timer.End("setup")
+        self.model = model if model is not None else cp_model.CpModel()
+        new_bool_var = self.model.NewBoolVar
+        self.shift_vars = [new_bool_var('shift_n%id%is%i' % (n, d, s))
+                           for n in self.all_medics for d, s in zip(slot_days.tolist(), slot_shifts.tolist())]
+        # Per-medic slot offsets used by the constraints below
+        work_slots = self.slot_index[layout.work_mask]
+        festive_work_slots = self.slot_index[layout.work_mask & layout.is_festive[:, None]]
+        night_slots = self.slot_index[:, layout.night_shift]
+        first_rest_slots = self.slot_index[:, layout.first_rest_shift]
+        second_rest_slots = self.slot_index[:, layout.second_rest_shift]
+        day_slots = [self.slot_index[d][layout.shift_mask[d]] for d in self.all_days]
+        medic_offsets = [n * self.num_slots for n in self.all_medics]
+        x = self.shift_vars
+        timer.End("variables")
 
         ######### Generate constraints###########
         # Each shift is assigned to exactly one medic in the schedule period (excluding rest "shifts").
-        for d in self.all_days:
-            for s in self.all_shifts[d][:-2]:
-                self.model.AddExactlyOne(self.shifts[(n, d, s)] for n in self.all_medics)
+        # staffing_constraints maps (day, shift) to the index of the constraint in the model (see Feasibility)
+        self.staffing_constraints = {}
+        for k in work_slots.tolist():
+            staffing = self.model.AddExactlyOne(x[o + k] for o in medic_offsets)
+            self.staffing_constraints[(int(slot_days[k]), int(slot_shifts[k]))] = staffing.Index()
         # Each medic works at most one shift per day, except for sundays (if the medic prefers 12h shifts on sundays).
         for n in self.all_medics:
+            o = medic_offsets[n]
+            prefers_full_sundays = n in medics_preferring_full_sundays
             for d in self.all_days:
-                if n in medics_preferring_full_sundays:
-                    if d in self.festive_days:
-                        self.model.Add(self.shifts[(n, d, self.all_shifts[d][0])] ==
-                                       self.shifts[(n, d, self.all_shifts[d][1])]) # morning shift is equal to afternoon shift
-                    else:
-                        self.model.AddAtMostOne(self.shifts[(n, d, s)] for s in self.all_shifts[d])
+                if prefers_full_sundays and layout.is_festive[d]:
+                    # morning shift is equal to afternoon shift, and excludes the night and the rest "shifts"
+                    self.model.Add(x[o + day_slots[d][0]] == x[o + day_slots[d][1]])
+                    self.model.AddAtMostOne(x[o + k] for k in [day_slots[d][0]] + day_slots[d][2:].tolist())
                 else:
-                    self.model.AddAtMostOne(self.shifts[(n, d, s)] for s in self.all_shifts[d])
+                    self.model.AddAtMostOne(x[o + k] for k in day_slots[d].tolist())
 
-        # Two rest days after night shift
-        for n in self.all_medics:
-            for d in self.all_days:
-                if d > 1:
-                    night_shift = self.shifts[(n, d - 2, self.all_shifts[d-2][-3])]
-                    afternight_shift = self.shifts[(n, d-1, self.all_shifts[d-1][-2])]
-                    second_afternight_shift = self.shifts[(n, d, self.all_shifts[d][-1])]
-                    self.model.Add(night_shift == afternight_shift)
-                    self.model.Add(night_shift == second_afternight_shift)
-
-        # Include vacation days
-        for n in self.all_medics:
-            for day in vacation_days[n]:
-                d = day - 1 # convert to 0-indexing
-                for s in self.all_shifts[d][:-2]:
-                    self.model.Add(self.shifts[(n, d, s)]==0)
+        # Two rest days after night shift. The night of the second-to-last day rests on the last day; the rest after
+        # the nights of the last two days continues in the following month (see BoundaryShifts)
+        for o in medic_offsets:
+            for d in range(2, num_days):
+                night_shift = x[o + night_slots[d - 2]]
+                self.model.Add(night_shift == x[o + first_rest_slots[d - 1]])
+                self.model.Add(night_shift == x[o + second_rest_slots[d]])
+            self.model.Add(x[o + night_slots[num_days - 2]] == x[o + first_rest_slots[num_days - 1]])
+        if self.carry_over is not None:
+            self._FixBoundaryNights()
+
+        # Include vacation days: the work shifts of a medic in vacation are fixed to 0 (see _SetVacations)
+        self.vacation_days = [[] for _ in self.all_medics]
+        self._SetVacations(vacation_days)
 
         '''
         Try to distribute the shifts evenly:
         Compute desired_shifts_per_medic  as the number of shift each medic should work (in average)
         Define two auxiliary variables (aux_low, aux_up) per medic such that
-        aux_low <= n_shifts_worked_by_medic - desired_shifts_per_medic <=  aux_up
+        desired_shifts_per_medic - aux_up <= n_shifts_worked_by_medic <= desired_shifts_per_medic + aux_low
         Repeat for the number of nights worked and number of festive days worked.
         Then, minimize the sum of auxiliary variables.
+        The desired number of shifts only appears in the bounds of the balance constraints, and the bounds of the
+        auxiliary variables are derived from it: both are set, and can be changed in place, by _SetTargets.
+        The inequalities leave the search free to overshoot an auxiliary variable in a partial assignment: an equality
+        would tie each of them to the shifts worked, which slows down the search with a single worker.
         '''
+        self.aux_vars_up = {}
+        self.aux_vars_low = {}
+        self.balance_constraints = {}
+        work_slots = work_slots.tolist()
+        festive_work_slots = festive_work_slots.tolist()
+        night_slots = night_slots.tolist()
+        for n in self.all_medics:
+            o = medic_offsets[n]
+            worked = (cp_model.LinearExpr.Sum([x[o + k] for k in work_slots]),
+                      cp_model.LinearExpr.Sum([x[o + k] for k in festive_work_slots]),
+                      cp_model.LinearExpr.Sum([x[o + k] for k in night_slots]))
+            # t = 0: all shifts, t = 1: festive shifts, t = 2: night shifts
+            for t in range(3):
+                self.aux_vars_up[(t, n)] = self.model.NewIntVar(0, 0, 'aux_variable_up%it%im' % (t, n))
+                self.aux_vars_low[(t, n)] = self.model.NewIntVar(0, 0, 'aux_variable_low%it%im' % (t, n))
+                # the bounds 0 are replaced by the desired number of shifts in _SetTargets
+                below = self.model.Add(worked[t] + self.aux_vars_up[(t, n)] >= 0)
+                above = self.model.Add(worked[t] - self.aux_vars_low[(t, n)] <= 0)
+                self.balance_constraints[(t, n)] = (below.Index(), above.Index())
+        timer.End("constraints")
+        self.limit_deviations = True  # see _SetTargets
+        self._SetTargets(self._DesiredShifts())
+        self.solver = cp_model.CpSolver()
+        self.stop_requested = False  # set by StopSearch, until the end of the Solve it stops
+        self.result = None  # filled by Solve
+        self.assignment = None  # filled by Solve, see ExtractAssignment
+        self.sum_aux_vars = cp_model.LinearExpr.Sum([self.aux_vars_up[(t, n)] + self.aux_vars_low[(t, n)]
+                                                     for n in self.all_medics for t in range(3)])
+        self.symmetry_breaking = False  # see SetSymmetryBreaking
+        self.symmetry_literals = {}
+        self._SetObjective()
+        timer.End("objective")
+
+    def _DesiredShifts(self):
+        """
+        Compute the number of shifts, festive shifts and night shifts each medic should work, from the current inputs.
+
+        Returns:
+        np.ndarray: Array of shape (3, num_medics): row 0 for all the shifts, row 1 for the festive shifts, row 2 for
+            the night shifts.
+        """
+        num_medics = self.num_medics
+        num_days = self.layout.num_days
+        vacation_days = self.parameters["vacation_days"]
         num_shifts_festive = 3 # 3 = 1 morning + 1 afternoon + 1 night
-        total_number_of_shifts = (num_shifts_festive * len(self.festive_days) +
-                    (num_morning_shifts_saturday + num_afternoon_shifts_saturday + 1) * len(self.saturdays) +
-                    (num_morning_shifts_ferial + num_afternoon_shifts_ferial + 1) * (num_days - len(self.saturdays) - len(self.festive_days)))
+        total_number_of_shifts = int(self.layout.work_mask.sum())
         total_night_shifts = num_days
         total_festive_shifts = num_shifts_festive * len(self.festive_days)
         '''
-        By default, each medic should work the average number of shifts. However, some medics are required an 
+        By default, each medic should work the average number of shifts. However, some medics are required an
         additional amount of shifts: this reduces the amount of shifts required to the remaining medics.
         We create a vector of num_medics element, each element equal to the average amount of shifts required
-         (adjusted to remove the additional shifts), and then we add the specifically requested additional shifts 
+         (adjusted to remove the additional shifts), and then we add the specifically requested additional shifts
         '''
-        print("sum of additional shifs: " + str(np.sum(self.additional_shifts_ferial )) )
-
-        desired_shifts_per_medic = uniform_vector(num_medics, total_number_of_shifts - np.sum(self.additional_shifts_ferial ))
-        desired_festive_shifts_per_medic = uniform_vector(num_medics, (total_festive_shifts - np.sum(self.additional_shifts_festive)))
-        desired_night_shifts_per_medic = uniform_vector(num_medics, (total_night_shifts - np.sum(self.additional_shifts_nights)))
+        # The remainders are distributed with a generator seeded by the inputs, so that the same inputs give the same model
+        rng = random.Random(int(self.input_hash[:16], 16))
+        desired_shifts_per_medic = uniform_vector(num_medics, total_number_of_shifts - np.sum(self.additional_shifts_ferial ), rng)
+        desired_festive_shifts_per_medic = uniform_vector(num_medics, (total_festive_shifts - np.sum(self.additional_shifts_festive)), rng)
+        desired_night_shifts_per_medic = uniform_vector(num_medics, (total_night_shifts - np.sum(self.additional_shifts_nights)), rng)
+        if self.carry_over is not None:
+            # Shifts owed from the previous months (negative if the medic worked more than desired)
+            balance = self.carry_over["balance"]
+            desired_shifts_per_medic = [v + b for v, b in zip(desired_shifts_per_medic, balance[0])]
+            desired_festive_shifts_per_medic = [v + b for v, b in zip(desired_festive_shifts_per_medic, balance[1])]
+            desired_night_shifts_per_medic = [v + b for v, b in zip(desired_night_shifts_per_medic, balance[2])]
 
         # Each medic should work less shifts if they required vacation. How many shifts to reduce is computed by
         # taking the average number of shifts worked by each medic in each day and multiplying by the number of vacation days requested.
         avg_shifts_per_day = float(total_number_of_shifts) / (num_days * num_medics)
         for n in range(num_medics):
             reduction_shifts_due_to_vacations = int(avg_shifts_per_day * len(vacation_days[n]))
-            desired_shifts_per_medic[n] = desired_shifts_per_medic[n] - reduction_shifts_due_to_vacations + additional_shifts_ferial[n]
-            desired_festive_shifts_per_medic[n] = desired_festive_shifts_per_medic[n] + additional_shifts_festive[n]
-            desired_night_shifts_per_medic[n] = desired_night_shifts_per_medic[n] + additional_shifts_nights[n]
+            desired_shifts_per_medic[n] = desired_shifts_per_medic[n] - reduction_shifts_due_to_vacations + self.additional_shifts_ferial[n]
+            desired_festive_shifts_per_medic[n] = desired_festive_shifts_per_medic[n] + self.additional_shifts_festive[n]
+            desired_night_shifts_per_medic[n] = desired_night_shifts_per_medic[n] + self.additional_shifts_nights[n]
 
-        # Convert everything to integers to avoid the solver to panic
-        # desired_shifts_per_medic = desired_shifts_per_medic.astype(int).tolist()
-        # desired_festive_shifts_per_medic = desired_festive_shifts_per_medic.astype(int).tolist()
-        # desired_night_shifts_per_medic = desired_night_shifts_per_medic.astype(int).tolist()
-        print("desired_shifts_per_medic: " + str(desired_shifts_per_medic))
-        print("desired_festive_shifts_per_medic: " + str(desired_festive_shifts_per_medic))
-        print("desired_night_shifts_per_medic: " + str(desired_night_shifts_per_medic))
+        self.metrics.Log("desired_shifts", shifts=desired_shifts_per_medic,
+                         festive_shifts=desired_festive_shifts_per_medic, night_shifts=desired_night_shifts_per_medic)
+        return np.array([desired_shifts_per_medic, desired_festive_shifts_per_medic, desired_night_shifts_per_medic],
+                        dtype=int)
 
+    def BoundaryShifts(self):
+        """
+        Return the (medic, day, shift) triples (0-indexed) fixed by the carry-over of the problem (see
+        boundary_shifts).
+        """
+        return boundary_shifts(self.carry_over, self.layout)
 
-        self.aux_vars_up = {}
+    def _FixBoundaryNights(self):
+        """Apply the nights of the carry-over (see BoundaryShifts)."""
+        variables = self.model.Proto().variables
+        for n, d, s in self.BoundaryShifts():
+            variables[self.ShiftVar(n, d, s).Index()].domain[0] = 1
 
-        self.aux_vars_low = {}
+    def _SetVacations(self, vacation_days):
+        """
+        Fix to 0 the work shifts of the vacation days, releasing the days no longer in vacation. A vacation in a day
+        whose night is assigned by the carry-over (see BoundaryShifts) raises ValueError, leaving the model unchanged.
+        """
+        for n, d, s in self.BoundaryShifts():
+            if self.layout.work_mask[d, s] and d + 1 in vacation_days[n]:
+                raise ValueError("Medic %d is in vacation on day %d, but the carry-over assigns them the night shift "
+                                 "of that day" % (n + 1, d + 1))
+        variables = self.model.Proto().variables
+        work_slots_of_day = [self.slot_index[d][self.layout.work_mask[d]] for d in self.all_days]
         for n in self.all_medics:
-            shifts_worked = []
-            night_shifts_worked = []
-            festive_shifts_worked = []
-            for d in self.all_days:
-                for s in self.all_shifts[d][:-2]:
-                    shifts_worked.append(self.shifts[(n, d, s)])
-                    if d in self.festive_days:
-                        festive_shifts_worked.append(self.shifts[(n, d, s)])
-                    if s == self.all_shifts[d][-3]:
-                        night_shifts_worked.append(self.shifts[(n, d, s)])
-            self.aux_vars_up[(0, n)] = self.model.NewIntVar(0,5, 'aux_variable_up%it%im' % (0, n))
-            self.aux_vars_low[(0, n)] = self.model.NewIntVar(0,5, 'aux_variable_low%it%im' % (0, n))
-            # print("Medic %d should work %d shifts" %(n, desired_shifts_per_medic - reduction_shifts_due_to_vacations))
-            self.model.Add( desired_shifts_per_medic[n] - sum(shifts_worked)<= self.aux_vars_up[(0,n)])
-            self.model.Add( desired_shifts_per_medic[n] - sum(shifts_worked)>= -1*self.aux_vars_low[(0,n)])
-            # self.model.Add(self.aux_vars_up[(0, n)] >= 0)
-            # self.model.Add(self.aux_vars_low[(0, n)] >= 0)
-            self.aux_vars_up[(1, n)] = self.model.NewIntVar(0,5, 'aux_variable_up%it%im' % (1, n))
-            self.aux_vars_low[(1, n)] = self.model.NewIntVar(0,5, 'aux_variable_low%it%im' % (1, n))
-            self.model.Add(desired_festive_shifts_per_medic[n] - sum(festive_shifts_worked) <= self.aux_vars_up[(1, n)])
-            self.model.Add(desired_festive_shifts_per_medic[n] - sum(festive_shifts_worked) >= -1 * self.aux_vars_low[(1, n)])
-            # self.model.Add(self.aux_vars_up[(1, n)] >= 0)
-            # self.model.Add(self.aux_vars_low[(1, n)] >= 0)
-            self.aux_vars_up[(2, n)] = self.model.NewIntVar(0,5, 'aux_variable_up%it%im' % (2, n))
-            self.aux_vars_low[(2, n)] = self.model.NewIntVar(0,5, 'aux_variable_low%it%im' % (2, n))
-            self.model.Add(desired_night_shifts_per_medic[n] - sum(night_shifts_worked) <= self.aux_vars_up[(2, n)])
-            self.model.Add(desired_night_shifts_per_medic[n] - sum(night_shifts_worked) >= -1 * self.aux_vars_low[(2, n)])
-            # self.model.Add(self.aux_vars_up[(2, n)] >= 0)
-            # self.model.Add(self.aux_vars_low[(2, n)] >= 0)
-            self.solver = cp_model.CpSolver()
-            self.solver.parameters.linearization_level = 0
-        self.sum_aux_vars = cp_model.LinearExpr.Sum([self.aux_vars_up[(0, n)] + self.aux_vars_low[(0, n)] + \
-                                                     self.aux_vars_up[(1, n)] + self.aux_vars_low[(1, n)] + \
-                                                     self.aux_vars_up[(2, n)] + self.aux_vars_low[(2, n)] \
-                                                     for n in self.all_medics])
-        self.model.Minimize(self.sum_aux_vars)
-
-    def Solve(self):
-        status = self.solver.Solve(self.model)
-
-        return status
+            old_days, new_days = set(self.vacation_days[n]), set(vacation_days[n])
+            for day, upper_bound in [(day, 1) for day in old_days - new_days] + [(day, 0) for day in new_days - old_days]:
+                d = day - 1 # convert to 0-indexing
+                for k in work_slots_of_day[d].tolist():
+                    variables[self.shift_vars[n * self.num_slots + k].Index()].domain[1] = upper_bound
+            self.vacation_days[n] = sorted(new_days)
 
+    def _MaxShifts(self):
+        """
+        Upper bound of the number of shifts, festive shifts and night shifts each medic can work, given the vacations:
+        one shift per day (the two day shifts of the festive days for the medics preferring full sundays) and one
+        night every three days.
 
-    def PrintTable(self):
-        # Create and print table
-        n_weeks = len(self.calendar.monthdayscalendar(self.year, self.month))
-        num_shifts_ferial = self.num_morning_shifts_ferial + self.num_afternoon_shifts_ferial + 1
-        fig, ax = plt.subplots(n_weeks + 1, 1, figsize=(8, 0.3*num_shifts_ferial * (n_weeks + 1)))  # last one is for statistics
-        fig.suptitle("Turni " + calendar.month_name[self.month] + ' ' + str(self.year))
-        for week in range(n_weeks):
-            ax[week].set_axis_off()
-            # names_of_days = ('Lun', 'Mar', 'Mer', 'Gio', 'Ven', 'Sab', 'Dom')
-            columns = []
-            rows = ['Mattina ' + str(1+i) for i in range(self.num_morning_shifts_ferial)]
-            rows.extend(['Pomeriggio ' + str(1+i) for i in range(self.num_afternoon_shifts_ferial)])
-            rows.append('Notte')
-            values = np.zeros((num_shifts_ferial, 7)) # 7 = days of the week
-            days_in_week = self.calendar.monthdayscalendar(self.year, self.month)[week]
-            index_day = 0
-            print(days_in_week)
-            for day in days_in_week:
-                if day == 0:
-                    columns.append('-')
-                    # values[0, index_day] = 0
-                else:
-                    # Print day's name:
-                    # retrieve day number and convert it to the name of the day using calendar.day_name, then take the first 3 letters
-                    columns.append(calendar.day_name[date(self.year, self.month, day).weekday()][:3] + " " + str(day))
-                    d = day - 1  # convert to 0-index
-                    for s in self.all_shifts[d][:-2]:
-                        medic_working = None
-                        for n in self.all_medics:
-                            if self.solver.Value(self.shifts[(n, d, s)]) > 0:
-                                medic_working = n
-                        values[s, index_day] = medic_working + 1
-                index_day = index_day + 1
-            cell_text = []
-            for row in range(len(rows)):
-                cell_text.append(
-                    [str(int(values[row, col])) if values[row, col] > 0. else "-" for col in range(len(columns))])
-            ax[week].set_axis_off()
-            table = ax[week].table(cellText=cell_text, rowLabels=rows, colLabels=columns, cellLoc='center',
-                                   loc='upper left')
-        # Print statistics medics
-        columns = [ '# turni', '# notti', '# turni fest.']
-        rows = ["Medico " + str(m + 1) for m in self.all_medics]
-        values = np.zeros((self.num_medics, 4))
+        Returns:
+        np.ndarray: Array of shape (3, num_medics), rows as in _DesiredShifts.
+        """
+        layout = self.layout
+        max_shifts = np.zeros((3, self.num_medics), dtype=int)
         for n in self.all_medics:
-            count_shifts = 0
-            count_night_shifts = 0
-            count_festive_shifts = 0
-            for d in self.all_days:
-                for s in self.all_shifts[d][:-2]:
-                    if self.solver.Value(self.shifts[(n, d, s)]) > 0:
-                        count_shifts = count_shifts + 1
-                        if s == self.all_shifts[d][-3]:
-                            count_night_shifts = count_night_shifts + 1
-                        if d in self.festive_days:
-                            count_festive_shifts = count_festive_shifts + 1
-            values[n, 0] = count_shifts
-            values[n, 1] = count_night_shifts
-            values[n, 2] = count_festive_shifts
-        cell_text = []
-        for row in range(len(rows)):
-            cell_text.append([str(int(values[row, col])) for col in range(len(columns))])
-        ax[-1].set_axis_off()
-        ax[-1].table(cellText=cell_text, rowLabels=rows, colLabels=columns, cellLoc='center', loc='upper left')
-
-        plt.show()
-        return fig
+            available = np.ones(layout.num_days, dtype=bool)
+            available[[day - 1 for day in self.vacation_days[n]]] = False
+            if n in self.medics_preferring_full_sundays:
+                day_shifts = layout.work_mask[:, :layout.night_shift].sum(axis=1)
+                shifts_per_day = np.where(layout.is_festive, day_shifts, 1)
+            else:
+                shifts_per_day = np.ones(layout.num_days, dtype=int)
+            max_shifts[0, n] = shifts_per_day[available].sum()
+            max_shifts[1, n] = shifts_per_day[available & layout.is_festive].sum()
+            max_shifts[2, n] = min(available.sum(), (layout.num_days + 2) // 3)
+        return max_shifts
+
+    def _SetTargets(self, desired_shifts):
+        """
+        Change the desired number of shifts in the bounds of the balance constraints, and bound the auxiliary
+        variables by the deviations possible: at most the target below it, at most the largest number of shifts the
+        medic can work above it. While limit_deviations is set, the deviations are also limited to the ones made
+        unavoidable by the vacations (the target cannot be reached) and by the targets not summing to the number of
+        shifts of the month, plus MAX_DEVIATION: this keeps the search among balanced schedules, but can exclude
+        all the schedules (see RelaxDeviations).
+        """
+        constraints = self.model.Proto().constraints
+        variables = self.model.Proto().variables
+        layout = self.layout
+        max_shifts = self._MaxShifts()
+        total_shifts = (int(layout.work_mask.sum()), int((layout.work_mask & layout.is_festive[:, None]).sum()),
+                        layout.num_days)
+        band = [MAX_DEVIATION + -(-abs(total_shifts[t] - int(desired_shifts[t].sum())) // self.num_medics)
+                for t in range(3)]
+        for (t, n), (below, above) in self.balance_constraints.items():
+            target = int(desired_shifts[t, n])
+            constraints[below].linear.domain[0] = target
+            constraints[above].linear.domain[1] = target
+            max_up, max_low = target, int(max_shifts[t, n]) - target
+            if self.limit_deviations:
+                max_up = min(max_up, max(0, -max_low) + band[t])
+                max_low = min(max_low, max(0, -target) + band[t])
+            variables[self.aux_vars_up[(t, n)].Index()].domain[1] = max(0, max_up)
+            variables[self.aux_vars_low[(t, n)].Index()].domain[1] = max(0, max_low)
+        self.desired_shifts = desired_shifts
+
+    def RelaxDeviations(self):
+        """Remove the limits on the deviations from the desired number of shifts (see _SetTargets)."""
+        self.limit_deviations = False
+        self._SetTargets(self.desired_shifts)
+
+    def InterchangeableMedics(self):
+        """
+        Group the medics that can exchange their whole schedules without changing the objective: same vacation days,
+        same preference for full sundays, same desired numbers of shifts and no night fixed by the carry-over.
+
+        Returns:
+        list: Classes of interchangeable medics (lists of at least two medics, in increasing order).
+        """
+        fixed_nights = set()
+        if self.carry_over is not None:
+            fixed_nights.update(self.carry_over["previous_nights"] + self.carry_over["final_nights"])
+        classes = {}
+        for n in self.all_medics:
+            if n not in fixed_nights:
+                key = (tuple(self.vacation_days[n]), n in self.medics_preferring_full_sundays,
+                       tuple(self.desired_shifts[:, n].tolist()))
+                classes.setdefault(key, []).append(n)
+        return [members for members in classes.values() if len(members) > 1]
+
+    def _AddSymmetryBreaking(self):
+        """
+        Keep a single schedule out of the equivalent ones obtained by permuting interchangeable medics: within a
+        class, a medic can work a night only if the previous medic of the class worked a night on an earlier day.
+        Since two medics never work the same night, this orders the medics of a class lexicographically by their
+        night shifts. The constraints of each pair of medics are enforced by a literal, see _EnableSymmetryBreaking.
+        """
+        night = self.layout.night_shift
+        for members in self.InterchangeableMedics():
+            for n, m in zip(members, members[1:]):
+                enabled = self.model.NewBoolVar('symmetry_n%im%i' % (n, m))
+                for d in self.all_days:
+                    nights_before = [self.ShiftVar(n, e, night) for e in range(d)]
+                    self.model.AddBoolOr(nights_before + [self.ShiftVar(m, d, night).Not(), enabled.Not()])
+                self.symmetry_literals[(n, m)] = enabled.Index()
+
+    def _EnableSymmetryBreaking(self):
+        """
+        Enforce the ordering of the pairs of medics that are still interchangeable after the last changes (see
+        Update), and release the others. The ordering is released for all the medics if the objective tells them
+        apart (see _SetObjective) or if it was disabled with SetSymmetryBreaking.
+        """
+        variables = self.model.Proto().variables
+        class_of = {}
+        if self.symmetry_breaking and self.objective_is_symmetric:
+            for c, members in enumerate(self.InterchangeableMedics()):
+                class_of.update((n, c) for n in members)
+        for (n, m), index in self.symmetry_literals.items():
+            enabled = int(n in class_of and class_of[n] == class_of.get(m))
+            variables[index].domain[0] = enabled
+            variables[index].domain[1] = enabled
+
+    def SetSymmetryBreaking(self, enabled):
+        """
+        Enable or disable the ordering of the interchangeable medics (see _AddSymmetryBreaking), which is added to
+        the model the first time it is enabled. It is disabled by default: CP-SAT already breaks these symmetries
+        during the search, and the additional constraints slow down the large neighborhood search (with several
+        workers, or interleaved in a single one, see SolverProfile.Apply) more than they shrink the search space. It must stay disabled when other constraints tell the medics
+        apart, e.g. when the model is linked to the following months (see HorizonScheduler).
+        """
+        if enabled and not self.symmetry_literals:
+            self._AddSymmetryBreaking()
+        self.symmetry_breaking = enabled
+        self._EnableSymmetryBreaking()
+
+    def _SetObjective(self, reference=None, change_weight=0):
+        """
+        Minimize the sum of the auxiliary variables. If a reference assignment is given, each shift assigned
+        differently from the reference costs change_weight.
+        """
+        objective = self.sum_aux_vars
+        if reference is not None and change_weight > 0:
+            was_working = reference[:, self.layout.work_mask].ravel()
+            work_vars = [self.shift_vars[o + k] for o in range(0, len(self.shift_vars), self.num_slots)
+                         for k in self.slot_index[self.layout.work_mask].tolist()]
+            # number of changes = shifts newly assigned + shifts no longer assigned
+            changes = cp_model.LinearExpr.WeightedSum(work_vars, np.where(was_working, -1, 1).tolist()) + \
+                      int(was_working.sum())
+            objective = objective + change_weight * changes
+        self.model.Minimize(objective)
+        self.objective_is_symmetric = reference is None or change_weight == 0
+        self._EnableSymmetryBreaking()
+
+    def CanUpdateTo(self, parameters):
+        """Tell whether the problem can be changed into the one with the given arguments with Update."""
+        new = canonical_parameters(parameters)
+        return all(new[key] == value for key, value in self.parameters.items() if key not in UPDATABLE_PARAMETERS)
+
+    def Update(self, vacation_days=None, additional_shifts_ferial=None, additional_shifts_festive=None,
+               additional_shifts_nights=None):
+        """
+        Change the vacation days and/or the additional shifts requested to the medics, without building the model
+        again: only the vacation fixes of the medics whose vacation changed and the target counts are modified.
+        The arguments left to None are not changed.
+        """
+        changes = {"vacation_days": vacation_days, "additional_shifts_ferial": additional_shifts_ferial,
+                   "additional_shifts_festive": additional_shifts_festive,
+                   "additional_shifts_nights": additional_shifts_nights}
+        parameters = canonical_parameters(dict(self.parameters, **{k: v for k, v in changes.items() if v is not None}))
+        if parameters == self.parameters:
+            return
+        timer = self.metrics.Timer()
+        # The vacations are set first, since they can be rejected (see _SetVacations)
+        self._SetVacations(parameters["vacation_days"])
+        self.parameters = parameters
+        self.input_hash = input_hash(parameters)
+        self.additional_shifts_ferial = np.array(parameters["additional_shifts_ferial"])
+        self.additional_shifts_festive = np.array(parameters["additional_shifts_festive"])
+        self.additional_shifts_nights = np.array(parameters["additional_shifts_nights"])
+        self._SetTargets(self._DesiredShifts())
+        self._EnableSymmetryBreaking()
+        timer.End("update")
+
+    def SetHint(self, assignment):
+        """Give an assignment array (e.g. a previous schedule) to the solver as the starting point of the search."""
+        self.model.ClearHints()
+        for var, value in zip(self.shift_vars, assignment[:, self.layout.shift_mask].ravel().tolist()):
+            self.model.AddHint(var, value)
+
+    def Resolve(self, profile=None, callback=None, change_weight=0, **changes):
+        """
+        Change some inputs (see Update) and solve again, starting the search from the previous schedule.
+
+        Parameters:
+        profile (SolverProfile): Options of the search.
+        callback (cp_model.CpSolverSolutionCallback): Called by the solver on every improving solution.
+        change_weight (int): If positive, each shift assigned differently from the previous schedule costs
+            change_weight in the objective (one unit of imbalance costs 1), so that the new schedule stays close to
+            the previous one.
+        changes: Keyword arguments of Update.
+
+        Returns:
+        SolveResult: see Solve.
+        """
+        previous = self.assignment
+        self.Update(**changes)
+        if previous is not None:
+            self.SetHint(previous)
+        self._SetObjective(previous, change_weight)
+        return self.Solve(profile, callback)
+
+    def Clone(self):
+        """Return a copy of the problem with its own model, which can be updated and solved independently."""
+        clone = copy.copy(self)
+        clone.model = self.model.Clone()
+        clone.shift_vars = [clone.model.GetBoolVarFromProtoIndex(var.Index()) for var in self.shift_vars]
+        clone.aux_vars_up = {key: clone.model.GetIntVarFromProtoIndex(var.Index())
+                             for key, var in self.aux_vars_up.items()}
+        clone.aux_vars_low = {key: clone.model.GetIntVarFromProtoIndex(var.Index())
+                              for key, var in self.aux_vars_low.items()}
+        clone.sum_aux_vars = cp_model.LinearExpr.Sum([clone.aux_vars_up[key] + clone.aux_vars_low[key]
+                                                      for key in clone.aux_vars_up])
+        clone.parameters = copy.deepcopy(self.parameters)
+        clone.vacation_days = [list(days) for days in self.vacation_days]
+        clone.symmetry_literals = dict(self.symmetry_literals)
+        clone.solver = cp_model.CpSolver()
+        clone.stop_requested = False
+        clone.metrics = Metrics(self.metrics.request_id)
+        return clone
+
+    def ShiftVar(self, n, d, s):
+        """Return the boolean variable of medic n working shift s in day d (0-indexed)."""
+        return self.shift_vars[n * self.num_slots + self.slot_index[d, s]]
+
+    def Solve(self, profile=None, callback=None):
+        """
+        Solve the model with the options of a SolverProfile (default: SolverProfile()).
+
+        Parameters:
+        profile (SolverProfile): Options of the search.
+        callback (cp_model.CpSolverSolutionCallback): Called by the solver on every improving solution.
+
+        Returns:
+        SolveResult: status, objective, best bound, gap and wall time of the search.
+        """
+        if profile is None:
+            profile = SolverProfile()
+        try:
+            self.result = self._Search(profile, callback)
+            if self.result.status == cp_model.INFEASIBLE and self.limit_deviations and not self.stop_requested:
+                # The limits on the deviations excluded all the schedules: search again without them, in the time left
+                self.RelaxDeviations()
+                if profile.time_limit is not None:
+                    profile = copy.copy(profile)
+                    profile.time_limit = max(0.0, profile.time_limit - self.result.wall_time)
+                self.result = self._Search(profile, callback)
+        finally:
+            self.stop_requested = False
+        if self.result.feasible:
+            with self.metrics.Phase("extraction"):
+                self.assignment = self.ExtractAssignment()
+
+        return self.result
+
+    def _Search(self, profile, callback):
+        """Run one search with a new solver, recording it in the metrics."""
+        self.solver = profile.Apply(cp_model.CpSolver())
+        if self.stop_requested:
+            # StopSearch was called before the solver was created
+            self.solver.parameters.max_time_in_seconds = 0.0
+        watch = self.metrics.WatchSearch(self.solver)
+        result = SolveResult(self.solver, self.solver.Solve(self.model, callback))
+        self.metrics.AddSearch(self.solver, result, watch)
+        return result
+
+    def Schedule(self):
+        """Return the last schedule found by Solve, detached from the model (see Schedule)."""
+        return Schedule(self.parameters, self.result, self.assignment, self.desired_shifts, self.metrics)
+
+    def ExtractAssignment(self, solver=None):
+        """
+        Read the values of all the shift variables from the solver response at once.
+
+        Parameters:
+        solver (cp_model.CpSolver): Solver holding the solution (default: the solver used by Solve). It is given
+            when the model is shared with other problems and solved by the caller.
+
+        Returns:
+        np.ndarray: Boolean array of shape (num_medics, num_days, num_shift_ids), true where the medic works the
+            shift (including the resting "shifts"). The shifts not included in a day are false.
+        """
+        first = self.shift_vars[0].Index()  # the shift variables are created consecutively
+        solver = solver if solver is not None else self.solver
+        values = np.array(solver.ResponseProto().solution, dtype=bool)[first:first + len(self.shift_vars)]
+        assignment = np.zeros((self.num_medics,) + self.layout.shift_mask.shape, dtype=bool)
+        assignment[:, self.layout.shift_mask] = values.reshape(self.num_medics, self.num_slots)
+        return assignment
+
+    def StopSearch(self):
+        """
+        Stop a running Solve (e.g. from another thread). Solve returns with the best schedule found so far, without
+        starting the relaxed search of RelaxDeviations. If no search is running, the next Solve stops immediately.
+        """
+        self.stop_requested = True
+        self.solver.StopSearch()
+
+
+    def PrintTable(self):
+        """Return the matplotlib Figure with the weekly tables of the schedule and the statistics of the medics."""
+        return build_figure(self)
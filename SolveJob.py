@@ -0,0 +1,96 @@
+from ortools.sat.python import cp_model
+import threading
+
+
+class ProgressCallback(cp_model.CpSolverSolutionCallback):
+    """
+    Record every improving solution found by the solver (objective value, best bound, elapsed time).
+
+    CP-SAT calls on_solution_callback from its search threads, so the progress list is protected by a lock and
+    read through Progress(). on_improvement, if given, is called with the new entry of the progress list.
+    """
+    def __init__(self, on_improvement=None):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self._lock = threading.Lock()
+        self._progress = []
+        self._stop_requested = False
+        self._on_improvement = on_improvement
+
+    def on_solution_callback(self):
+        entry = {"solution": len(self._progress) + 1,
+                 "objective": self.ObjectiveValue(),
+                 "best_bound": self.BestObjectiveBound(),
+                 "wall_time": self.WallTime()}
+        with self._lock:
+            self._progress.append(entry)
+        if self._on_improvement is not None:
+            self._on_improvement(entry)
+        if self._stop_requested:
+            self.StopSearch()
+
+    def RequestStop(self):
+        """Stop the search at the next solution, if the solver has not found one yet."""
+        self._stop_requested = True
+
+    def Progress(self):
+        with self._lock:
+            return list(self._progress)
+
+
+class SolveJob:
+    """
+    Solve a ShiftsProblem in a background thread, so that the caller can show the progress of the search and
+    stop it keeping the best schedule found so far.
+    If changes (keyword arguments of ShiftsProblem.Update) are given, the problem is solved again from its previous
+    schedule with ShiftsProblem.Resolve.
+    """
+    def __init__(self, problem, profile=None, changes=None, change_weight=0):
+        self.problem = problem
+        self.profile = profile
+        self.changes = changes
+        self.change_weight = change_weight
+        self.callback = ProgressCallback()
+        self.result = None
+        self.error = None
+        self.stopped = False  # True if the search was interrupted by Stop
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._Run, daemon=True)
+
+    def Run(self):
+        """Run the job in the calling thread (e.g. a worker thread of a pool) instead of starting a new one."""
+        self._Run()
+        return self.result
+
+    def _Run(self):
+        try:
+            if self.changes is None:
+                self.result = self.problem.Solve(self.profile, callback=self.callback)
+            else:
+                self.result = self.problem.Resolve(self.profile, callback=self.callback,
+                                                   change_weight=self.change_weight, **self.changes)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    def Start(self):
+        self._thread.start()
+        return self
+
+    def Stop(self):
+        """Stop the search: the job finishes with the best schedule found so far (if any)."""
+        if self._done.is_set():
+            return  # the stop request would be left to the next search of the problem
+        self.stopped = True
+        self.callback.RequestStop()
+        self.problem.StopSearch()
+
+    def Wait(self, timeout=None):
+        """Wait for the job to finish. Returns True if the job is done."""
+        return self._done.wait(timeout)
+
+    def IsRunning(self):
+        return not self._done.is_set()
+
+    def Progress(self):
+        return self.callback.Progress()
@@ -0,0 +1,103 @@
+from ortools.sat.python import cp_model
+import json
+import os
+
+'''
+Named presets of solver options. Options passed explicitly to SolverProfile override the ones of the preset.
+"fast-feasible" returns the first schedule found, "balanced" stops within 5% of the optimum,
+"prove-optimal" searches until optimality is proven.
+'''
+PRESETS = {
+    "fast-feasible": {"time_limit": 10.0, "stop_after_first_solution": True},
+    "balanced": {"time_limit": 60.0, "relative_gap_limit": 0.05},
+    "prove-optimal": {"time_limit": None, "relative_gap_limit": 0.0},
+}
+
+
+class SolverProfile:
+    """
+    Options of the CP-SAT search used by ShiftsProblem.Solve.
+
+    Parameters:
+    time_limit (float): Wall-time limit of the search in seconds (None for no limit).
+    num_workers (int): Number of parallel search workers (default: all the available cores).
+    random_seed (int): Seed of the search, for reproducible schedules.
+    relative_gap_limit (float): Stop when (objective - bound) / objective is below this value.
+    preset (str): Name of a preset in PRESETS providing the default options.
+    """
+    def __init__(self, time_limit=None, num_workers=None, random_seed=None, relative_gap_limit=None, preset=None):
+        if preset is not None and preset not in PRESETS:
+            raise ValueError("Unknown solver preset '%s', available presets: %s" % (preset, ", ".join(PRESETS)))
+        options = dict(PRESETS[preset]) if preset is not None else {}
+        for key, value in (("time_limit", time_limit), ("relative_gap_limit", relative_gap_limit)):
+            if value is not None:
+                options[key] = value
+        self.preset = preset
+        self.time_limit = options.get("time_limit")
+        self.relative_gap_limit = options.get("relative_gap_limit")
+        self.stop_after_first_solution = options.get("stop_after_first_solution", False)
+        self.num_workers = num_workers if num_workers is not None else (os.cpu_count() or 1)
+        self.random_seed = random_seed
+
+    def Apply(self, solver):
+        """Set the options of the profile on a cp_model.CpSolver."""
+        parameters = solver.parameters
+        parameters.linearization_level = 0
+        parameters.num_workers = self.num_workers
+        # With a single worker, the default search is a plain tree search: interleaving the strategies of the
+        # parallel portfolio (including the large neighborhood searches) in the one thread finds far better schedules
+        parameters.interleave_search = self.num_workers == 1
+        if self.time_limit is not None:
+            parameters.max_time_in_seconds = self.time_limit
+        if self.random_seed is not None:
+            parameters.random_seed = self.random_seed
+        if self.relative_gap_limit is not None:
+            parameters.relative_gap_limit = self.relative_gap_limit
+        parameters.stop_after_first_solution = self.stop_after_first_solution
+        return solver
+
+    def Key(self):
+        """
+        Canonical description of the options that decide which schedule is returned (the number of workers only
+        changes how fast it is found), e.g. to tell apart the schedules of the same inputs searched with different
+        profiles. A preset and the same options given explicitly have the same key.
+        """
+        return json.dumps({"time_limit": self.time_limit, "relative_gap_limit": self.relative_gap_limit,
+                           "stop_after_first_solution": self.stop_after_first_solution,
+                           "random_seed": self.random_seed}, sort_keys=True)
+
+
+class SolveResult:
+    """Outcome of ShiftsProblem.Solve: status, objective, best bound, relative gap and wall time of the search."""
+    def __init__(self, solver, status):
+        self.status = status
+        self.status_name = solver.StatusName(status)
+        self.feasible = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+        self.wall_time = solver.WallTime()
+        if self.feasible:
+            self.objective = solver.ObjectiveValue()
+            self.best_bound = solver.BestObjectiveBound()
+            self.gap = abs(self.objective - self.best_bound) / max(1.0, abs(self.objective))
+        else:
+            self.objective = None
+            self.best_bound = None
+            self.gap = None
+
+    @classmethod
+    def FromDict(cls, data):
+        """Rebuild a result from the values of ToDict (e.g. of a stored schedule), without a solver."""
+        result = cls.__new__(cls)
+        result.status_name = data["status"]
+        result.status = getattr(cp_model, data["status"])
+        result.feasible = result.status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+        for key in ("objective", "best_bound", "gap", "wall_time"):
+            setattr(result, key, data[key])
+        return result
+
+    def ToDict(self):
+        return {"status": self.status_name, "objective": self.objective, "best_bound": self.best_bound,
+                "gap": self.gap, "wall_time": self.wall_time}
+
+    def __repr__(self):
+        return "SolveResult(status=%s, objective=%s, best_bound=%s, gap=%s, wall_time=%.3fs)" % (
+            self.status_name, self.objective, self.best_bound, self.gap, self.wall_time)
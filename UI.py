@@ -2,10 +2,14 @@ import pandas as pd
 import streamlit as st
 import calendar
 from datetime import date, datetime
-from ShiftsProblem import ShiftsProblem
-from ortools.sat.python import cp_model
-import matplotlib.pyplot as plt
-import os
+from ShiftsProblem import ShiftsProblem, input_hash, UPDATABLE_PARAMETERS
+from ScheduleCache import ScheduleCache, cache_key
+from ScheduleStore import ScheduleStore
+from SolverProfile import SolverProfile, PRESETS
+from SolveJob import SolveJob
+from Feasibility import check_capacity, explain_infeasibility
+import hashlib
+import Rendering
 
 
 def run_UI():
@@ -71,35 +75,157 @@ def run_UI():
     for medic in range(num_medics):
         additional_shifts_nights[medic] = st.number_input('Numero turni notturni supplementari richiesti al medico %d' %(medic+1),-10, 10, 0, format="%d")
 
+    st.subheader("Opzioni risolutore")
+    preset = st.selectbox('Modalità di ricerca', list(PRESETS), index=list(PRESETS).index("balanced"))
+    if PRESETS[preset]["time_limit"] is None:
+        # The preset searches until the optimum is proven: a time limit would stop it before
+        st.write("La ricerca prosegue fino a dimostrare che la soluzione è ottima, senza limite di tempo.")
+        time_limit = None
+    else:
+        time_limit = float(st.number_input('Tempo massimo di calcolo (secondi)', 1, 3600,
+                                           int(PRESETS[preset]["time_limit"]), format="%d"))
+    profile = SolverProfile(time_limit=time_limit, preset=preset)
+
+    keep_previous_schedule = st.checkbox('Modifica il meno possibile la tabella generata in precedenza', value=False)
+
     st.markdown("---")  # Horizontal line
     if st.button('Genera'):
-        problem = ShiftsProblem(month, year, num_medics,
-                                medics_preferring_full_sundays, festive_days_no_sundays, vacation_days,
-                                num_morning_shifts_ferial, num_afternoon_shifts_ferial,
-                                num_morning_shifts_saturday, num_afternoon_shifts_saturday,
-                                additional_shifts_ferial, additional_shifts_festive, additional_shifts_nights
-                                )
-        status = problem.Solve()
-        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            st.write("Soluzione trovata")
-            st.subheader("Tabella turni")
-            fig = problem.PrintTable()
-            st.pyplot(fig=fig )
-            # Save figure on the host server
-            pdf_filename = "Turni_" + list(calendar.month_name)[month] + "_" + str(year) + ".pdf"
-            plt.savefig(pdf_filename, format='pdf')
-            # Create download button
-            st.write("Soddisfattə? Usa questo pulsante per scaricare la tabella. Altrimenti, modifica pure i parametri inseriti e genera una nuova tabella.")
-            with open(pdf_filename, "rb") as f:
-                st.download_button(
-                    label="Scarica PDF",
-                    data=f,
-                    file_name=pdf_filename,
-                    mime="application/pdf"
-                )
-            # Delete PDF from host
-            os.remove(pdf_filename)
-
-        else:
-            st.write('Nessuna soluzione trovata')
+        parameters = dict(month=month, year=year, num_medics=num_medics,
+                          medics_preferring_full_sundays=medics_preferring_full_sundays,
+                          festive_days_no_sundays=festive_days_no_sundays, vacation_days=vacation_days,
+                          num_morning_shifts_ferial=num_morning_shifts_ferial,
+                          num_afternoon_shifts_ferial=num_afternoon_shifts_ferial,
+                          num_morning_shifts_saturday=num_morning_shifts_saturday,
+                          num_afternoon_shifts_saturday=num_afternoon_shifts_saturday,
+                          additional_shifts_ferial=additional_shifts_ferial,
+                          additional_shifts_festive=additional_shifts_festive,
+                          additional_shifts_nights=additional_shifts_nights)
+        # Days that cannot be covered are reported at once, without building and solving the model
+        issues = check_capacity(parameters)
+        if issues:
+            st.session_state.pop("solve_job", None)
+            st.error("Non è possibile coprire tutti i turni nei giorni seguenti:\n\n" + "\n".join(
+                "- giorno %d: %d turni da coprire, ma i medici disponibili possono coprirne al massimo %d "
+                "(%d medici in ferie, %d a riposo dopo un turno di notte)" %
+                (issue["day"], issue["required"], issue["available"], issue["on_vacation"], issue["resting"])
+                for issue in issues))
+            return
+        # Schedules already generated with the same inputs and solver options are reused without solving again. With
+        # other options, the search starts from the previous schedule (see below)
+        job = schedule_cache().Get(cache_key(input_hash(parameters), profile))
+        previous = st.session_state.get("solve_job")
+        if job is None and previous is not None and not previous.IsRunning() and previous.result is not None and \
+                previous.result.feasible and previous.problem.CanUpdateTo(parameters):
+            # Only vacations and/or additional shifts changed: update a copy of the previous model (the previous
+            # one may be shared through the cache) and start the search from the previous schedule
+            changes = {key: parameters[key] for key in UPDATABLE_PARAMETERS}
+            job = SolveJob(previous.problem.Clone(), profile, changes=changes,
+                           change_weight=1 if keep_previous_schedule else 0).Start()
+        elif job is None:
+            # The search runs in a background thread, which survives the reruns triggered by the widgets. It starts
+            # from the last schedule generated for the month, if any
+            problem = ShiftsProblem(**parameters)
+            hint = schedule_store().Hint(problem)
+            if hint is not None:
+                problem.SetHint(hint)
+            job = SolveJob(problem, profile).Start()
+        st.session_state["solve_job"] = job
+    job = st.session_state.get("solve_job")
+    if job is None:
+        return
+    progress_placeholder = st.empty()
+    if job.IsRunning():
+        if st.button('Interrompi e mantieni la soluzione migliore'):
+            job.Stop()
+        while not job.Wait(0.5):
+            show_progress(progress_placeholder, job.Progress())
+    show_progress(progress_placeholder, job.Progress())
+    if job.error is not None:
+        raise job.error
+    problem, result = job.problem, job.result
+    if result.feasible and not job.stopped:
+        schedule_cache().Put(cache_key(problem.input_hash, job.profile), job)
+        if schedule_store().Load(problem.input_hash, job.profile) is None:
+            schedule_store().Save(problem, profile=job.profile)
+    if result.feasible:
+        st.write("Soluzione trovata in %.1f secondi (scarto dall'ottimo: %.0f%%)" % (result.wall_time, 100 * result.gap))
+        st.subheader("Tabella turni")
+        preview, pdf = render_schedule(schedule_key(problem), problem.Schedule())
+        st.markdown(preview, unsafe_allow_html=True)
+        pdf_filename = "Turni_" + list(calendar.month_name)[problem.month] + "_" + str(problem.year) + ".pdf"
+        # Create download button
+        st.write("Soddisfattə? Usa questo pulsante per scaricare la tabella. Altrimenti, modifica pure i parametri inseriti e genera una nuova tabella.")
+        st.download_button(
+            label="Scarica PDF",
+            data=pdf,
+            file_name=pdf_filename,
+            mime="application/pdf"
+        )
+
+    else:
+        st.write('Nessuna soluzione trovata')
+        if result.status_name == "INFEASIBLE":
+            # Only a model proved infeasible has conflicting inputs to explain (the explanation is a search too)
+            show_conflicts(explain(problem.input_hash, problem))
+        elif not job.stopped:
+            st.write("Nessuna soluzione trovata nel tempo concesso: aumentare il tempo massimo di calcolo.")
+
+
+@st.cache_resource
+def schedule_cache():
+    """Cache of the solved schedules, shared by all the sessions of the server."""
+    return ScheduleCache(max_entries=32)
+
+
+@st.cache_resource
+def schedule_store():
+    """Schedules generated by all the sessions, kept across the restarts of the server (see ScheduleStore)."""
+    return ScheduleStore("schedules.db")
+
+
+def schedule_key(problem):
+    """Identify a schedule by the inputs of the problem and the assignment found (a stopped search may differ)."""
+    return problem.input_hash + hashlib.sha256(problem.assignment.tobytes()).hexdigest()
+
+
+@st.cache_data(max_entries=32)
+def render_schedule(key, _schedule):
+    """HTML preview and PDF of a schedule, rendered in memory once per schedule (identified by key)."""
+    return Rendering.render_html(_schedule), Rendering.render_pdf(_schedule)
+
+
+@st.cache_data(max_entries=32)
+def explain(key, _problem):
+    """Minimal set of conflicting inputs of a problem without solution (identified by key), see Feasibility."""
+    return explain_infeasibility(_problem)
+
+
+def show_conflicts(conflicts):
+    """Tell which inputs cannot be satisfied together (see explain_infeasibility)."""
+    if conflicts is None:
+        return
+    if not conflicts:
+        st.write("Una soluzione esiste, ma non è stata trovata nel tempo concesso: aumentare il tempo massimo di calcolo.")
+        return
+    descriptions = {"vacation": "ferie del medico %(medic)d", "staffing": "copertura dei turni del giorno %(day)d",
+                    "carry_over": "turni di notte a cavallo con il mese precedente"}
+    lines = []
+    for conflict in conflicts:
+        conflict = dict(conflict)
+        if "medic" in conflict:
+            conflict["medic"] += 1
+        lines.append("- " + descriptions[conflict["kind"]] % conflict)
+    st.error("Le seguenti richieste non possono essere soddisfatte insieme (rinunciando a una qualsiasi di esse, "
+             "le altre diventano compatibili):\n\n" + "\n".join(lines))
+
 
+def show_progress(placeholder, progress):
+    """Show the improving solutions found so far by the solver (objective value, bound and elapsed time)."""
+    if not progress:
+        placeholder.write("Ricerca della prima soluzione in corso...")
+        return
+    last = progress[-1]
+    with placeholder.container():
+        st.write("Soluzione %d dopo %.1f secondi: squilibrio %d (limite inferiore %d)" %
+                 (last["solution"], last["wall_time"], last["objective"], last["best_bound"]))
+        st.line_chart(pd.DataFrame(progress), x="wall_time", y=["objective", "best_bound"])
@@ -0,0 +1,46 @@
+import numpy as np
+
+'''
+Invariants of a solved schedule, checked on the assignment array alone (independently of the CP-SAT model).
+'''
+
+
+def violations(schedule, previous=None):
+    """
+    List the broken rules of a Schedule (or solved ShiftsProblem), as readable strings:
+    every work shift covered by exactly one medic, no work in the vacation days, at most one shift per day (the two
+    day shifts of a festive day for the medics preferring full sundays), no work in the two days after a night shift,
+    including the first days after the nights of the previous month if its schedule is given.
+    """
+    layout = schedule.layout
+    parameters = schedule.parameters
+    assignment = schedule.assignment
+    worked = assignment & layout.work_mask
+    found = []
+    coverage = worked.sum(axis=0)
+    for d, s in zip(*np.nonzero(layout.work_mask & (coverage != 1))):
+        found.append("day %d shift %d covered by %d medics" % (d + 1, s, coverage[d, s]))
+    full_sundays = set(parameters["medics_preferring_full_sundays"])
+    day_shifts = [0, layout.num_morning_shifts_ferial]  # the day shifts of a festive day
+    for n in range(assignment.shape[0]):
+        for day in parameters["vacation_days"][n]:
+            if worked[n, day - 1].any():
+                found.append("medic %d works in vacation on day %d" % (n, day))
+        for d in range(layout.num_days):
+            shifts = np.flatnonzero(worked[n, d]).tolist()
+            if len(shifts) > 1 and not (n in full_sundays and layout.is_festive[d] and shifts == day_shifts):
+                found.append("medic %d works shifts %s on day %d" % (n, shifts, d + 1))
+        nights = np.flatnonzero(worked[n, :, layout.night_shift]).tolist()
+        for d in nights:
+            for e in (d + 1, d + 2):
+                if e < layout.num_days and worked[n, e].any():
+                    found.append("medic %d works on day %d after the night of day %d" % (n, e + 1, d + 1))
+        if previous is not None:
+            previous_days = previous.layout.num_days
+            # d = 0: night of the second-to-last day, resting on the first day; d = 1: last night, first two days
+            for d in np.flatnonzero(previous.assignment[n, -2:, previous.layout.night_shift]).tolist():
+                for e in range(d + 1):
+                    if worked[n, e].any():
+                        found.append("medic %d works on day %d after the night of day %d of the previous month" %
+                                     (n, e + 1, previous_days - 1 + d))
+    return found
@@ -0,0 +1,39 @@
+from Benchmark import DEFAULT_BASELINE, SMALL_MEDICS_LADDER, SMALL_MONTHS_LADDER, compare, generate_horizon, \
+    generate_instance
+from Feasibility import check_capacity
+import json
+import os
+
+BASELINE = {"cases": [{"case": "10 medics x 1 months", "build_time": 0.02, "first_solution_time": 0.2,
+                       "optimal_time": 1.5, "render_time": 0.5, "peak_memory_mb": 200.0}]}
+
+
+def test_instances_are_reproducible():
+    assert generate_instance(12, 4, 2025, seed=3) == generate_instance(12, 4, 2025, seed=3)
+    assert generate_instance(12, 4, 2025, seed=3) != generate_instance(12, 4, 2025, seed=4)
+    months = generate_horizon(12, 3, start_month=11, start_year=2024, seed=3)
+    assert [(p["month"], p["year"]) for p in months] == [(11, 2024), (12, 2024), (1, 2025)]
+    assert months[2] == generate_instance(12, 1, 2025, seed=3)
+    assert all(check_capacity(parameters) == [] for parameters in months)
+
+
+def test_compare_flags_the_regressions_only():
+    case = dict(BASELINE["cases"][0])
+    assert compare({"cases": [case]}, BASELINE) == []
+    # Growths within the tolerance or within the noise of the metric are not regressions
+    case.update(optimal_time=1.8, build_time=0.06)
+    assert compare({"cases": [case]}, BASELINE) == []
+    case.update(optimal_time=2.0, peak_memory_mb=300.0)
+    assert [(r["metric"], r["baseline"], r["value"]) for r in compare({"cases": [case]}, BASELINE)] == \
+        [("optimal_time", 1.5, 2.0), ("peak_memory_mb", 200.0, 300.0)]
+    # A case no longer solved to optimality regresses; the cases missing from the baseline are not compared
+    lost = dict(BASELINE["cases"][0], optimal_time=None)
+    assert compare({"cases": [lost, dict(lost, case="20 medics x 1 months")]}, BASELINE) == \
+        [{"case": "10 medics x 1 months", "metric": "optimal_time", "baseline": 1.5, "value": None}]
+
+
+def test_baseline_covers_the_small_ladder():
+    with open(os.path.join(os.path.dirname(__file__), "..", DEFAULT_BASELINE)) as f:
+        baseline = json.load(f)
+    assert sorted((case["num_medics"], case["num_months"]) for case in baseline["cases"]) == \
+        sorted((medics, months) for medics in SMALL_MEDICS_LADDER for months in SMALL_MONTHS_LADDER)
@@ -0,0 +1,50 @@
+from Benchmark import generate_instance
+from Export import FIELDS, write_csv, write_icalendars, write_json
+from ShiftsProblem import ShiftsProblem
+from SolverProfile import SolverProfile
+import csv
+import io
+import json
+import os
+import pytest
+
+
+@pytest.fixture(scope="module")
+def schedule():
+    problem = ShiftsProblem(**generate_instance(8, 2, 2025, seed=1))
+    problem.Solve(SolverProfile(preset="fast-feasible", num_workers=1, random_seed=0))
+    return problem.Schedule()
+
+
+def test_csv_and_json_list_every_work_shift(schedule):
+    f = io.StringIO()
+    count = write_csv([("A", schedule)], f)
+    rows = list(csv.DictReader(io.StringIO(f.getvalue())))
+    assert tuple(rows[0]) == FIELDS
+    assert count == len(rows) == schedule.layout.work_mask.sum()
+    f = io.StringIO()
+    assert write_json([("A", schedule)], f) == count
+    records = json.loads(f.getvalue())
+    assert [str(record[field]) for record in records for field in FIELDS] == \
+        [row[field] for row in rows for field in FIELDS]
+    night = schedule.layout.night_shift
+    assert sum(record["kind"] == "night" for record in records) == schedule.layout.num_days
+    assert {record["shift"] for record in records if record["kind"] == "night"} == {night}
+    assert records[0]["ward"] == "A" and records[0]["date"] == "2025-02-01"
+
+
+def test_calendars_have_one_file_per_medic(schedule, tmp_path):
+    # "A/B" and "A B" give the same file name, and only differ in case from "a b"
+    names = {("A", 0): "A/B", ("A", 1): "A B", ("A", 2): "a b"}
+    paths = write_icalendars([("A", schedule)], str(tmp_path), names)
+    assert len(paths) == 8 and len(set(paths.values())) == 8
+    # The suffixes follow the order of the first shift of each medic
+    filenames = sorted(os.path.basename(paths[name]).lower() for name in ("A/B", "A B", "a b"))
+    assert filenames == ["a_b.ics", "a_b_2.ics", "a_b_3.ics"]
+    worked = (schedule.assignment & schedule.layout.work_mask).sum(axis=(1, 2))
+    for n, name in enumerate(["A/B", "A B", "a b"]):
+        with open(paths[name], newline="") as f:
+            text = f.read()
+        assert text.startswith("BEGIN:VCALENDAR\r\n") and text.endswith("END:VCALENDAR\r\n")
+        assert text.count("BEGIN:VEVENT") == worked[n]
+        assert "X-WR-CALNAME:" + name in text
@@ -0,0 +1,37 @@
+from Feasibility import check_capacity
+from ShiftsProblem import ShiftsProblem, complete_parameters
+from SolverProfile import SolverProfile
+import random
+import pytest
+
+
+def small_instance(seed):
+    """A month with 7 medics and one medic per day shift, with random vacations (often in the last days)."""
+    rng = random.Random(seed)
+    parameters = complete_parameters(dict(month=rng.choice([2, 4, 5]), year=2025, num_medics=7,
+                                          num_morning_shifts_ferial=1, num_afternoon_shifts_ferial=1,
+                                          num_morning_shifts_saturday=1, num_afternoon_shifts_saturday=1,
+                                          medics_preferring_full_sundays=rng.sample(range(7), rng.randint(0, 2))))
+    parameters["vacation_days"] = [sorted(set(rng.sample(range(1, 29), rng.randint(0, 4))) |
+                                          ({27, 28} if rng.random() < 0.3 else set())) for _ in range(7)]
+    return parameters
+
+
+@pytest.mark.parametrize("seed", [13, 15, 28, 32, 44, 49])
+def test_reported_days_cannot_be_covered(seed):
+    parameters = small_instance(seed)
+    assert check_capacity(parameters)
+    result = ShiftsProblem(**parameters).Solve(SolverProfile(time_limit=10, num_workers=1))
+    assert result.status_name == "INFEASIBLE"
+
+
+def test_full_sunday_medics_cover_the_two_day_shifts():
+    parameters = complete_parameters(dict(month=6, year=2025, num_medics=6, medics_preferring_full_sundays=[0],
+                                          num_morning_shifts_ferial=1, num_afternoon_shifts_ferial=1,
+                                          num_morning_shifts_saturday=1, num_afternoon_shifts_saturday=1))
+    # Sunday 1 June 2025: morning, afternoon and night. The full-sunday medic works the two day shifts, not the night
+    parameters["vacation_days"] = [[], [], [1], [1], [1], [1]]
+    assert check_capacity(parameters) == []
+    assert [issue["day"] for issue in check_capacity(dict(parameters, medics_preferring_full_sundays=[]))] == [1]
+    parameters["vacation_days"] = [[], [1], [1], [1], [1], [1]]
+    assert [issue["day"] for issue in check_capacity(parameters)] == [1]
@@ -0,0 +1,91 @@
+from Benchmark import generate_instance
+from Headless import JobQueue, ServiceHandler, ServiceJob, parse_request
+from http.server import ThreadingHTTPServer
+from SolverProfile import SolverProfile
+import http.client
+import json
+import pytest
+import threading
+import time
+
+REQUEST = {"month": 2, "year": 2025, "num_medics": 8, "num_morning_shifts_ferial": 2,
+           "num_afternoon_shifts_ferial": 1, "num_morning_shifts_saturday": 1, "num_afternoon_shifts_saturday": 1}
+
+
+def test_command_line_options_keep_the_rest_of_the_profile():
+    request = dict(REQUEST, profile={"relative_gap_limit": 0.01, "num_workers": 1, "random_seed": 3})
+    parameters, profile = parse_request(request, {"preset": "fast-feasible"})
+    assert parameters["vacation_days"] == [[]] * 8
+    assert (profile.relative_gap_limit, profile.num_workers, profile.random_seed) == (0.01, 1, 3)
+    assert (profile.time_limit, profile.stop_after_first_solution) == (10.0, True)
+    _, profile = parse_request(request, {"time_limit": 5.0})
+    assert (profile.time_limit, profile.relative_gap_limit, profile.random_seed) == (5.0, 0.01, 3)
+
+
+@pytest.mark.parametrize("request_, message", [
+    (dict(REQUEST, num_nurses=3), "unknown arguments: num_nurses"),
+    (dict(REQUEST, profile={"workers": 2}), "unknown arguments: profile.workers"),
+    (dict(REQUEST, model=None), "unknown arguments: model"),
+    ({key: value for key, value in REQUEST.items() if key != "year"}, "missing arguments: year"),
+    (dict(REQUEST, vacation_days=[[]] * 7), "vacation_days has 7 values for 8 medics"),
+    (dict(REQUEST, additional_shifts_nights=[0] * 9), "additional_shifts_nights has 9 values for 8 medics"),
+    (dict(REQUEST, medics_preferring_full_sundays=[8]), "medics_preferring_full_sundays"),
+])
+def test_invalid_requests_are_rejected(request_, message):
+    with pytest.raises(ValueError, match=message):
+        parse_request(request_)
+
+
+@pytest.fixture
+def service():
+    ServiceHandler.jobs = JobQueue(num_workers=1, queue_size=2)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ServiceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+def call(address, method, path, body=None):
+    connection = http.client.HTTPConnection(*address)
+    connection.request(method, path, json.dumps(body) if body is not None else None)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+@pytest.mark.parametrize("request_, message", [
+    (dict(REQUEST, num_nurses=3), "num_nurses"),
+    (dict(REQUEST, additional_shifts_ferial=[0] * 5), "additional_shifts_ferial has 5 values for 8 medics"),
+])
+def test_invalid_requests_are_answered_400_at_submit(service, request_, message):
+    status, body = call(service, "POST", "/jobs", request_)
+    assert status == 400
+    assert message in body["error"]
+
+
+def test_job_cancelled_in_the_queue_has_no_result(service):
+    # The only worker is busy with a long search, so the second job waits in the queue
+    long_request = dict(generate_instance(30, 3, 2025, seed=0), profile={"time_limit": 60.0, "num_workers": 1})
+    _, running = call(service, "POST", "/jobs", long_request)
+    _, queued = call(service, "POST", "/jobs", dict(REQUEST, profile={"preset": "fast-feasible"}))
+    assert call(service, "DELETE", "/jobs/" + queued["id"])[1]["status"] == "cancelled"
+    deadline = time.perf_counter() + 10
+    while "solutions_found" not in call(service, "GET", "/jobs/" + running["id"])[1]:
+        assert time.perf_counter() < deadline
+        time.sleep(0.1)
+    call(service, "DELETE", "/jobs/" + running["id"])
+    status, body = call(service, "GET", "/jobs/%s/result" % queued["id"])
+    assert status == 410 and body["status"] == "cancelled"
+    # The running search stops with the best schedule found so far
+    deadline = time.perf_counter() + 10
+    while call(service, "GET", "/jobs/%s/result" % running["id"])[0] == 409 and time.perf_counter() < deadline:
+        time.sleep(0.1)
+    assert call(service, "GET", "/jobs/%s/result" % running["id"])[0] == 200
+
+
+def test_finished_jobs_are_dropped_without_new_submissions():
+    jobs = JobQueue(num_workers=1, queue_size=4, max_finished_jobs=1)
+    parameters, profile = parse_request(REQUEST, {"preset": "fast-feasible", "num_workers": 1})
+    submitted = [jobs.Submit(ServiceJob(parameters, profile)) for _ in range(3)]
+    jobs._queue.join()
+    assert [jobs.Get(job.id) is not None for job in submitted] == [False, False, True]
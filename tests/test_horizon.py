@@ -0,0 +1,28 @@
+from Benchmark import staffing
+from HorizonScheduler import HorizonScheduler
+from schedule_checks import violations
+from SolverProfile import SolverProfile
+import pytest
+
+
+def horizon(mode):
+    base = dict(staffing(12), num_medics=12, medics_preferring_full_sundays=[1], additional_shifts_ferial=[0] * 12,
+                additional_shifts_festive=[0] * 12, additional_shifts_nights=[0] * 12)
+    # January to March 2024: a 31-day month, a leap February and the boundaries between them
+    return HorizonScheduler.FromBase(base, 1, 2024, 3, mode=mode,
+                                     profile=SolverProfile(preset="fast-feasible", num_workers=1, random_seed=0))
+
+
+@pytest.mark.parametrize("mode", ["sequential", "parallel", "single"])
+def test_rest_after_nights_across_month_boundaries(mode):
+    schedules = horizon(mode).Solve()
+    assert [schedule.result.feasible for schedule in schedules] == [True] * 3
+    for k, schedule in enumerate(schedules):
+        assert violations(schedule, schedules[k - 1] if k else None) == []
+
+
+def test_no_medic_works_the_last_two_nights():
+    schedules = horizon("sequential").Solve()
+    for schedule in schedules[:-1]:
+        second_to_last_night, last_night = schedule.CarryOver()["previous_nights"]
+        assert second_to_last_night != last_night
@@ -0,0 +1,71 @@
+from Benchmark import generate_instance
+from HospitalScheduler import HospitalScheduler
+from schedule_checks import violations
+from ShiftsProblem import empty_carry_over
+from SolverProfile import SolverProfile
+from types import SimpleNamespace
+import copy
+
+PROFILE = SolverProfile(preset="fast-feasible", num_workers=1, random_seed=0)
+
+
+def hospital():
+    """Two wards in April 2025 sharing their medic 0, who worked the last night of March in ward A."""
+    wards = {"A": generate_instance(9, 4, 2025, seed=1), "B": generate_instance(10, 4, 2025, seed=2)}
+    for parameters in wards.values():
+        parameters["vacation_days"][0] = []
+    carry_over = empty_carry_over(9)
+    carry_over["previous_nights"] = [2, 0]
+    carry_over["final_nights"] = [5, 6]
+    wards["A"]["carry_over"] = carry_over
+    return wards, [{"wards": {"A": 0, "B": 0}}]
+
+
+def test_reassign_keeps_the_rules_across_the_wards():
+    wards, shared_medics = hospital()
+    scheduler = HospitalScheduler(wards, shared_medics, PROFILE, max_workers=2, coordination_time_limit=5)
+    schedules = scheduler.Solve()
+    assert scheduler.reassigned and scheduler.infeasible_wards == []
+    assert scheduler.Conflicts(schedules) == []
+    for name, schedule in schedules.items():
+        # The days given to the other ward are not vacations of the shared medic after the reassignment
+        checked = SimpleNamespace(layout=schedule.layout, assignment=schedule.assignment,
+                                  parameters=dict(schedule.parameters, vacation_days=wards[name]["vacation_days"]))
+        assert violations(checked) == []
+    # The rest after the last night of March binds the shared medic in ward B too
+    layout = schedules["B"].layout
+    assert not (schedules["B"].assignment[0, :2] & layout.work_mask[:2]).any()
+    nights = schedules["A"].Roster()[-2:, schedules["A"].layout.night_shift].tolist()
+    assert nights == [5, 6]
+    # The results describe the reassigned schedules, not the searches of the wards
+    for schedule in schedules.values():
+        assert schedule.result.status_name == "FEASIBLE" and schedule.result.best_bound is None
+        assert schedule.result.objective == abs(schedule.Deviations()).sum()
+
+
+def test_free_rests_of_the_first_days_are_not_conflicts():
+    wards, shared_medics = hospital()
+    del wards["A"]["carry_over"]
+    scheduler = HospitalScheduler(wards, shared_medics, PROFILE, coordination="split", max_workers=2)
+    schedules = {name: copy.copy(schedule) for name, schedule in scheduler.Solve().items()}
+    a, b = schedules["A"].assignment.copy(), schedules["B"].assignment.copy()
+    layout_a, layout_b = schedules["A"].layout, schedules["B"].layout
+    # The shared medic works the first two days in ward A only, and has the rest "shifts" of those days in ward B,
+    # which no night forces (the model leaves them free without a carry-over)
+    assert layout_a.work_mask[:2, 0].all()
+    a[0, :2] = False
+    a[0, :2, 0] = True
+    b[0, :2] = False
+    b[0, 0, [layout_b.first_rest_shift, layout_b.second_rest_shift]] = True
+    b[0, 1, layout_b.second_rest_shift] = True
+    schedules["A"].assignment, schedules["B"].assignment = a, b
+    assert [c for c in scheduler.Conflicts(schedules) if c["day"] <= 2] == []
+
+
+def test_wards_without_schedule_are_reported():
+    wards, shared_medics = hospital()
+    wards["B"]["vacation_days"] = [[5] for _ in range(10)]
+    scheduler = HospitalScheduler(wards, shared_medics, PROFILE, max_workers=2, coordination_time_limit=5)
+    scheduler.Solve()
+    assert scheduler.infeasible_wards == ["B"]
+    assert not scheduler.reassigned
@@ -0,0 +1,20 @@
+from Benchmark import generate_instance
+from ShiftsProblem import ShiftsProblem
+from SolverProfile import SolverProfile
+import json
+import logging
+
+PROFILE = SolverProfile(preset="fast-feasible", num_workers=1, random_seed=0)
+
+
+def test_search_log_is_only_written_with_logging(caplog):
+    problem = ShiftsProblem(**generate_instance(8, 2, 2025, seed=1))
+    problem.Solve(PROFILE)
+    assert not problem.solver.parameters.log_search_progress
+    assert "presolve" not in problem.metrics.PhaseTimes() and "search" in problem.metrics.PhaseTimes()
+    caplog.set_level(logging.INFO, logger="shifts_scheduler")
+    problem.Solve(PROFILE)
+    assert problem.solver.parameters.log_search_progress
+    assert "presolve" in problem.metrics.PhaseTimes()
+    events = [json.loads(record.getMessage())["event"] for record in caplog.records]
+    assert "search" in events
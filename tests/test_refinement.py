@@ -0,0 +1,40 @@
+from Benchmark import generate_instance
+from Refinement import Refinement, total_deviation
+from schedule_checks import violations
+from ShiftsProblem import ShiftsProblem
+from SolverProfile import SolverProfile
+import threading
+import time
+
+FAST = SolverProfile(preset="fast-feasible", num_workers=1, random_seed=0)
+
+
+def solved_problem():
+    problem = ShiftsProblem(**generate_instance(12, 3, 2025, seed=2))
+    assert problem.Solve(FAST).feasible
+    return problem
+
+
+def test_refinement_does_not_worsen_the_schedule():
+    problem = solved_problem()
+    initial = total_deviation(problem, problem.assignment)
+    result = Refinement(problem, time_limit=5, max_workers=2, subproblem_time_limit=1, seed=0).Run()
+    assert result.feasible
+    assert result.objective == total_deviation(problem, problem.assignment) <= initial
+    assert violations(problem) == []
+
+
+def test_stop_returns_the_best_schedule():
+    problem = solved_problem()
+    refinement = Refinement(problem, time_limit=60, max_workers=2, subproblem_time_limit=5, seed=0)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(refinement.Run()))
+    thread.start()
+    time.sleep(1)
+    start = time.perf_counter()
+    refinement.Stop()
+    thread.join(10)
+    assert not thread.is_alive() and time.perf_counter() - start < 10
+    best = min(entry["objective"] for entry in refinement.Progress())
+    assert results[0].objective == total_deviation(problem, problem.assignment) == best
+    assert violations(problem) == []
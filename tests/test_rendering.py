@@ -0,0 +1,30 @@
+from Benchmark import generate_instance
+from datetime import date
+from Rendering import render_html, render_pdf, render_png
+from ShiftsProblem import ShiftsProblem
+from SolverProfile import SolverProfile
+import calendar
+import pytest
+
+
+@pytest.fixture(scope="module")
+def schedule():
+    problem = ShiftsProblem(**generate_instance(8, 2, 2025, seed=1))
+    assert problem.Solve(SolverProfile(preset="fast-feasible", num_workers=1, random_seed=0)).feasible
+    return problem.Schedule()
+
+
+def test_pdf_and_png(schedule):
+    assert render_pdf(schedule).startswith(b"%PDF-")
+    assert render_png(schedule).startswith(b"\x89PNG\r\n\x1a\n")
+    assert schedule.metrics.PhaseTimes()["rendering"] > 0
+
+
+def test_html_has_every_medic_and_day(schedule):
+    text = render_html(schedule)
+    for n in range(schedule.parameters["num_medics"]):
+        assert "<th>Medico %d</th>" % (n + 1) in text
+        assert "<td>%d</td>" % (n + 1) in text  # every medic works some shifts
+    for day in range(1, 29):
+        assert "<th>%s %d</th>" % (calendar.day_name[date(2025, 2, day).weekday()][:3], day) in text
+    assert " 29</th>" not in text
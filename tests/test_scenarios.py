@@ -0,0 +1,51 @@
+from Scenarios import expand_scenarios, write_results
+import pandas as pd
+import pytest
+
+BASE = {"month": 2, "year": 2025, "num_medics": 8, "num_morning_shifts_ferial": 2, "num_afternoon_shifts_ferial": 1,
+        "num_morning_shifts_saturday": 1, "num_afternoon_shifts_saturday": 1,
+        "vacation_days": [[], [], [], [], [], [], [], [3, 4]], "additional_shifts_ferial": [1, 0, 0, 0, 0, 0, 0, -1]}
+
+
+def test_per_medic_lists_follow_the_number_of_medics():
+    scenarios = expand_scenarios({"base": BASE, "grid": {"num_medics": [7, 8, 10]},
+                                  "scenarios": [{"name": "ferie", "vacation_days": {"6": [10]}}]})
+    for (name, parameters, _), num_medics in zip(scenarios, (7, 8, 10)):
+        assert name == "ferie [num_medics=%d]" % num_medics
+        for key in ("vacation_days", "additional_shifts_ferial", "additional_shifts_festive",
+                    "additional_shifts_nights"):
+            assert len(parameters[key]) == num_medics
+        assert parameters["vacation_days"][6] == [10]
+        assert parameters["additional_shifts_ferial"][0] == 1
+    assert scenarios[0][1]["additional_shifts_ferial"] == [1, 0, 0, 0, 0, 0, 0]
+    assert scenarios[2][1]["vacation_days"][7:] == [[3, 4], [], []]
+    # The base is not changed by the scenarios
+    assert BASE["vacation_days"][6] == []
+
+
+@pytest.mark.parametrize("scenario", [
+    {"num_medics": 9, "additional_shifts_nights": [0] * 8},
+    {"num_medics": 7, "vacation_days": {"7": [1]}},
+    {"num_medics": 7, "medics_preferring_full_sundays": [7]},
+])
+def test_per_medic_arguments_must_match_the_medics(scenario):
+    with pytest.raises(ValueError):
+        expand_scenarios({"base": BASE, "scenarios": [scenario]})
+
+
+def test_results_are_written_as_csv_or_parquet(tmp_path):
+    results = pd.DataFrame([{"scenario": "base", "status": "OPTIMAL", "objective": 3.0}])
+    write_results(results, str(tmp_path / "results.csv"))
+    assert pd.read_csv(tmp_path / "results.csv").equals(results)
+    pytest.importorskip("pyarrow")
+    write_results(results, str(tmp_path / "results.parquet"))
+    assert pd.read_parquet(tmp_path / "results.parquet").equals(results)
+
+
+def test_unnamed_scenarios_are_numbered_by_their_position():
+    scenarios = expand_scenarios({"base": BASE, "grid": {"num_morning_shifts_saturday": [1, 2]},
+                                  "scenarios": [{}, {"name": "ferie"}, {"num_afternoon_shifts_ferial": 2}]})
+    assert [name for name, _, _ in scenarios] == [
+        "scenario 1 [num_morning_shifts_saturday=1]", "scenario 1 [num_morning_shifts_saturday=2]",
+        "ferie [num_morning_shifts_saturday=1]", "ferie [num_morning_shifts_saturday=2]",
+        "scenario 3 [num_morning_shifts_saturday=1]", "scenario 3 [num_morning_shifts_saturday=2]"]
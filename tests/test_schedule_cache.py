@@ -0,0 +1,34 @@
+from ScheduleCache import ScheduleCache, cache_key
+from SolverProfile import SolverProfile
+
+
+def test_cache_key_depends_on_the_profile():
+    keys = {cache_key("abc", profile) for profile in (SolverProfile(preset="fast-feasible"),
+                                                      SolverProfile(preset="balanced"),
+                                                      SolverProfile(preset="balanced", time_limit=5),
+                                                      SolverProfile(preset="prove-optimal"),
+                                                      SolverProfile(preset="balanced", random_seed=1))}
+    assert len(keys) == 5
+
+
+def test_cache_key_ignores_how_the_profile_is_given():
+    assert cache_key("abc", SolverProfile(preset="balanced", num_workers=1)) == \
+        cache_key("abc", SolverProfile(time_limit=60.0, relative_gap_limit=0.05, num_workers=8))
+    assert cache_key("abc", SolverProfile()) != cache_key("abd", SolverProfile())
+
+
+def test_fast_result_is_not_served_to_a_stronger_profile():
+    cache = ScheduleCache(max_entries=2)
+    cache.Put(cache_key("abc", SolverProfile(preset="fast-feasible")), "fast schedule")
+    assert cache.Get(cache_key("abc", SolverProfile(preset="prove-optimal"))) is None
+    assert cache.Get(cache_key("abc", SolverProfile(preset="fast-feasible"))) == "fast schedule"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ScheduleCache(max_entries=2)
+    cache.Put("a", 1)
+    cache.Put("b", 2)
+    cache.Get("a")
+    cache.Put("c", 3)
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert (cache.hits, cache.misses) == (1, 0)
@@ -0,0 +1,73 @@
+from Benchmark import generate_instance
+from concurrent.futures import ThreadPoolExecutor
+from ScheduleStore import SCHEMA, ScheduleStore
+from ShiftsProblem import ShiftsProblem
+from SolverProfile import SolverProfile
+import copy
+import numpy as np
+import pytest
+import sqlite3
+
+FAST = SolverProfile(preset="fast-feasible", num_workers=1, random_seed=0)
+
+
+@pytest.fixture(scope="module")
+def problem():
+    problem = ShiftsProblem(**generate_instance(8, 2, 2025, seed=1))
+    problem.Solve(FAST)
+    assert problem.result.feasible
+    return problem
+
+
+def test_reload_gives_the_same_schedule(problem, tmp_path):
+    store = ScheduleStore(str(tmp_path / "schedules.db"))
+    assert store.Save(problem, profile=FAST) == 1
+    schedule = store.Load(problem.input_hash)
+    assert np.array_equal(schedule.assignment, problem.assignment)
+    assert np.array_equal(schedule.desired_shifts, problem.desired_shifts)
+    assert schedule.result.status_name == problem.result.status_name
+    assert store.Load(problem.parameters) is not None
+
+
+def test_concurrent_saves_get_distinct_versions(problem, tmp_path):
+    store = ScheduleStore(str(tmp_path / "schedules.db"))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        versions = list(executor.map(lambda _: store.Save(problem, include_model=False), range(16)))
+    assert sorted(versions) == list(range(1, 17))
+    assert [v["version"] for v in store.Versions(problem.year, problem.month)] == list(range(1, 17))
+
+
+def test_weaker_profile_is_not_reused(problem, tmp_path):
+    store = ScheduleStore(str(tmp_path / "schedules.db"))
+    store.Save(problem, include_model=False, profile=FAST)
+    assert store.Load(problem.input_hash, FAST) is not None
+    assert store.Load(problem.input_hash, SolverProfile(preset="prove-optimal")) is None
+    assert store.Load(problem.input_hash, SolverProfile(preset="fast-feasible", time_limit=3)) is None
+
+
+def test_proven_optimum_is_reused_with_any_profile(problem, tmp_path):
+    store = ScheduleStore(str(tmp_path / "schedules.db"))
+    optimal = copy.copy(problem)
+    optimal.result = copy.copy(problem.result)
+    optimal.result.status_name, optimal.result.gap = "OPTIMAL", 0.0
+    store.Save(optimal, include_model=False, profile=FAST)
+    assert store.Load(problem.input_hash, SolverProfile(preset="prove-optimal")) is not None
+
+
+def test_store_without_profile_column_is_upgraded(problem, tmp_path):
+    path = str(tmp_path / "schedules.db")
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA.replace("    profile TEXT,\n", ""))
+    connection.close()
+    store = ScheduleStore(path)
+    store.Save(problem, include_model=False)
+    assert store.Versions(problem.year, problem.month)[0]["profile"] is None
+    assert store.Load(problem.input_hash, FAST) is None
+
+
+def test_saved_model_is_reloaded(problem, tmp_path):
+    store = ScheduleStore(str(tmp_path / "schedules.db"))
+    store.Save(problem)
+    model = store.LoadModel(problem.input_hash)
+    assert str(model.Proto()) == str(problem.model.Proto())
+    assert store.LoadModel("missing") is None
@@ -0,0 +1,50 @@
+from Benchmark import generate_instance
+from schedule_checks import violations
+from ShiftsProblem import ShiftLayout, ShiftsProblem, empty_carry_over
+from SolverProfile import SolverProfile
+import pytest
+
+PROFILE = SolverProfile(preset="fast-feasible", num_workers=1, random_seed=0)
+
+
+def test_staffing_of_each_day_type():
+    # March 2025: saturday 1, sunday 2, festive monday 3 (0-indexed day 2)
+    layout = ShiftLayout(3, 2025, 10, [2], 3, 2, 2, 1)
+    required = layout.work_mask.sum(axis=1)
+    assert required[0] == 2 + 1 + 1  # saturday: 2 morning, 1 afternoon and the night
+    assert required[1] == required[2] == 3  # festive days: one morning, one afternoon and the night
+    assert required[3] == 3 + 2 + 1
+    assert layout.work_mask[:, [layout.first_rest_shift, layout.second_rest_shift]].sum() == 0
+    assert layout.is_festive.sum() == 6 and layout.is_saturday.sum() == 5
+
+
+@pytest.mark.parametrize("num_medics, month, seed", [(8, 2, 0), (10, 3, 1), (12, 4, 2)])
+def test_schedule_rules(num_medics, month, seed):
+    parameters = generate_instance(num_medics, month, 2025, vacation_density=0.1, num_festive_days=2,
+                                   full_sunday_fraction=0.25, additional_shift_skew=2, seed=seed)
+    problem = ShiftsProblem(**parameters)
+    assert problem.Solve(PROFILE).feasible
+    assert violations(problem) == []
+
+
+def test_schedule_rules_with_symmetry_breaking():
+    problem = ShiftsProblem(**generate_instance(10, 6, 2025, vacation_density=0, seed=3))
+    problem.SetSymmetryBreaking(True)
+    assert problem.Solve(PROFILE).feasible
+    assert violations(problem) == []
+
+
+def test_carry_over_is_applied():
+    parameters = generate_instance(10, 5, 2025, seed=4, vacation_density=0)
+    carry_over = empty_carry_over(10)
+    carry_over["previous_nights"] = [3, 4]
+    carry_over["final_nights"] = [5, 6]
+    problem = ShiftsProblem(**dict(parameters, carry_over=carry_over))
+    assert problem.Solve(PROFILE).feasible
+    layout = problem.layout
+    worked = problem.assignment & layout.work_mask
+    assert not worked[3, 0].any() and not worked[4, :2].any()
+    assert problem.Schedule().Roster()[-2:, layout.night_shift].tolist() == [5, 6]
+    # The rest "shifts" after the last night of the previous month are in the schedule
+    assert problem.assignment[4, 0, layout.first_rest_shift] and problem.assignment[4, 1, layout.second_rest_shift]
+    assert problem.assignment[3, 0, layout.second_rest_shift]
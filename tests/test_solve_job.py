@@ -0,0 +1,36 @@
+from Benchmark import generate_instance
+from schedule_checks import violations
+from ShiftsProblem import ShiftsProblem
+from SolveJob import SolveJob
+from SolverProfile import SolverProfile
+from ortools.sat.python import cp_model
+import time
+
+PROFILE = SolverProfile(time_limit=60.0, num_workers=1, random_seed=0)
+
+
+def test_stopped_job_keeps_the_best_schedule():
+    problem = ShiftsProblem(**generate_instance(30, 3, 2025, seed=0))
+    job = SolveJob(problem, PROFILE).Start()
+    time.sleep(2)
+    start = time.perf_counter()
+    job.Stop()
+    assert job.Wait(10)
+    assert time.perf_counter() - start < 10
+    assert job.error is None and job.stopped
+    assert job.result.status in (cp_model.FEASIBLE, cp_model.UNKNOWN)
+    if job.result.feasible:
+        assert violations(problem) == []
+
+
+def test_stop_before_the_search_skips_the_relaxed_search():
+    problem = ShiftsProblem(**generate_instance(10, 2, 2025, seed=0))
+    job = SolveJob(problem, PROFILE)
+    job.Stop()
+    start = time.perf_counter()
+    job.Run()
+    assert time.perf_counter() - start < 5
+    assert job.stopped and problem.limit_deviations
+    assert job.result.status == cp_model.UNKNOWN
+    # The request is cleared at the end of the search
+    assert not problem.stop_requested
@@ -0,0 +1,45 @@
+from ortools.sat.python import cp_model
+from SolverProfile import PRESETS, SolveResult, SolverProfile
+import pytest
+
+
+def test_apply_sets_the_options_of_the_preset():
+    solver = SolverProfile(preset="fast-feasible", num_workers=1, random_seed=7).Apply(cp_model.CpSolver())
+    parameters = solver.parameters
+    assert parameters.max_time_in_seconds == 10.0 and parameters.stop_after_first_solution
+    assert (parameters.num_workers, parameters.random_seed, parameters.interleave_search) == (1, 7, True)
+    solver = SolverProfile(preset="prove-optimal", num_workers=4).Apply(cp_model.CpSolver())
+    assert solver.parameters.relative_gap_limit == 0.0 and not solver.parameters.interleave_search
+    assert solver.parameters.max_time_in_seconds == cp_model.CpSolver().parameters.max_time_in_seconds
+    # The explicit options override the preset
+    solver = SolverProfile(time_limit=3, relative_gap_limit=0.1, preset="balanced").Apply(cp_model.CpSolver())
+    assert (solver.parameters.max_time_in_seconds, solver.parameters.relative_gap_limit) == (3.0, 0.1)
+
+
+def test_key_ignores_the_workers_and_the_preset_name():
+    assert SolverProfile(preset="balanced", num_workers=1).Key() == \
+        SolverProfile(preset="balanced", num_workers=8).Key()
+    assert SolverProfile(preset="balanced").Key() == SolverProfile(**PRESETS["balanced"]).Key()
+    keys = {SolverProfile(preset=preset).Key() for preset in PRESETS}
+    keys.add(SolverProfile(preset="balanced", random_seed=1).Key())
+    keys.add(SolverProfile(preset="balanced", time_limit=30).Key())
+    assert len(keys) == len(PRESETS) + 2
+    with pytest.raises(ValueError, match="fastest"):
+        SolverProfile(preset="fastest")
+
+
+def test_result_round_trip():
+    model = cp_model.CpModel()
+    x = model.NewIntVar(0, 10, "x")
+    model.Add(x >= 3)
+    model.Minimize(x)
+    solver = cp_model.CpSolver()
+    result = SolveResult(solver, solver.Solve(model))
+    assert result.feasible and result.objective == 3 and result.gap == 0
+    copy = SolveResult.FromDict(result.ToDict())
+    assert copy.ToDict() == result.ToDict()
+    assert (copy.status, copy.status_name, copy.feasible) == (cp_model.OPTIMAL, "OPTIMAL", True)
+    model.Add(x >= 11)
+    infeasible = SolveResult(solver, solver.Solve(model))
+    assert SolveResult.FromDict(infeasible.ToDict()).ToDict() == infeasible.ToDict()
+    assert not SolveResult.FromDict(infeasible.ToDict()).feasible
@@ -0,0 +1,47 @@
+from Benchmark import generate_instance
+from ShiftsProblem import ShiftsProblem, empty_carry_over
+from SolverProfile import SolverProfile
+import pytest
+
+
+def test_update_builds_the_same_model_as_a_fresh_build():
+    parameters = generate_instance(10, 3, 2025, seed=2, additional_shift_skew=2)
+    changed = dict(parameters, vacation_days=generate_instance(10, 3, 2025, seed=5)["vacation_days"],
+                   additional_shifts_ferial=[1, -1] + [0] * 8, additional_shifts_nights=[0] * 9 + [1])
+    updated = ShiftsProblem(**parameters)
+    updated.Update(**{key: changed[key] for key in ("vacation_days", "additional_shifts_ferial",
+                                                    "additional_shifts_nights")})
+    fresh = ShiftsProblem(**changed)
+    assert updated.input_hash == fresh.input_hash
+    assert (updated._DesiredShifts() == fresh._DesiredShifts()).all()
+    assert str(updated.model.Proto()) == str(fresh.model.Proto())
+
+
+def carried_over(parameters):
+    carry_over = empty_carry_over(parameters["num_medics"])
+    carry_over["previous_nights"] = [0, 1]
+    carry_over["final_nights"] = [2, 3]
+    return dict(parameters, carry_over=carry_over)
+
+
+def test_vacation_on_a_night_of_the_carry_over_is_rejected():
+    parameters = carried_over(generate_instance(10, 4, 2025, seed=3, vacation_density=0))
+    vacation_days = [[] for _ in range(10)]
+    vacation_days[3] = [30]  # the last night of April is assigned to medic 3
+    with pytest.raises(ValueError, match="Medic 4 is in vacation on day 30"):
+        ShiftsProblem(**dict(parameters, vacation_days=vacation_days))
+    problem = ShiftsProblem(**parameters)
+    before = str(problem.model.Proto())
+    with pytest.raises(ValueError):
+        problem.Update(vacation_days=vacation_days)
+    assert str(problem.model.Proto()) == before
+    assert problem.parameters["vacation_days"] == parameters["vacation_days"]
+
+
+def test_vacation_on_a_rest_day_of_the_carry_over_is_accepted():
+    parameters = carried_over(generate_instance(10, 4, 2025, seed=3, vacation_density=0))
+    vacation_days = [[] for _ in range(10)]
+    vacation_days[1] = [1, 2]  # medic 1 rests on the first two days after the last night of March
+    result = ShiftsProblem(**dict(parameters, vacation_days=vacation_days)).Solve(
+        SolverProfile(preset="fast-feasible", num_workers=1))
+    assert result.feasible